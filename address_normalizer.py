@@ -0,0 +1,310 @@
+"""
+Модуль нормализации адресов Бишкека
+Приводит разные записи одного адреса ("ул. Исанова 42", "улица Исанова, 42",
+"Isanova 42 Bishkek") к одному каноническому ключу и разбирает адрес на части.
+Ключ не включает квартиру, город и район, поэтому все квартиры дома геокодируются один раз
+"""
+
+import argparse
+import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+# Районы Бишкека и их написания
+BISHKEK_DISTRICTS = {
+    'Ленинский': ['Ленинский', 'Leninsky', 'Leninskiy', 'Lenin'],
+    'Свердловский': ['Свердловский', 'Sverdlovsky', 'Sverdlovskiy', 'Sverdlov'],
+    'Первомайский': ['Первомайский', 'Pervomaisky', 'Pervomayskiy', 'Pervomai'],
+    'Октябрьский': ['Октябрьский', 'Oktyabrsky', 'Oktyabrskiy', 'October']
+}
+
+
+@dataclass(frozen=True)
+class ParsedAddress:
+    """Разобранный адрес"""
+    key: str                     # Канонический ключ (тип улицы, улица, дом, корпус)
+    street_type: str             # улица, проспект, бульвар, переулок, мкр, жм
+    street: str                  # Название улицы или микрорайона в нижнем регистре
+    house: Optional[str]
+    building: Optional[str]
+    apartment: Optional[str]
+    district: Optional[str]      # Ключ из BISHKEK_DISTRICTS
+
+
+class AddressNormalizer:
+    """Нормализация адресов Бишкека"""
+
+    # Сокращения типов улиц
+    STREET_TYPES = {
+        'ул': 'улица', 'улица': 'улица', 'у': 'улица', 'ul': 'улица', 'ulitsa': 'улица', 'street': 'улица', 'st': 'улица',
+        'пр': 'проспект', 'пр-т': 'проспект', 'прт': 'проспект', 'просп': 'проспект', 'проспект': 'проспект',
+        'pr': 'проспект', 'prospekt': 'проспект', 'ave': 'проспект', 'avenue': 'проспект',
+        'б-р': 'бульвар', 'бул': 'бульвар', 'бульв': 'бульвар', 'бульвар': 'бульвар', 'bulvar': 'бульвар',
+        'пер': 'переулок', 'переулок': 'переулок', 'per': 'переулок',
+        'мкр': 'мкр', 'мкр-н': 'мкр', 'м-н': 'мкр', 'мр': 'мкр', 'мкрн': 'мкр', 'микр': 'мкр', 'микрорайон': 'мкр',
+        'mkr': 'мкр', 'mkrn': 'мкр', 'microdistrict': 'мкр',
+        'жм': 'жм', 'ж-м': 'жм', 'жилмассив': 'жм', 'массив': 'жм', 'zhm': 'жм',
+    }
+
+    # Тип улицы по умолчанию в ключ не входит: "ул. Исанова 42" и "Исанова 42" - один адрес
+    DEFAULT_STREET_TYPE = 'улица'
+
+    # Слова перед номером дома, корпуса и квартиры
+    HOUSE_MARKERS = {'д', 'дом', 'h', 'house', 'zd', 'здание'}
+    BUILDING_MARKERS = {'к', 'корп', 'корпус', 'стр', 'строение', 'блок', 'k', 'korp', 'block'}
+    APARTMENT_MARKERS = {'кв', 'квартира', 'оф', 'офис', 'kv', 'apt', 'ap', 'office'}
+
+    # Слова, за которыми следует номер, не относящийся к адресу дома
+    IGNORED_NUMBER_MARKERS = {'подъезд', 'под', 'п', 'этаж', 'эт', 'домофон', 'floor', 'entrance'}
+
+    # Город и страна в ключ не входят
+    CITY_WORDS = {'г', 'город', 'бишкек', 'bishkek', 'кыргызстан', 'киргизия', 'kyrgyzstan', 'кр', 'kg', 'kr'}
+
+    # Слова после названия района
+    DISTRICT_WORDS = {'район', 'р-н', 'рн', 'р', 'district', 'rayon'}
+
+    # Служебные слова, которые не транслитерируются
+    _KNOWN_LATIN = frozenset(
+        word for words in (STREET_TYPES, CITY_WORDS, DISTRICT_WORDS, HOUSE_MARKERS, BUILDING_MARKERS,
+                           APARTMENT_MARKERS, IGNORED_NUMBER_MARKERS)
+        for word in words if re.match(r'^[a-z]', word)
+    )
+
+    # Токены: слова, номера домов вида 42, 42а, 42/1, 42-5 и сокращения через дефис или косую черту
+    _SPLIT = re.compile(r"[^\w/\-]+")
+    _HOUSE = re.compile(r'^(\d+)([а-яa-z]?)(?:[/](\d+[а-яa-z]?))?$')
+    _HOUSE_APARTMENT = re.compile(r'^(\d+[а-яa-z]?)-(\d+)$')
+    _SLASH_ABBREVIATIONS = re.compile(r'\b(ж/м|м/р|мкр/н)\b')
+    _LATIN = re.compile(r'[a-z]')
+    _CYRILLIC = re.compile(r'[а-я]')
+
+    # Транслитерация: сначала многобуквенные сочетания и окончания
+    _TRANSLIT_ENDINGS = ((re.compile(r'(sk|tsk|ck)(iy|ii|ij|y|i)$'), r'\1ий'), (re.compile(r'aya$'), 'ая'))
+    _TRANSLIT = re.compile(r'shch|sch|zh|kh|ch|sh|ts|yu|ya|yo|ye|[a-z]|[а-я]')
+    _TRANSLIT_MAP = {
+        'shch': 'щ', 'sch': 'щ', 'zh': 'ж', 'kh': 'х', 'ch': 'ч', 'sh': 'ш', 'ts': 'ц',
+        'yu': 'ю', 'ya': 'я', 'yo': 'е', 'ye': 'е',
+        'a': 'а', 'b': 'б', 'c': 'к', 'd': 'д', 'e': 'е', 'f': 'ф', 'g': 'г', 'h': 'х', 'i': 'и',
+        'j': 'дж', 'k': 'к', 'l': 'л', 'm': 'м', 'n': 'н', 'o': 'о', 'p': 'п', 'q': 'к', 'r': 'р',
+        's': 'с', 't': 'т', 'u': 'у', 'v': 'в', 'w': 'в', 'x': 'кс', 'y': 'ы', 'z': 'з'
+    }
+    _VOWELS = set('аеиоуыэюя')
+
+    # Написания районов в нижнем регистре -> ключ района
+    _DISTRICT_VARIANTS: Tuple[Tuple[str, str], ...] = tuple(
+        (variant.lower(), district)
+        for district, variants in BISHKEK_DISTRICTS.items()
+        for variant in variants
+    )
+
+    @staticmethod
+    def _transliterate(token: str) -> str:
+        """Перевести слово латиницей в кириллицу (как его обычно пишут в Бишкеке)"""
+        for pattern, replacement in AddressNormalizer._TRANSLIT_ENDINGS:
+            token = pattern.sub(replacement, token)
+
+        parts = AddressNormalizer._TRANSLIT.findall(token)
+        result = []
+        for index, part in enumerate(parts):
+            letter = AddressNormalizer._TRANSLIT_MAP.get(part, part)
+            # "y" и конечная "i" после гласной - это "й": Chui -> Чуй, Baytik -> Байтик
+            if part in ('y', 'i') and result and result[-1][-1] in AddressNormalizer._VOWELS \
+                    and (part == 'y' or index == len(parts) - 1):
+                letter = 'й'
+            result.append(letter)
+        return ''.join(result)
+
+    @staticmethod
+    def _district(token: str, following: Optional[str] = None) -> Optional[str]:
+        """
+        Ключ района, если слово - название района
+
+        Район - точное написание из BISHKEK_DISTRICTS или слово перед "район"/"district":
+        "Первомайская", "Leningradskaya" и "Ленина" - улицы, а не районы.
+
+        :param following: Следующее слово адреса
+        """
+        for variant, district in AddressNormalizer._DISTRICT_VARIANTS:
+            if token == variant or (following in AddressNormalizer.DISTRICT_WORDS and token.startswith(variant)):
+                return district
+        return None
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        """Разбить адрес на слова в нижнем регистре"""
+        text = AddressNormalizer._SLASH_ABBREVIATIONS.sub(
+            lambda match: match.group(0).replace('/', ''), text.lower().replace('ё', 'е')
+        )
+        # Косая черта между словами (угол улиц) - разделитель, между цифрами - корпус дома
+        text = re.sub(r'(?<=[^\d\s])/|/(?=[^\d\s])', ' ', text)
+        return [token.strip('-/') for token in AddressNormalizer._SPLIT.split(text) if token.strip('-/')]
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def parse(text: str) -> ParsedAddress:
+        """
+        Разобрать адрес
+
+        :param text: Адрес в том виде, в котором его ввел клиент
+        :return: Разобранный адрес с каноническим ключом
+        """
+        normalizer = AddressNormalizer
+        street_type = None
+        street_words: List[str] = []
+        house = building = apartment = district = None
+        expect = None  # Чего ждем после маркера: 'name', 'house', 'building', 'apartment', 'skip'
+
+        tokens = normalizer._tokens(text or '')
+        for index, token in enumerate(tokens):
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+
+            # Сокращения и районы латиницей узнаем до транслитерации: "mkr", "Leninsky"
+            if normalizer._LATIN.search(token) and not normalizer._CYRILLIC.search(token) \
+                    and token not in normalizer._KNOWN_LATIN and not normalizer._district(token, following):
+                token = normalizer._transliterate(token)
+
+            if token in normalizer.CITY_WORDS or token in normalizer.DISTRICT_WORDS:
+                continue
+
+            found_district = normalizer._district(token, following)
+            if found_district:
+                district = found_district
+                continue
+
+            if token in normalizer.STREET_TYPES:
+                if street_type and house is None:
+                    # Улица внутри микрорайона или жилмассива: "ж/м Ак-Орго, ул. 5" - часть названия
+                    street_words.append(normalizer.STREET_TYPES[token])
+                    expect = 'name'
+                    continue
+                street_type = street_type or normalizer.STREET_TYPES[token]
+                # "12 мкр, д. 5": номер перед типом - название микрорайона, а не дом
+                if street_type == 'мкр' and house and not street_words and apartment is None:
+                    street_words.append(house)
+                    house = building = None
+                expect = 'name' if street_type == 'мкр' and not street_words else None
+                continue
+            if token in normalizer.HOUSE_MARKERS:
+                # "мкр Джал 12, д. 5": номер перед "д." - часть названия микрорайона или улицы, а не дом
+                if house is not None and apartment is None:
+                    street_words.append(f"{house}/{building}" if building else house)
+                    house = building = None
+                expect = 'house'
+                continue
+            if token in normalizer.BUILDING_MARKERS and house:
+                expect = 'building'
+                continue
+            if token in normalizer.APARTMENT_MARKERS:
+                expect = 'apartment'
+                continue
+            if token in normalizer.IGNORED_NUMBER_MARKERS:
+                expect = 'skip'
+                continue
+
+            number = normalizer._HOUSE.match(token)
+            with_apartment = normalizer._HOUSE_APARTMENT.match(token)
+            if number or with_apartment:
+                if expect == 'skip':
+                    pass
+                elif expect == 'building' and house:
+                    building = token
+                elif expect == 'apartment' or (house and expect != 'house'):
+                    apartment = apartment or token
+                elif expect == 'name':
+                    # "мкр 12 д 5": номер сразу после типа - название микрорайона или улицы
+                    street_words.append(token)
+                elif with_apartment:
+                    house, apartment = with_apartment.group(1), with_apartment.group(2)
+                else:
+                    house = number.group(1) + number.group(2)
+                    building = number.group(3) or building
+                expect = None
+                continue
+
+            expect = None
+            # Слова после номера дома (ориентиры, "возле рынка") в ключ не входят
+            if house is None:
+                street_words.append(token)
+
+        street_type = street_type or normalizer.DEFAULT_STREET_TYPE
+        street = ' '.join(street_words)
+
+        parts = [] if street_type == normalizer.DEFAULT_STREET_TYPE else [street_type]
+        parts += [part for part in (street, house) if part]
+        if building:
+            parts.append(f"к{building}")
+        key = ' '.join(parts) or ' '.join(normalizer._tokens(text or ''))
+
+        return ParsedAddress(key, street_type, street, house, building, apartment, district)
+
+    @staticmethod
+    def canonical_key(text: str) -> str:
+        """Канонический ключ адреса для кэша геокодирования"""
+        return AddressNormalizer.parse(text).key
+
+
+# Записи одного адреса, которые должны давать один ключ
+SAME_KEY_CASES = (
+    ("ул. Исанова 42", "улица Исанова, 42", "Isanova 42, Bishkek", "Исанова 42 кв 15"),
+    ("мкр 12 д 5", "12 мкр, д. 5"),
+    ("Исанова 4", "Ленинский р-н, Исанова 4", "Leninsky district Isanova 4"),
+)
+
+# Разные адреса, ключи которых не должны совпасть (иначе кэш отдаст чужие координаты)
+DIFFERENT_KEY_CASES = (
+    ("мкр Джал 12, д. 5", "мкр Джал 29, д. 5"),
+    ("Pervomaiskaya 10", "10"),
+    ("Leningradskaya 5", "5"),
+    ("Первомайская 10", "Ленинградская 10"),
+    ("Исанова 42", "Исанова 42/1"),
+)
+
+
+def check() -> list:
+    """
+    Проверить ключи на примерах SAME_KEY_CASES и DIFFERENT_KEY_CASES
+
+    :return: Список описаний несовпадений (пустой, если все верно)
+    """
+    errors = []
+    for addresses in SAME_KEY_CASES:
+        keys = {AddressNormalizer.canonical_key(address) for address in addresses}
+        if len(keys) != 1:
+            errors.append(f"Разные ключи для одного адреса {addresses}: {sorted(keys)}")
+    for first, second in DIFFERENT_KEY_CASES:
+        key = AddressNormalizer.canonical_key(first)
+        if key == AddressNormalizer.canonical_key(second):
+            errors.append(f"Один ключ {key!r} для разных адресов {first!r} и {second!r}")
+    return errors
+
+
+def main():
+    """Показать разбор адресов и скорость нормализации"""
+    parser = argparse.ArgumentParser(description="Нормализация адресов Бишкека")
+    parser.add_argument('addresses', nargs='*', help="Адреса для разбора")
+    parser.add_argument('--check', action='store_true', help="Проверить ключи на известных примерах")
+    args = parser.parse_args()
+
+    if args.check:
+        errors = check()
+        print("\n".join(errors) or "Ключи адресов: все примеры верны")
+        raise SystemExit(1 if errors else 0)
+
+    for address in args.addresses:
+        print(f"{address!r} -> {AddressNormalizer.parse(address)}")
+
+    samples = ["ул. Исанова 42", "улица Исанова, 42", "Исанова 42 Бишкек", "Isanova 42, Bishkek",
+               "мкр Джал 12, д. 5, кв. 17", "пр. Чуй 120/1 кв 4", "Боконбаева 101-15 Ленинский р-н"]
+    count = 100000
+    started = time.perf_counter()
+    for index in range(count):
+        # Разные строки, чтобы замерить разбор, а не кэш
+        AddressNormalizer.parse.__wrapped__(f"{samples[index % len(samples)]} {index % 7}")
+    elapsed = time.perf_counter() - started
+    print(f"Разбор без кэша: {elapsed / count * 1e6:.1f} мкс на адрес")
+
+
+if __name__ == '__main__':
+    main()
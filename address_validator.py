@@ -3,12 +3,25 @@
 Использует Google Maps Geocoding API для проверки адресов и определения района
 """
 
+import asyncio
+import json
 import os
 import logging
-from typing import Optional, Dict
-from dataclasses import dataclass
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from dataclasses import dataclass, asdict, replace
+import httpx
 import requests
 
+from address_normalizer import BISHKEK_DISTRICTS
+from circuit_breaker import CircuitBreaker
+from config import (GEOCODE_LATENCY_BUDGET_SECONDS, GEOCODE_BREAKER_WINDOW_SECONDS, GEOCODE_BREAKER_MIN_CALLS,
+                    GEOCODE_BREAKER_ERROR_RATE, GEOCODE_BREAKER_SLOW_SECONDS, GEOCODE_BREAKER_SLOW_RATE,
+                    GEOCODE_BREAKER_OPEN_SECONDS)
+from district_resolver import DistrictResolver
+from gazetteer import BishkekGazetteer, GazetteerMatch
+from geocode_cache import GeocodeCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,13 +42,29 @@ class AddressInfo:
 class KyrgyzstanAddressValidator:
     """Валидатор адресов для Бишкека"""
 
+    # Таймауты запроса к Geocoding API (секунды) и предельное время одного запроса целиком
+    REQUEST_TIMEOUT = 10
+    CONNECT_TIMEOUT = 3
+    LATENCY_BUDGET = GEOCODE_LATENCY_BUDGET_SECONDS
+
+    # Предохранитель: пока Google отвечает ошибками или медленно, адрес сразу проверяется базово
+    breaker = CircuitBreaker(
+        "Google Geocoding", GEOCODE_BREAKER_WINDOW_SECONDS, GEOCODE_BREAKER_MIN_CALLS, GEOCODE_BREAKER_ERROR_RATE,
+        GEOCODE_BREAKER_SLOW_SECONDS, GEOCODE_BREAKER_SLOW_RATE, GEOCODE_BREAKER_OPEN_SECONDS
+    )
+
+    # Общий пул соединений для асинхронных запросов (создается при первом запросе)
+    MAX_CONNECTIONS = 20
+    _async_client: Optional[httpx.AsyncClient] = None
+
+    # Запросы к API в процессе: ключ кэша -> общий результат для одновременных проверок адреса
+    _in_flight: Dict[str, asyncio.Future] = {}
+
+    # Сколько проверок дождались чужого запроса вместо своего
+    coalesced = 0
+
     # Районы Бишкека
-    BISHKEK_DISTRICTS = {
-        'Ленинский': ['Ленинский', 'Leninsky', 'Lenin'],
-        'Свердловский': ['Свердловский', 'Sverdlovsky', 'Sverdlov'],
-        'Первомайский': ['Первомайский', 'Pervomaisky', 'Pervomai'],
-        'Октябрьский': ['Октябрьский', 'Oktyabrsky', 'October']
-    }
+    BISHKEK_DISTRICTS = BISHKEK_DISTRICTS
 
     def __init__(self, google_api_key: Optional[str] = None):
         """
@@ -46,12 +75,30 @@ class KyrgyzstanAddressValidator:
         self.api_key = google_api_key or os.getenv('GOOGLE_MAPS_API_KEY')
         self.geocoding_url = "https://maps.googleapis.com/maps/api/geocode/json"
 
-    def validate_address(self, address: str) -> AddressInfo:
+    @classmethod
+    def normalize_district(cls, district: Optional[str]) -> str:
         """
-        Валидация и геокодирование адреса в Бишкеке
+        Привести название района к ключу из BISHKEK_DISTRICTS
 
-        :param address: Адрес для проверки
-        :return: Объект AddressInfo с информацией об адресе
+        :param district: Название района в любом написании ("Ленинский район", "Leninsky")
+        :return: Ключ района или пустая строка, если район не определен
+        """
+        if not district:
+            return ""
+
+        lowered = district.lower()
+        for district_name, variants in cls.BISHKEK_DISTRICTS.items():
+            for variant in variants:
+                if variant.lower() in lowered:
+                    return district_name
+
+        return ""
+
+    def _precheck(self, address: str) -> Optional[AddressInfo]:
+        """
+        Проверки адреса, не требующие запроса к API: кэш геокодирования и офлайн-справочник
+
+        :return: Результат проверки или None, если адрес нужно геокодировать
         """
         if not address or len(address.strip()) < 5:
             return AddressInfo(
@@ -66,14 +113,83 @@ class KyrgyzstanAddressValidator:
                 error_message="Адрес слишком короткий"
             )
 
+        cached = GeocodeCache.get(address)
+        if cached is not None:
+            return replace(AddressInfo(**cached), original_address=address)
+
+        # Справочник работает и без API ключа, и когда закончилась квота
+        match = BishkekGazetteer.lookup(address)
+        if match:
+            return self._gazetteer_result(address, match)
+
         # Проверяем, есть ли API ключ
         if not self.api_key:
             logger.warning("Google Maps API key not found. Using basic validation.")
             return self._basic_validation(address)
 
+        return None
+
+    def _gazetteer_result(self, address: str, match: GazetteerMatch) -> AddressInfo:
+        """
+        Результат проверки по офлайн-справочнику
+
+        :param address: Исходный адрес
+        :param match: Найденный в справочнике адрес
+        :return: Объект AddressInfo
+        """
+        street = match.street
+        street_name = street.name if street.street_type == 'улица' else f"{street.street_type} {street.name}"
+        district = self.normalize_district(street.district)
+
+        return AddressInfo(
+            original_address=address,
+            formatted_address=f"{street_name}, {match.house}, Бишкек",
+            city="Бишкек",
+            district=f"{district} район" if district else self._get_bishkek_district_by_coords(
+                match.latitude, match.longitude),
+            street=street.name,
+            latitude=match.latitude,
+            longitude=match.longitude,
+            is_valid=True,
+            error_message=None
+        )
+
+    def _validation_error(self, address: str, error: Exception) -> AddressInfo:
+        """Результат проверки при непредвиденной ошибке"""
+        logger.error(f"Ошибка при валидации адреса: {error}")
+        return AddressInfo(
+            original_address=address,
+            formatted_address="",
+            city="",
+            district="",
+            street="",
+            latitude=0.0,
+            longitude=0.0,
+            is_valid=False,
+            error_message=f"Ошибка проверки: {str(error)}"
+        )
+
+    @staticmethod
+    def _cache_result(address: str, result: Optional[AddressInfo]):
+        """Сохранить ответ API в кэш (ошибки API не кэшируются)"""
+        if result is not None:
+            GeocodeCache.put(address, asdict(result), negative=not result.is_valid)
+
+    def validate_address(self, address: str) -> AddressInfo:
+        """
+        Валидация и геокодирование адреса в Бишкеке (блокирующий вызов для скриптов)
+
+        :param address: Адрес для проверки
+        :return: Объект AddressInfo с информацией об адресе
+        """
+        precheck = self._precheck(address)
+        if precheck:
+            return precheck
+
         try:
             # Геокодирование адреса
             geocode_result = self._geocode_address(address)
+            self._cache_result(address, geocode_result)
 
             if geocode_result:
                 return geocode_result
@@ -81,77 +197,219 @@ class KyrgyzstanAddressValidator:
                 return self._basic_validation(address)
 
         except Exception as e:
-            logger.error(f"Ошибка при валидации адреса: {e}")
-            return AddressInfo(
-                original_address=address,
-                formatted_address="",
-                city="",
-                district="",
-                street="",
-                latitude=0.0,
-                longitude=0.0,
-                is_valid=False,
-                error_message=f"Ошибка проверки: {str(e)}"
-            )
+            return self._validation_error(address, e)
 
-    def _geocode_address(self, address: str) -> Optional[AddressInfo]:
+    async def validate_address_async(self, address: str) -> AddressInfo:
         """
-        Геокодирование адреса через Google Maps API
+        Валидация и геокодирование адреса в Бишкеке без блокировки цикла событий бота
+
+        Одновременные проверки одного адреса (соседи по дому, повторные нажатия) делят
+        один запрос к API и его результат.
+
+        :param address: Адрес для проверки
+        :return: Объект AddressInfo с информацией об адресе
+        """
+        result, _ = await self.geocode_async(address)
+        return result
+
+    async def geocode_async(self, address: str,
+                            before_request: Optional[Callable[[], Awaitable[None]]] = None,
+                            wait_for_service: bool = False) -> Tuple[AddressInfo, bool]:
+        """
+        Геокодировать адрес и сообщить, окончательный ли это ответ (для пакетной обработки адресов)
+
+        :param address: Адрес для проверки
+        :param before_request: Вызывается перед запросом к API (не вызывается, если ответ есть в кэше
+                               или справочнике), например для ограничения скорости запросов
+        :param wait_for_service: Пока предохранитель разомкнут, ждать пробного запроса,
+                                 а не отвечать базовой проверкой
+        :return: (результат, признак окончательного ответа: кэш, справочник или ответ API).
+                 Без признака (сбой API, нет ключа) адрес стоит проверить позже
+        """
+        precheck = self._precheck(address)
+        if precheck:
+            # Без ключа API проверка только базовая
+            return precheck, bool(self.api_key)
+
+        try:
+            if wait_for_service:
+                while self.breaker.retry_after() > 0:
+                    await asyncio.sleep(self.breaker.retry_after())
+            if before_request is not None:
+                await before_request()
+
+            geocode_result = await self._geocode_single_flight(address)
+
+            if geocode_result:
+                return replace(geocode_result, original_address=address), True
+            else:
+                return self._basic_validation(address), False
+
+        except Exception as e:
+            return self._validation_error(address, e), False
+
+    async def _geocode_single_flight(self, address: str) -> Optional[AddressInfo]:
+        """
+        Геокодировать адрес, присоединяясь к уже идущему запросу с тем же ключом кэша
 
         :param address: Адрес для геокодирования
         :return: Объект AddressInfo или None
         """
+        key = GeocodeCache.key(address)
+        in_flight = KyrgyzstanAddressValidator._in_flight
+        future = in_flight.get(key)
+
+        if future is None:
+            future = asyncio.ensure_future(self._geocode_and_cache(address))
+            in_flight[key] = future
+            future.add_done_callback(lambda done: KyrgyzstanAddressValidator._forget_in_flight(key, done))
+        else:
+            KyrgyzstanAddressValidator.coalesced += 1
+
+        # Отмена одного ожидающего (клиент ушел из диалога) не отменяет запрос для остальных
+        return await asyncio.shield(future)
+
+    @staticmethod
+    def _forget_in_flight(key: str, future: asyncio.Future):
+        """Убрать завершенный запрос: следующие проверки возьмут результат из кэша"""
+        if KyrgyzstanAddressValidator._in_flight.get(key) is future:
+            del KyrgyzstanAddressValidator._in_flight[key]
+        # Ошибку запроса получают ожидающие; если все отменились, не шумим в журнал
+        if not future.cancelled():
+            future.exception()
+
+    async def _geocode_and_cache(self, address: str) -> Optional[AddressInfo]:
+        """Запрос к API с сохранением ответа в кэш"""
+        geocode_result = await self._geocode_address_async(address)
+        self._cache_result(address, geocode_result)
+        return geocode_result
+
+    def _geocode_params(self, address: str) -> Dict[str, str]:
+        """Параметры запроса к Geocoding API"""
         # Добавляем "Бишкек" к адресу для более точного поиска
         search_address = f"{address}, Бишкек, Кыргызстан" if "Бишкек" not in address else f"{address}, Кыргызстан"
 
-        params = {
+        return {
             'address': search_address,
             'key': self.api_key,
             'language': 'ru'
         }
 
+    def _geocode_address(self, address: str) -> Optional[AddressInfo]:
+        """
+        Геокодирование адреса через Google Maps API
+
+        Таймаут requests ограничивает только ожидание каждого чтения, поэтому ответ читается
+        потоком, и запрос прерывается, как только весь вызов превысил LATENCY_BUDGET
+        (ответ, приходящий по байту, дольше одного чтения не затянется).
+
+        :param address: Адрес для геокодирования
+        :return: Объект AddressInfo или None (в том числе без запроса, если предохранитель разомкнут)
+        """
+        if not self.breaker.allow():
+            return None
+
+        started = time.monotonic()
+        deadline = started + self.LATENCY_BUDGET
+        result = None
         try:
-            response = requests.get(self.geocoding_url, params=params, timeout=10)
+            with requests.get(self.geocoding_url, params=self._geocode_params(address), stream=True,
+                              timeout=(self.CONNECT_TIMEOUT, self.LATENCY_BUDGET)) as response:
+                response.raise_for_status()
+                body = bytearray()
+                while True:
+                    # read1 возвращает то, что уже пришло, а не ждет полного блока
+                    chunk = response.raw.read1(8192, decode_content=True)
+                    if not chunk:
+                        break
+                    body.extend(chunk)
+                    if time.monotonic() > deadline:
+                        logger.error(f"Google Maps API не ответил за {self.LATENCY_BUDGET} с")
+                        return None
+
+            result = self._parse_geocode_response(address, json.loads(body))
+            return result
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Ошибка запроса к Google Maps API: {e}")
+            return None
+
+        finally:
+            self.breaker.record(result is not None, time.monotonic() - started)
+
+    @classmethod
+    def _get_async_client(cls) -> httpx.AsyncClient:
+        """Общий асинхронный HTTP-клиент с пулом соединений"""
+        if cls._async_client is None or cls._async_client.is_closed:
+            cls._async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(cls.REQUEST_TIMEOUT, connect=cls.CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=cls.MAX_CONNECTIONS,
+                                    max_keepalive_connections=cls.MAX_CONNECTIONS)
+            )
+        return cls._async_client
+
+    @classmethod
+    async def aclose(cls):
+        """Закрыть пул соединений (при остановке бота)"""
+        if cls._async_client is not None:
+            await cls._async_client.aclose()
+            cls._async_client = None
+
+    async def _geocode_address_async(self, address: str) -> Optional[AddressInfo]:
+        """
+        Геокодирование адреса через Google Maps API без блокировки цикла событий
+
+        :param address: Адрес для геокодирования
+        :return: Объект AddressInfo или None (в том числе без запроса, если предохранитель разомкнут)
+        """
+        if not self.breaker.allow():
+            return None
+
+        started = time.monotonic()
+        result = None
+        try:
+            response = await asyncio.wait_for(
+                self._get_async_client().get(self.geocoding_url, params=self._geocode_params(address)),
+                self.LATENCY_BUDGET
+            )
             response.raise_for_status()
-            data = response.json()
-
-            if data['status'] == 'OK' and len(data['results']) > 0:
-                result = data['results'][0]
-
-                # Проверяем, что адрес находится в Бишкеке
-                if not self._is_in_bishkek(result):
-                    return AddressInfo(
-                        original_address=address,
-                        formatted_address="",
-                        city="",
-                        district="",
-                        street="",
-                        latitude=0.0,
-                        longitude=0.0,
-                        is_valid=False,
-                        error_message="Адрес не находится в Бишкеке. Мы доставляем только по Бишкеку."
-                    )
-
-                # Извлекаем компоненты адреса
-                components = self._parse_address_components(result['address_components'])
-                location = result['geometry']['location']
-
-                # Определяем район
-                district = self._determine_district(components, location['lat'], location['lng'])
+            result = self._parse_geocode_response(address, response.json())
+            return result
 
-                return AddressInfo(
-                    original_address=address,
-                    formatted_address=result['formatted_address'],
-                    city="Бишкек",
-                    district=district,
-                    street=components.get('street', ''),
-                    latitude=location['lat'],
-                    longitude=location['lng'],
-                    is_valid=True,
-                    error_message=None
-                )
+        except asyncio.TimeoutError:
+            logger.error(f"Google Maps API не ответил за {self.LATENCY_BUDGET} с")
+            return None
+
+        except httpx.HTTPError as e:
+            logger.error(f"Ошибка запроса к Google Maps API: {e}")
+            return None
+
+        finally:
+            self.breaker.record(result is not None, time.monotonic() - started)
+
+    @classmethod
+    def format_metrics(cls) -> str:
+        """Состояние геокодирования для команды /metrics"""
+        stats = GeocodeCache.stats
+        return "\n".join([
+            cls.breaker.format_report(),
+            f"Кэш: в памяти {stats['memory_hits']}, на диске {stats['disk_hits']}, промахов {stats['misses']}; "
+            f"общих запросов для одинаковых адресов {cls.coalesced}"
+        ])
 
-            elif data['status'] == 'ZERO_RESULTS':
+    def _parse_geocode_response(self, address: str, data: dict) -> Optional[AddressInfo]:
+        """
+        Разбор ответа Geocoding API
+
+        :param address: Исходный адрес
+        :param data: Ответ API
+        :return: Объект AddressInfo или None, если API вернул ошибку
+        """
+        if data['status'] == 'OK' and len(data['results']) > 0:
+            result = data['results'][0]
+
+            # Проверяем, что адрес находится в Бишкеке
+            if not self._is_in_bishkek(result):
                 return AddressInfo(
                     original_address=address,
                     formatted_address="",
@@ -161,14 +419,42 @@ class KyrgyzstanAddressValidator:
                     latitude=0.0,
                     longitude=0.0,
                     is_valid=False,
-                    error_message="Адрес не найден в Бишкеке"
+                    error_message="Адрес не находится в Бишкеке. Мы доставляем только по Бишкеку."
                 )
-            else:
-                logger.warning(f"Google Geocoding API error: {data['status']}")
-                return None
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка запроса к Google Maps API: {e}")
+            # Извлекаем компоненты адреса
+            components = self._parse_address_components(result['address_components'])
+            location = result['geometry']['location']
+
+            # Определяем район
+            district = self._determine_district(components, location['lat'], location['lng'])
+
+            return AddressInfo(
+                original_address=address,
+                formatted_address=result['formatted_address'],
+                city="Бишкек",
+                district=district,
+                street=components.get('street', ''),
+                latitude=location['lat'],
+                longitude=location['lng'],
+                is_valid=True,
+                error_message=None
+            )
+
+        elif data['status'] == 'ZERO_RESULTS':
+            return AddressInfo(
+                original_address=address,
+                formatted_address="",
+                city="",
+                district="",
+                street="",
+                latitude=0.0,
+                longitude=0.0,
+                is_valid=False,
+                error_message="Адрес не найден в Бишкеке"
+            )
+        else:
+            logger.warning(f"Google Geocoding API error: {data['status']}")
             return None
 
     def _is_in_bishkek(self, geocode_result: dict) -> bool:
@@ -245,9 +531,10 @@ class KyrgyzstanAddressValidator:
         :param lng: Долгота
         :return: Название района
         """
-        # Примерные границы районов Бишкека
-        # Центр Бишкека: примерно 42.87, 74.59
+        if DistrictResolver.is_available():
+            return DistrictResolver.resolve(lat, lng) or "Не определен"
 
+        # Границы районов не заданы: примерное деление по четвертям вокруг центра Бишкека
         if lat > 42.88 and lng < 74.59:
             return "Ленинский район"
         elif lat > 42.88 and lng >= 74.59:
@@ -342,7 +629,7 @@ async def test_address_validation(address: str, api_key: Optional[str] = None) -
     :return: Результат проверки
     """
     validator = KyrgyzstanAddressValidator(api_key)
-    result = validator.validate_address(address)
+    result = await validator.validate_address_async(address)
 
     response = "🔍 Результат проверки адреса:\n\n"
     response += validator.format_address_for_display(result)
@@ -0,0 +1,138 @@
+"""
+Модуль массового переноса заказов
+Когда курьер не выходит на линию, его заказы на день переносятся на ближайшие свободные
+слоты одним сохранением файла, а клиенты получают уведомления через общий диспетчер сообщений
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+from config import BULK_RESCHEDULE_MIN_HOURS
+from courier_assignment import CourierAssignment
+from database import Database
+from message_dispatcher import MessageDispatcher, OutgoingMessage
+from messages import Messages
+from reminder_service import ReminderScheduler
+from slot_index import SlotIndex
+
+logger = logging.getLogger(__name__)
+
+
+class BulkReschedule:
+    """Перенос всех заказов курьера на дату"""
+
+    @staticmethod
+    def courier_orders(date_str: str, courier: int) -> List[Dict]:
+        """
+        Предстоящие заказы курьера на дату
+
+        :param date_str: Дата доставки в формате YYYY-MM-DD
+        :param courier: Номер курьера
+        :return: Заказы в порядке времени доставки
+        """
+        now = datetime.now()
+        orders = []
+
+        for order in Database.get_orders_for_date(date_str):
+            if not order['delivery_time'] or str(order.get('courier') or '') != str(courier):
+                continue
+            delivery_at = datetime.strptime(f"{date_str} {order['delivery_time']}", '%Y-%m-%d %H:%M')
+            if delivery_at > now:
+                orders.append(order)
+
+        orders.sort(key=lambda order: order['delivery_time'])
+        return orders
+
+    @staticmethod
+    async def move_courier_day(context, date_str: str, courier: int,
+                               min_hours_ahead: float = BULK_RESCHEDULE_MIN_HOURS) -> Dict:
+        """
+        Перенести заказы курьера на ближайшие свободные слоты: сначала в тот же день, затем в следующие
+
+        Все заказы и их новые напоминания сохраняются одним сохранением файла. В тот же день
+        заказы достаются другим курьерам. Освободившееся время не предлагается листу ожидания:
+        курьера, который бы его обслужил, в этот день нет.
+
+        :param context: Context приложения с bot_data['dispatcher']
+        :param date_str: Дата доставки в формате YYYY-MM-DD
+        :param courier: Номер курьера
+        :param min_hours_ahead: Минимум часов от текущего момента до нового слота
+        :return: Dict с ключами 'moved' ({order_id: (дата, время)}), 'unplaced' (ID заказов,
+                 для которых не нашлось слота) и 'notified' (сколько клиентов получили уведомление)
+        """
+        orders = BulkReschedule.courier_orders(date_str, courier)
+        slots = SlotIndex.allocate(
+            [(order['order_id'], order['delivery_date'], order['delivery_time']) for order in orders],
+            min_hours_ahead
+        )
+        unplaced = [order['order_id'] for order in orders if order['order_id'] not in slots]
+        if not slots:
+            return {'moved': {}, 'unplaced': unplaced, 'notified': 0}
+
+        # Новые даты и время заказов, сгруппированные по дням для назначения курьеров
+        moved_orders = {
+            order['order_id']: dict(order, delivery_date=slots[order['order_id']][0],
+                                    delivery_time=slots[order['order_id']][1])
+            for order in orders if order['order_id'] in slots
+        }
+        by_date = defaultdict(list)
+        for order in moved_orders.values():
+            by_date[order['delivery_date']].append(order)
+
+        # Курьеров подбираем без изменения распределения: часть заказов может не перенестись
+        couriers = {}
+        for new_date_str, day_orders in by_date.items():
+            exclude = courier if new_date_str == date_str else None
+            couriers.update(CourierAssignment.plan_orders(new_date_str, day_orders, exclude, removed=moved_orders))
+
+        reminders = [
+            reminder
+            for order in moved_orders.values()
+            for reminder in ReminderScheduler.build_reminders(
+                order['user_id'], order['order_id'], order['delivery_date'], order['delivery_time'], order['address']
+            )
+        ]
+
+        moved_ids = Database.reschedule_orders(
+            {
+                order_id: (order['delivery_date'], order['delivery_time'], couriers.get(order_id))
+                for order_id, order in moved_orders.items()
+            },
+            [reminder.to_record() for reminder in reminders]
+        )
+        moved_ids = set(moved_ids)
+
+        # Распределение меняем только для заказов, которые перенесены в файле
+        for new_date_str, day_orders in by_date.items():
+            CourierAssignment.apply_orders(
+                new_date_str, [order for order in day_orders if order['order_id'] in moved_ids], couriers
+            )
+
+        # Старые напоминания снимаем из очереди, новые ставим только для реально перенесенных заказов
+        await ReminderScheduler.cancel_reminders_for_orders(context, moved_ids)
+        ReminderScheduler.enqueue([reminder for reminder in reminders if reminder.order_id in moved_ids])
+
+        old_orders = {order['order_id']: order for order in orders}
+        dispatcher: MessageDispatcher = context.bot_data['dispatcher']
+        results = await dispatcher.send_many([
+            OutgoingMessage(
+                old_orders[order_id]['user_id'],
+                Messages.get_order_moved_notice(
+                    order_id, date_str, old_orders[order_id]['delivery_time'],
+                    moved_orders[order_id]['delivery_date'], moved_orders[order_id]['delivery_time']
+                )
+            )
+            for order_id in moved_ids
+        ])
+
+        logger.info(
+            f"Заказы курьера {courier} на {date_str}: перенесено {len(moved_ids)}, "
+            f"без слота {len(unplaced)}, уведомлено {results.count(MessageDispatcher.SENT)}"
+        )
+        return {
+            'moved': {order_id: slots[order_id] for order_id in moved_ids},
+            'unplaced': unplaced,
+            'notified': results.count(MessageDispatcher.SENT)
+        }
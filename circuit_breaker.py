@@ -0,0 +1,160 @@
+"""
+Модуль предохранителя для внешних сервисов
+Когда сервис отвечает ошибками или слишком медленно, запросы к нему на время прекращаются,
+и вызывающий код сразу переходит к запасному варианту, а не ждет таймаута на каждом запросе.
+После паузы пропускается пробный запрос: если он успешен, предохранитель снова замыкается
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+
+class CircuitBreaker:
+    """Предохранитель с окном ошибок и медленных ответов и пробными запросами"""
+
+    # Состояния
+    CLOSED = 'closed'        # Запросы идут как обычно
+    OPEN = 'open'            # Запросы не выполняются, сразу запасной вариант
+    HALF_OPEN = 'half_open'  # Пауза прошла, пропускается пробный запрос
+
+    def __init__(self, name: str, window_seconds: float, min_calls: int, error_rate: float,
+                 slow_seconds: float, slow_rate: float, open_seconds: float, half_open_probes: int = 1):
+        """
+        :param name: Название сервиса для отчета
+        :param window_seconds: Длина скользящего окна статистики
+        :param min_calls: Минимум запросов в окне, чтобы судить о сервисе
+        :param error_rate: Доля ошибок в окне, при которой предохранитель размыкается
+        :param slow_seconds: Запрос дольше этого считается медленным
+        :param slow_rate: Доля медленных запросов в окне, при которой предохранитель размыкается
+        :param open_seconds: Пауза перед пробным запросом
+        :param half_open_probes: Сколько пробных запросов пропускать одновременно
+        """
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CircuitBreaker.CLOSED
+        self._state_since = time.monotonic()
+        self._probes = 0
+
+        # Окно запросов: (момент, успех, длительность)
+        self._calls: Deque[Tuple[float, bool, float]] = deque()
+
+        # Счетчики с момента запуска
+        self.counters = {'calls': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+        # Синхронные скрипты и бот могут пользоваться одним предохранителем
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str, now: float):
+        """Сменить состояние"""
+        if state == CircuitBreaker.OPEN and self.state != CircuitBreaker.OPEN:
+            self.counters['opened'] += 1
+        self.state = state
+        self._state_since = now
+        self._probes = 0
+
+    def _trim(self, now: float):
+        """Убрать из окна запросы старше window_seconds"""
+        while self._calls and self._calls[0][0] <= now - self.window_seconds:
+            self._calls.popleft()
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """
+        Можно ли выполнить запрос (после разрешения обязательно вызвать record)
+
+        :return: False - предохранитель разомкнут, нужен запасной вариант
+        """
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            if self.state == CircuitBreaker.OPEN and now - self._state_since >= self.open_seconds:
+                self._set_state(CircuitBreaker.HALF_OPEN, now)
+
+            if self.state == CircuitBreaker.CLOSED:
+                return True
+            if self.state == CircuitBreaker.HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+
+            self.counters['rejected'] += 1
+            return False
+
+    def retry_after(self, now: Optional[float] = None) -> float:
+        """Сколько секунд до пробного запроса (0 - запросы разрешены)"""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            if self.state != CircuitBreaker.OPEN:
+                return 0.0
+            return max(self.open_seconds - (now - self._state_since), 0.0)
+
+    def record(self, success: bool, duration: float, now: Optional[float] = None):
+        """
+        Учесть результат разрешенного запроса
+
+        :param success: Сервис ответил (ошибка в данных клиента - тоже ответ)
+        :param duration: Длительность запроса (секунды)
+        """
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            self.counters['calls'] += 1
+            if not success:
+                self.counters['failures'] += 1
+
+            if self.state == CircuitBreaker.HALF_OPEN:
+                # Пробный запрос решает сразу: медленный ответ тоже признак, что сервис не восстановился
+                if success and duration < self.slow_seconds:
+                    self._calls.clear()
+                    self._set_state(CircuitBreaker.CLOSED, now)
+                else:
+                    self._set_state(CircuitBreaker.OPEN, now)
+                return
+
+            self._calls.append((now, success, duration))
+            self._trim(now)
+            if self.state == CircuitBreaker.CLOSED and len(self._calls) >= self.min_calls:
+                failures = sum(1 for _, ok, _ in self._calls if not ok)
+                slow = sum(1 for _, _, took in self._calls if took >= self.slow_seconds)
+                if failures >= self.error_rate * len(self._calls) or slow >= self.slow_rate * len(self._calls):
+                    self._set_state(CircuitBreaker.OPEN, now)
+
+    def snapshot(self, now: Optional[float] = None) -> Dict:
+        """Состояние и статистика окна для отчета"""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            self._trim(now)
+            calls = list(self._calls)
+            state = self.state
+            state_seconds = now - self._state_since
+            counters = dict(self.counters)
+
+        durations = sorted(took for _, _, took in calls)
+        return {
+            'state': state,
+            'state_seconds': state_seconds,
+            'window_calls': len(calls),
+            'window_error_rate': sum(1 for _, ok, _ in calls if not ok) / len(calls) if calls else 0.0,
+            'window_slow_rate': sum(1 for took in durations if took >= self.slow_seconds) / len(calls) if calls else 0.0,
+            'window_p95': durations[min(len(durations) - 1, int(len(durations) * 0.95))] if durations else 0.0,
+            **counters
+        }
+
+    def format_report(self) -> str:
+        """Отчет для команды /metrics"""
+        data = self.snapshot()
+        states = {CircuitBreaker.CLOSED: "✅ работает", CircuitBreaker.OPEN: "⛔️ отключен",
+                  CircuitBreaker.HALF_OPEN: "🔄 проверка"}
+        return "\n".join([
+            f"{self.name}: {states[data['state']]} ({data['state_seconds']:.0f} с)",
+            f"За {self.window_seconds:.0f} с: запросов {data['window_calls']}, "
+            f"ошибок {data['window_error_rate']:.0%}, медленных {data['window_slow_rate']:.0%}, "
+            f"p95 {data['window_p95']:.2f} с",
+            f"С запуска: запросов {data['calls']}, ошибок {data['failures']}, "
+            f"отключений {data['opened']}, запасной вариант без запроса {data['rejected']}"
+        ])
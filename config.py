@@ -11,9 +11,100 @@ WORK_START_HOUR = 9  # Начало работы доставки (9:00)
 WORK_END_HOUR = 20   # Конец работы доставки (20:00)
 DELIVERY_INTERVAL = 30  # Интервал между доставками в минутах
 
+# Минимальное время от оформления нового заказа до доставки (в часах)
+MIN_HOURS_TO_ORDER = 4
+
 # Минимальное время для переноса заказа (в часах)
 MIN_HOURS_TO_RESCHEDULE = 4
 
+# На сколько дней вперед можно оформить заказ
+BOOKING_HORIZON_DAYS = 7
+
+# Сколько ближайших свободных слотов предлагать, если выбранный уже занят
+ALTERNATIVE_SLOTS_COUNT = 4
+
+# Сколько минут освободившийся слот закреплен за клиентом из листа ожидания
+WAITLIST_HOLD_MINUTES = 10
+
+# Сколько секунд показанный или выбранный слот закреплен за клиентом
+SLOT_HOLD_SECONDS = 60
+
+# Сколько первых слотов из показанного списка закреплять за клиентом
+SLOT_HOLD_VIEW_COUNT = 3
+
+# Склад, с которого курьеры начинают и заканчивают маршрут
+DEPOT_LATITUDE = float(os.getenv('DEPOT_LATITUDE', '42.8746'))
+DEPOT_LONGITUDE = float(os.getenv('DEPOT_LONGITUDE', '74.5698'))
+
+# Количество курьеров на линии
+COURIERS_COUNT = int(os.getenv('COURIERS_COUNT', '1'))
+
+# Слот считается соседним с заказом того же района, если разница не больше (в минутах)
+WAVE_ADJACENT_MINUTES = 60
+
+# Ограничения отправки сообщений Telegram
+SEND_RATE_PER_SECOND = 30       # Сообщений в секунду на всего бота
+SEND_CHAT_INTERVAL_SECONDS = 1  # Минимальная пауза между сообщениями в один чат
+SEND_CONCURRENCY = 10           # Одновременных запросов к Telegram
+SEND_MAX_RETRIES = 3            # Повторов при сетевых ошибках и превышении лимита
+
+# Повторная отправка напоминаний при ошибках Telegram
+REMINDER_MAX_ATTEMPTS = 5         # Попыток отправки одного напоминания
+REMINDER_RETRY_BASE_SECONDS = 30  # Пауза перед второй попыткой, дальше удваивается
+
+# За сколько минут до волны напоминаний готовить их тексты
+REMINDER_PRERENDER_MINUTES = 5
+
+# Сколько дней хранить на листе напоминаний завершенные (отправленные, отмененные) напоминания
+REMINDER_KEEP_DAYS = 7
+
+# Не раньше чем через столько часов ставить заказы при массовом переносе (замена курьера)
+BULK_RESCHEDULE_MIN_HOURS = 1
+
+# Регулярные заказы: на сколько дней вперед создавать заказы и в котором часу ночи
+SUBSCRIPTION_LOOKAHEAD_DAYS = 7
+SUBSCRIPTION_RUN_HOUR = 2
+
+# Telegram ID сотрудников, которым доступна служебная статистика (через запятую)
+ADMIN_IDS = {int(value) for value in os.getenv('ADMIN_IDS', '').split(',') if value.strip()}
+
 # Файлы для хранения данных
 USERS_FILE = 'users.xlsx'
 ORDERS_FILE = 'orders.xlsx'
+
+# Кэш геокодирования: файл, размер кэша в памяти и срок хранения найденных и ненайденных адресов
+GEOCODE_CACHE_FILE = 'geocode_cache.sqlite3'
+GEOCODE_CACHE_SIZE = 10000
+GEOCODE_CACHE_TTL_DAYS = 30
+GEOCODE_NEGATIVE_TTL_HOURS = 24
+
+# Запросы к Geocoding API: предельное время одного запроса (секунды) и предохранитель,
+# который при ошибках или медленных ответах Google временно переключает проверку на базовую
+GEOCODE_LATENCY_BUDGET_SECONDS = 3
+GEOCODE_BREAKER_WINDOW_SECONDS = 60   # Окно статистики запросов
+GEOCODE_BREAKER_MIN_CALLS = 5         # Минимум запросов в окне для решения
+GEOCODE_BREAKER_ERROR_RATE = 0.5      # Доля ошибок, при которой запросы прекращаются
+GEOCODE_BREAKER_SLOW_SECONDS = 1.5    # Запрос дольше считается медленным
+GEOCODE_BREAKER_SLOW_RATE = 0.8       # Доля медленных запросов, при которой запросы прекращаются
+GEOCODE_BREAKER_OPEN_SECONDS = 30     # Пауза перед пробным запросом
+
+# Заполнение координат для сохраненных адресов: одновременных запросов, запросов в секунду,
+# адресов между сохранениями файлов и файл контрольной точки
+GEOCODE_BACKFILL_CONCURRENCY = 5
+GEOCODE_BACKFILL_RATE = 10
+GEOCODE_BACKFILL_BATCH = 200
+GEOCODE_BACKFILL_CHECKPOINT = 'geocode_backfill.json'
+
+# Офлайн-справочник улиц Бишкека. Название с опечаткой принимается при сходстве (0-1) не ниже
+# GAZETTEER_MIN_SIMILARITY и отрыве от следующей похожей улицы не меньше GAZETTEER_MIN_MARGIN,
+# иначе адрес проверяет Google: "Иванова" не должна получить координаты улицы Исанова
+GAZETTEER_FILE = 'gazetteer.json'
+GAZETTEER_MIN_SIMILARITY = 0.8
+GAZETTEER_MIN_MARGIN = 0.1
+
+# Границы районов Бишкека (GeoJSON) и число клеток сетки индекса по каждой стороне
+DISTRICTS_FILE = 'districts.geojson'
+DISTRICT_GRID_SIZE = 64
+
+# Календарь исключений: выходные, сокращенные дни и дополнительные смены
+CALENDAR_FILE = 'calendar.json'
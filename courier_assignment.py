@@ -0,0 +1,456 @@
+"""
+Модуль распределения заказов между курьерами
+Кластеризует заказы дня по координатам (k-means на NumPy) с балансировкой
+по количеству бутылок и поддерживает распределение при добавлении и отмене заказов
+"""
+
+import argparse
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config import COURIERS_COUNT
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class CourierAssignment:
+    """Распределение заказов дня между курьерами"""
+
+    # Допустимое отклонение загрузки курьера от средней (в долях) в обе стороны
+    CAPACITY_SLACK = 0.15
+
+    # Если загрузка курьера превысила емкость во столько раз, пересчитываем день целиком
+    REBALANCE_THRESHOLD = 1.3
+
+    # Состояние кластеризации по датам: центры, загрузки и назначения заказов
+    _states: Dict[str, Dict] = {}
+
+    @staticmethod
+    def _km_scale(latitude: float) -> np.ndarray:
+        """Километров в градусе широты и долготы на заданной широте"""
+        return np.array([111.32, 111.32 * np.cos(np.radians(latitude))])
+
+    @staticmethod
+    def _project(coords: np.ndarray) -> np.ndarray:
+        """
+        Перевести широту и долготу в локальные координаты в километрах
+
+        В пределах города равнопромежуточной проекции достаточно для кластеризации.
+        """
+        return coords * CourierAssignment._km_scale(coords[:, 0].mean())
+
+    @staticmethod
+    def _init_centroids(points: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+        """Начальные центры методом k-means++"""
+        centroids = [points[rng.integers(len(points))]]
+
+        for _ in range(1, k):
+            sq_dist = ((points[:, None, :] - np.array(centroids)[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+            total = sq_dist.sum()
+            if total == 0:
+                centroids.append(points[rng.integers(len(points))])
+            else:
+                centroids.append(points[rng.choice(len(points), p=sq_dist / total)])
+
+        return np.array(centroids)
+
+    @staticmethod
+    def _rebalance(dist: np.ndarray, weights: np.ndarray, labels: np.ndarray, loads: np.ndarray,
+                   min_load: float, capacity: float):
+        """
+        Догрузить недогруженные кластеры пограничными точками соседей
+
+        Пока у какого-то кластера загрузка ниже min_load, в него переходит точка из кластера
+        с загрузкой выше средней, для которой переход удлиняет путь меньше всего
+        (и донор не опускается ниже min_load). Массивы labels и loads меняются на месте.
+        """
+        mean_load = loads.sum() / len(loads)
+
+        for _ in range(len(labels)):
+            under = np.flatnonzero(loads < min_load)
+            if not len(under):
+                return
+            target = int(under[np.argmin(loads[under])])
+
+            donors = loads[labels] > mean_load
+            movable = donors & (loads[labels] - weights >= min_load) & (loads[target] + weights <= capacity)
+            movable &= labels != target
+            if not movable.any():
+                return
+
+            # Сколько добавит переход: расстояние до нового центра минус до текущего
+            cost = np.where(movable, dist[:, target] - dist[np.arange(len(labels)), labels], np.inf)
+            point = int(np.argmin(cost))
+            loads[labels[point]] -= weights[point]
+            loads[target] += weights[point]
+            labels[point] = target
+
+    @staticmethod
+    def _capacitated_assign(dist: np.ndarray, weights: np.ndarray, capacity: float,
+                            min_load: float = 0.0) -> np.ndarray:
+        """
+        Назначить точки ближайшим центрам с ограничением загрузки кластера сверху и снизу
+
+        Пары (точка, центр) перебираются по возрастанию расстояния; точка уходит
+        в ближайший центр, у которого еще хватает емкости. Затем недогруженные кластеры
+        забирают пограничные точки у перегруженных.
+        """
+        n, k = dist.shape
+        labels = np.full(n, -1, dtype=int)
+        loads = np.zeros(k)
+
+        for flat_index in np.argsort(dist, axis=None):
+            point, cluster = divmod(int(flat_index), k)
+            if labels[point] != -1 or loads[cluster] + weights[point] > capacity:
+                continue
+            labels[point] = cluster
+            loads[cluster] += weights[point]
+
+        # Точки, которые не влезли ни в один кластер, отдаем наименее загруженному
+        for point in np.flatnonzero(labels == -1):
+            cluster = int(np.argmin(loads))
+            labels[point] = cluster
+            loads[cluster] += weights[point]
+
+        CourierAssignment._rebalance(dist, weights, labels, loads, min_load, capacity)
+        return labels
+
+    @staticmethod
+    def balanced_kmeans(coords: np.ndarray, weights: np.ndarray, k: int,
+                        max_iterations: int = 30, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Кластеризация k-means с балансировкой кластеров по весу
+
+        :param coords: Массив (N, 2) с широтой и долготой
+        :param weights: Веса точек (количество бутылок)
+        :param k: Количество кластеров (курьеров)
+        :param max_iterations: Максимальное количество итераций
+        :param seed: Зерно генератора для воспроизводимости
+        :return: Tuple (номер кластера для каждой точки, центры кластеров в градусах)
+        """
+        k = max(1, min(k, len(coords)))
+        points = CourierAssignment._project(coords)
+        capacity = weights.sum() / k * (1 + CourierAssignment.CAPACITY_SLACK)
+        min_load = weights.sum() / k * (1 - CourierAssignment.CAPACITY_SLACK)
+
+        rng = np.random.default_rng(seed)
+        centroids = CourierAssignment._init_centroids(points, k, rng)
+        labels = None
+
+        for _ in range(max_iterations):
+            dist = np.sqrt(((points[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2))
+            new_labels = CourierAssignment._capacitated_assign(dist, weights, capacity, min_load)
+
+            if labels is not None and np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+
+            # Центр кластера - среднее координат, взвешенное по бутылкам
+            one_hot = np.eye(k)[labels] * weights[:, None]
+            totals = one_hot.sum(axis=0)
+            non_empty = totals > 0
+            centroids[non_empty] = (one_hot.T @ points)[non_empty] / totals[non_empty, None]
+
+        # Центры в градусах нужны для дальнейших инкрементальных назначений
+        geo_centroids = np.zeros((k, 2))
+        for cluster in range(k):
+            members = labels == cluster
+            if members.any():
+                geo_centroids[cluster] = np.average(coords[members], axis=0, weights=weights[members])
+            else:
+                geo_centroids[cluster] = coords.mean(axis=0)
+
+        return labels, geo_centroids
+
+    @staticmethod
+    def _order_weight(order: Dict) -> float:
+        """Вес заказа для балансировки - количество бутылок"""
+        try:
+            return float(order.get('bottles') or 1)
+        except (TypeError, ValueError):
+            return 1.0
+
+    @staticmethod
+    def assign_day(date_str: str, couriers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Полностью распределить заказы на дату между курьерами и сохранить назначения
+
+        :param date_str: Дата доставки в формате YYYY-MM-DD
+        :param couriers: Количество курьеров (по умолчанию COURIERS_COUNT)
+        :return: Словарь {order_id: номер курьера}
+        """
+        couriers = couriers or COURIERS_COUNT
+        orders = [
+            order for order in Database.get_orders_for_date(date_str)
+            if order.get('latitude') and order.get('longitude')
+        ]
+
+        if not orders:
+            CourierAssignment._states.pop(date_str, None)
+            return {}
+
+        coords = np.array([[o['latitude'], o['longitude']] for o in orders], dtype=float)
+        weights = np.array([CourierAssignment._order_weight(o) for o in orders])
+        labels, centroids = CourierAssignment.balanced_kmeans(coords, weights, couriers)
+
+        assignments = {order['order_id']: int(label) + 1 for order, label in zip(orders, labels)}
+        loads = np.bincount(labels, weights=weights, minlength=len(centroids))
+
+        CourierAssignment._states[date_str] = {
+            'couriers': couriers,
+            'centroids': centroids,
+            'loads': loads,
+            'orders': {
+                order['order_id']: (int(label), coords[i], weights[i])
+                for i, (order, label) in enumerate(zip(orders, labels))
+            }
+        }
+
+        Database.update_order_couriers(date_str, assignments)
+        logger.info(f"Заказы на {date_str} распределены между {len(centroids)} курьерами: {len(assignments)} заказов")
+        return assignments
+
+    @staticmethod
+    def _place(state: Dict, order: Dict, exclude: Optional[int] = None) -> int:
+        """
+        Выбрать кластер для заказа и обновить состояние дня
+
+        :param state: Состояние кластеризации дня
+        :param order: Заказ с координатами
+        :param exclude: Номер кластера, которому нельзя назначать заказ
+        :return: Номер кластера
+        """
+        point = np.array([order['latitude'], order['longitude']], dtype=float)
+        weight = CourierAssignment._order_weight(order)
+        centroids, loads = state['centroids'], state['loads']
+
+        total = loads.sum() + weight
+        capacity = total / len(centroids) * (1 + CourierAssignment.CAPACITY_SLACK)
+
+        # Ближайший курьер, у которого есть запас емкости, иначе наименее загруженный
+        # (расстояние в километрах, как при кластеризации)
+        dist = np.sqrt((((centroids - point) * CourierAssignment._km_scale(point[0])) ** 2).sum(axis=1))
+        fits = loads + weight <= capacity
+        allowed = np.ones(len(centroids), dtype=bool)
+        if exclude is not None and len(centroids) > 1:
+            allowed[exclude] = False
+        fits &= allowed
+        if fits.any():
+            cluster = int(np.argmin(np.where(fits, dist, np.inf)))
+        else:
+            cluster = int(np.argmin(np.where(allowed, loads, np.inf)))
+
+        CourierAssignment._add(state, order['order_id'], cluster, point, weight)
+        return cluster
+
+    @staticmethod
+    def _add(state: Dict, order_id: str, cluster: int, point: np.ndarray, weight: float):
+        """Добавить заказ в кластер: центр сдвигается к новой точке (взвешенное скользящее среднее)"""
+        centroids, loads = state['centroids'], state['loads']
+        new_load = loads[cluster] + weight
+        centroids[cluster] = (centroids[cluster] * loads[cluster] + point * weight) / new_load
+        loads[cluster] = new_load
+        state['orders'][order_id] = (cluster, point, weight)
+
+    @staticmethod
+    def _remove(state: Dict, order_id: str) -> bool:
+        """
+        Убрать заказ из кластера дня
+
+        :return: True если заказ был в состоянии дня
+        """
+        entry = state['orders'].pop(order_id, None)
+        if entry is None:
+            return False
+
+        cluster, point, weight = entry
+        centroids, loads = state['centroids'], state['loads']
+        remaining = loads[cluster] - weight
+
+        if remaining > 0:
+            centroids[cluster] = (centroids[cluster] * loads[cluster] - point * weight) / remaining
+        loads[cluster] = max(remaining, 0.0)
+        return True
+
+    @staticmethod
+    def _restore_state(date_str: str, couriers: Optional[int] = None) -> Optional[Dict]:
+        """
+        Восстановить состояние дня по сохраненным назначениям курьеров (после перезапуска бота)
+
+        Центры курьеров - средние координаты их заказов, взвешенные по бутылкам; кластеризация
+        и сохранение файла не нужны.
+
+        :return: Состояние дня или None, если день еще не распределялся
+        """
+        orders = [
+            order for order in Database.get_orders_for_date(date_str)
+            if order.get('latitude') and order.get('longitude') and order.get('courier')
+        ]
+        if not orders:
+            return None
+
+        couriers = max(couriers or COURIERS_COUNT, max(int(order['courier']) for order in orders))
+        coords = np.array([[o['latitude'], o['longitude']] for o in orders], dtype=float)
+        weights = np.array([CourierAssignment._order_weight(o) for o in orders])
+        labels = np.array([int(order['courier']) - 1 for order in orders])
+
+        loads = np.bincount(labels, weights=weights, minlength=couriers).astype(float)
+        centroids = np.tile(coords.mean(axis=0), (couriers, 1))
+        for cluster in np.flatnonzero(loads > 0):
+            members = labels == cluster
+            centroids[cluster] = np.average(coords[members], axis=0, weights=weights[members])
+
+        state = {
+            'couriers': couriers,
+            'centroids': centroids,
+            'loads': loads,
+            'orders': {
+                order['order_id']: (int(label), coords[i], weights[i])
+                for i, (order, label) in enumerate(zip(orders, labels))
+            }
+        }
+        CourierAssignment._states[date_str] = state
+        return state
+
+    @staticmethod
+    def _get_state(date_str: str) -> Optional[Dict]:
+        """Состояние дня из памяти или из сохраненных назначений"""
+        return CourierAssignment._states.get(date_str) or CourierAssignment._restore_state(date_str)
+
+    @staticmethod
+    def on_order_added(date_str: str, order: Dict) -> Optional[int]:
+        """
+        Назначить курьера новому заказу без пересчета всего дня
+
+        :param date_str: Дата доставки
+        :param order: Заказ с координатами
+        :return: Номер курьера или None, если у заказа нет координат
+        """
+        if not order.get('latitude') or not order.get('longitude'):
+            return None
+
+        state = CourierAssignment._get_state(date_str)
+        if not state:
+            # Первый заказ дня с координатами: распределять еще нечего, кроме него самого
+            return CourierAssignment.assign_day(date_str).get(order['order_id'])
+
+        # Заказ уже в состоянии (восстановлено из файла вместе с ним) - пересчитываем его место
+        CourierAssignment.on_order_removed(order['order_id'])
+        cluster = CourierAssignment._place(state, order)
+        loads = state['loads']
+        capacity = loads.sum() / len(loads) * (1 + CourierAssignment.CAPACITY_SLACK)
+
+        # Если распределение сильно разбалансировалось, пересчитываем день целиком
+        if loads.max() > capacity * CourierAssignment.REBALANCE_THRESHOLD:
+            return CourierAssignment.assign_day(date_str, state['couriers']).get(order['order_id'])
+
+        Database.update_order_couriers(date_str, {order['order_id']: cluster + 1})
+        return cluster + 1
+
+    @staticmethod
+    def on_order_removed(order_id: str) -> bool:
+        """
+        Убрать отмененный или перенесенный заказ из распределения
+
+        :param order_id: ID заказа
+        :return: True если заказ был в распределении
+        """
+        return any(CourierAssignment._remove(state, order_id) for state in CourierAssignment._states.values())
+
+    @staticmethod
+    def place_orders(date_str: str, orders: List[Dict], exclude_courier: Optional[int] = None) -> Dict[str, int]:
+        """
+        Назначить курьеров нескольким заказам дня без сохранения в файл
+
+        Используется при массовом переносе: назначения записываются вместе с заказами.
+        Если день еще не распределялся, заказы получат курьеров при его распределении.
+
+        :param date_str: Дата доставки
+        :param orders: Заказы (без координат пропускаются)
+        :param exclude_courier: Курьер, которому нельзя назначать заказы (например, заболевший)
+        :return: Словарь {order_id: номер курьера}
+        """
+        state = CourierAssignment._get_state(date_str)
+        if not state:
+            return {}
+        return CourierAssignment._place_all(state, orders, exclude_courier)
+
+    @staticmethod
+    def _place_all(state: Dict, orders: List[Dict], exclude_courier: Optional[int]) -> Dict[str, int]:
+        """Разместить заказы с координатами в состоянии дня по одному"""
+        exclude = exclude_courier - 1 if exclude_courier else None
+        return {
+            order['order_id']: CourierAssignment._place(state, order, exclude) + 1
+            for order in orders
+            if order.get('latitude') and order.get('longitude')
+        }
+
+    @staticmethod
+    def plan_orders(date_str: str, orders: List[Dict], exclude_courier: Optional[int] = None,
+                    removed: Iterable[str] = ()) -> Dict[str, int]:
+        """
+        Подобрать курьеров нескольким заказам дня, не меняя распределение
+
+        Используется при массовом переносе: назначения записываются вместе с заказами,
+        а распределение обновляется через apply_orders только для заказов, которые удалось перенести.
+
+        :param date_str: Дата доставки
+        :param orders: Заказы (без координат пропускаются)
+        :param exclude_courier: Курьер, которому нельзя назначать заказы (например, заболевший)
+        :param removed: ID заказов, которые уходят из дня (в том числе сами переносимые заказы)
+        :return: Словарь {order_id: номер курьера}
+        """
+        state = CourierAssignment._get_state(date_str)
+        if not state:
+            return {}
+
+        # Подбираем на копии состояния, чтобы неудачный перенос не исказил распределение
+        state = dict(state, centroids=state['centroids'].copy(), loads=state['loads'].copy(),
+                     orders=dict(state['orders']))
+        for order_id in set(removed) | {order['order_id'] for order in orders}:
+            CourierAssignment._remove(state, order_id)
+        return CourierAssignment._place_all(state, orders, exclude_courier)
+
+    @staticmethod
+    def apply_orders(date_str: str, orders: List[Dict], couriers: Dict[str, int]):
+        """
+        Учесть в распределении заказы, уже сохраненные на дату с назначенными курьерами
+
+        :param date_str: Дата доставки
+        :param orders: Перенесенные заказы
+        :param couriers: Словарь {order_id: номер курьера}, как его вернул plan_orders
+        """
+        for order in orders:
+            CourierAssignment.on_order_removed(order['order_id'])
+
+        if date_str not in CourierAssignment._states:
+            # Состояние дня восстановится из файла, где назначения уже сохранены
+            return
+
+        state = CourierAssignment._states[date_str]
+        for order in orders:
+            courier = couriers.get(order['order_id'])
+            if courier and courier <= len(state['loads']):
+                point = np.array([order['latitude'], order['longitude']], dtype=float)
+                CourierAssignment._add(state, order['order_id'], courier - 1, point,
+                                       CourierAssignment._order_weight(order))
+
+
+def main():
+    """Распределение заказов на дату из командной строки"""
+    parser = argparse.ArgumentParser(description="Распределение заказов между курьерами")
+    parser.add_argument('date', help="Дата доставки в формате YYYY-MM-DD")
+    parser.add_argument('--couriers', type=int, default=COURIERS_COUNT, help="Количество курьеров")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    assignments = CourierAssignment.assign_day(args.date, args.couriers)
+    for order_id, courier in sorted(assignments.items(), key=lambda item: item[1]):
+        print(f"Курьер {courier}: {order_id}")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,30 @@ from config import USERS_FILE, ORDERS_FILE
 class Database:
     """Класс для работы с Excel файлами"""
 
+    # Служебный лист файла заказов с запланированными напоминаниями
+    REMINDERS_SHEET = 'Напоминания'
+
+    # Статусы напоминаний
+    REMINDER_PENDING = 'Ожидает'
+    REMINDER_SENDING = 'Отправляется'
+    REMINDER_SENT = 'Отправлено'
+    REMINDER_CANCELLED = 'Отменено'
+    REMINDER_MISSED = 'Пропущено'
+    REMINDER_FAILED = 'Ошибка'
+
+    # Статусы напоминаний, которые еще могут быть отправлены (остальные - завершенные)
+    REMINDER_ACTIVE = (REMINDER_PENDING, REMINDER_SENDING)
+
+    # Строки активных напоминаний: {ключ: номер строки на листе}; None - индекс еще не построен
+    _reminder_rows = None
+
+    # Служебный лист файла заказов с регулярными заказами клиентов
+    SUBSCRIPTIONS_SHEET = 'Подписки'
+
+    # Статусы подписок
+    SUBSCRIPTION_ACTIVE = 'Активна'
+    SUBSCRIPTION_CANCELLED = 'Отменена'
+
     @staticmethod
     def _format_headers(ws):
         """Форматирование заголовков листа"""
@@ -32,7 +56,8 @@ class Database:
             wb = Workbook()
             ws = wb.active
             ws.title = "Пользователи"
-            headers = ['User ID', 'Имя', 'Телефон', 'Адрес', 'Дата регистрации']
+            headers = ['User ID', 'Имя', 'Телефон', 'Адрес', 'Дата регистрации', 'Напоминания',
+                       'Широта', 'Долгота', 'Район']
             ws.append(headers)
             Database._format_headers(ws)
             wb.save(USERS_FILE)
@@ -44,10 +69,7 @@ class Database:
             wb = Workbook()
             ws = wb.active
             ws.title = datetime.now().strftime('%Y-%m-%d')
-            headers = ['Номер заказа', 'User ID', 'Имя', 'Телефон', 'Адрес',
-                      'Дата заказа', 'Время доставки', 'Количество бутылок', 'Статус',
-                      'Morning Reminder ID', 'Pre-delivery Reminder ID']
-            ws.append(headers)
+            ws.append(Database._get_order_headers())
             Database._format_headers(ws)
             wb.save(ORDERS_FILE)
 
@@ -67,10 +89,47 @@ class Database:
                     'name': row[1],
                     'phone': row[2],
                     'address': row[3],
-                    'registration_date': row[4]
+                    'registration_date': row[4],
+                    'reminder_policy': row[5] if len(row) > 5 else None
                 }
         return None
 
+    @staticmethod
+    def get_user_reminder_policies():
+        """
+        Получить настройки напоминаний всех клиентов за одно чтение файла
+
+        :return: Словарь {user_id: настройка} только для клиентов с заданной настройкой
+        """
+        if not os.path.exists(USERS_FILE):
+            return {}
+
+        wb = openpyxl.load_workbook(USERS_FILE)
+        return {
+            row[0]: row[5]
+            for row in wb.active.iter_rows(min_row=2, values_only=True)
+            if row[0] and len(row) > 5 and row[5]
+        }
+
+    @staticmethod
+    def get_users_by_ids(user_ids):
+        """
+        Получить пользователей по списку ID за одно чтение файла
+
+        :param user_ids: Коллекция ID пользователей
+        :return: Словарь {user_id: данные пользователя}
+        """
+        if not user_ids or not os.path.exists(USERS_FILE):
+            return {}
+
+        wanted = set(user_ids)
+        wb = openpyxl.load_workbook(USERS_FILE)
+        return {
+            row[0]: {'user_id': row[0], 'name': row[1], 'phone': row[2], 'address': row[3]}
+            for row in wb.active.iter_rows(min_row=2, values_only=True)
+            if row[0] in wanted
+        }
+
     @staticmethod
     def save_user(user_id, name, phone, address):
         """Сохранить или обновить данные пользователя"""
@@ -81,6 +140,8 @@ class Database:
         # Ищем существующего пользователя
         for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
             if row[0].value == user_id:
+                if row[3].value != address:
+                    Database._clear_user_location(ws, idx)
                 ws.cell(idx, 2, name)
                 ws.cell(idx, 3, phone)
                 ws.cell(idx, 4, address)
@@ -91,12 +152,19 @@ class Database:
         ws.append([user_id, name, phone, address, datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
         wb.save(USERS_FILE)
 
+    @staticmethod
+    def _order_sheet_names(wb):
+        """Листы с заказами (без служебных листов)"""
+        return [name for name in wb.sheetnames
+                if name not in (Database.REMINDERS_SHEET, Database.SUBSCRIPTIONS_SHEET)]
+
     @staticmethod
     def _get_order_headers():
         """Получить заголовки для листа заказов"""
         return ['Номер заказа', 'User ID', 'Имя', 'Телефон', 'Адрес',
                 'Дата заказа', 'Время доставки', 'Количество бутылок', 'Статус',
-                'Morning Reminder ID', 'Pre-delivery Reminder ID']
+                'Morning Reminder ID', 'Pre-delivery Reminder ID',
+                'Широта', 'Долгота', 'Район', 'Курьер']
 
     @staticmethod
     def _parse_order_row(row, delivery_date=None):
@@ -116,6 +184,10 @@ class Database:
             'status': row[8] if len(row) > 8 else 'Новый',
             'morning_reminder_id': row[9] if len(row) > 9 else None,
             'pre_delivery_reminder_id': row[10] if len(row) > 10 else None,
+            'latitude': row[11] if len(row) > 11 else None,
+            'longitude': row[12] if len(row) > 12 else None,
+            'district': row[13] if len(row) > 13 else None,
+            'courier': row[14] if len(row) > 14 else None,
             'delivery_date': delivery_date
         }
 
@@ -140,8 +212,20 @@ class Database:
         return orders
 
     @staticmethod
-    def save_order(user_id, name, phone, address, delivery_date, delivery_time, bottles=1):
-        """Сохранить заказ"""
+    def new_order_id():
+        """Сгенерировать ID нового заказа"""
+        return f"ORD-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+    @staticmethod
+    def save_order(user_id, name, phone, address, delivery_date, delivery_time, bottles=1,
+                   latitude=None, longitude=None, district=None, order_id=None, reminders=None):
+        """
+        Сохранить заказ
+
+        :param order_id: ID заказа (если не указан, генерируется)
+        :param reminders: Напоминания заказа, которые сохраняются тем же сохранением файла
+        :return: ID заказа
+        """
         Database.init_orders_file()
         wb = openpyxl.load_workbook(ORDERS_FILE)
         date_str = delivery_date.strftime('%Y-%m-%d')
@@ -153,10 +237,12 @@ class Database:
             ws = wb[date_str]
 
         # Генерируем уникальный ID заказа
-        order_id = f"ORD-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        order_id = order_id or Database.new_order_id()
         order_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-        ws.append([order_id, user_id, name, phone, address, order_date, delivery_time, bottles, "Новый"])
+        ws.append([order_id, user_id, name, phone, address, order_date, delivery_time, bottles, "Новый",
+                   None, None, latitude, longitude, district])
+        Database._append_reminders(wb, reminders or [])
         wb.save(ORDERS_FILE)
 
         return order_id
@@ -170,7 +256,7 @@ class Database:
         wb = openpyxl.load_workbook(ORDERS_FILE)
         user_orders = []
 
-        for sheet_name in wb.sheetnames:
+        for sheet_name in Database._order_sheet_names(wb):
             ws = wb[sheet_name]
             for row in ws.iter_rows(min_row=2, values_only=True):
                 if row[0] and row[1] == user_id:
@@ -207,25 +293,35 @@ class Database:
 
     @staticmethod
     def _find_and_delete_order(order_id):
-        """Найти и удалить заказ из базы"""
+        """
+        Найти и удалить заказ из базы
+
+        :return: (дата, время доставки) удаленного заказа или False, если заказ не найден
+        """
         if not os.path.exists(ORDERS_FILE):
             return False
 
         wb = openpyxl.load_workbook(ORDERS_FILE)
 
-        for sheet_name in wb.sheetnames:
+        for sheet_name in Database._order_sheet_names(wb):
             ws = wb[sheet_name]
             for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
                 if row[0].value == order_id:
+                    delivery_time = row[6].value
                     ws.delete_rows(idx)
+                    Database._cancel_order_reminders(wb, {order_id})
                     wb.save(ORDERS_FILE)
-                    return True
+                    return sheet_name, delivery_time
 
         return False
 
     @staticmethod
     def cancel_order(order_id):
-        """Отменить заказ (удалить из базы, чтобы освободить время)"""
+        """
+        Отменить заказ (удалить из базы, чтобы освободить время)
+
+        :return: (дата, время доставки) освободившегося слота или False, если заказ не найден
+        """
         return Database._find_and_delete_order(order_id)
 
     @staticmethod
@@ -241,7 +337,7 @@ class Database:
 
         wb = openpyxl.load_workbook(ORDERS_FILE)
 
-        for sheet_name in wb.sheetnames:
+        for sheet_name in Database._order_sheet_names(wb):
             ws = wb[sheet_name]
             for row in ws.iter_rows(min_row=2, values_only=True):
                 if row[0] == order_id:
@@ -268,40 +364,67 @@ class Database:
         return True
 
     @staticmethod
-    def reschedule_order(order_id, new_date_str, new_time_str):
-        """Перенести заказ на новую дату и время"""
-        order = Database.get_order_by_id(order_id)
-        if not order or not Database._find_and_delete_order(order_id):
-            return False
-
-        wb = openpyxl.load_workbook(ORDERS_FILE)
-
-        # Создаем или получаем лист для новой даты
-        if new_date_str not in wb.sheetnames:
-            ws = Database._create_sheet_with_headers(wb, new_date_str, Database._get_order_headers())
-        else:
-            ws = wb[new_date_str]
-
-        # Добавляем заказ с новым временем
-        ws.append([
-            order['order_id'],
-            order['user_id'],
-            order['name'],
-            order['phone'],
-            order['address'],
-            order['order_date'],
-            new_time_str,
-            order['bottles'],
-            'Перенесен'
-        ])
+    def reschedule_order(order_id, new_date_str, new_time_str, reminders=None):
+        """
+        Перенести заказ на новую дату и время
 
-        wb.save(ORDERS_FILE)
-        return True
+        :param reminders: Напоминания на новое время, которые сохраняются вместе с заказом
+        """
+        # Перенос, отмена старых напоминаний и новые напоминания - одно сохранение файла
+        return bool(Database.reschedule_orders({order_id: (new_date_str, new_time_str, None)}, reminders))
 
     @staticmethod
-    def update_order_schedule(order_id, new_date_str, new_time_str):
+    def update_order_schedule(order_id, new_date_str, new_time_str, reminders=None):
         """Обновить дату и время заказа (алиас для reschedule_order)"""
-        return Database.reschedule_order(order_id, new_date_str, new_time_str)
+        return Database.reschedule_order(order_id, new_date_str, new_time_str, reminders)
+
+    @staticmethod
+    def reschedule_orders(moves, reminders=None):
+        """
+        Перенести сразу несколько заказов одним сохранением файла
+
+        :param moves: Словарь {order_id: (новая дата, новое время, курьер или None)}
+        :param reminders: Напоминания на новое время, которые сохраняются вместе с заказами
+        :return: Список ID перенесенных заказов
+        """
+        if not moves or not os.path.exists(ORDERS_FILE):
+            return []
+
+        wb = openpyxl.load_workbook(ORDERS_FILE)
+        headers_count = len(Database._get_order_headers())
+        found = {}
+
+        for sheet_name in Database._order_sheet_names(wb):
+            ws = wb[sheet_name]
+            rows = [
+                (idx, row) for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2)
+                if row[0] in moves
+            ]
+            # Удаляем снизу вверх, чтобы не сдвигать номера еще не удаленных строк
+            for idx, row in reversed(rows):
+                found[row[0]] = list(row) + [None] * (headers_count - len(row))
+                ws.delete_rows(idx)
+
+        for order_id, values in found.items():
+            new_date_str, new_time_str, courier = moves[order_id]
+            if new_date_str not in wb.sheetnames:
+                ws = Database._create_sheet_with_headers(wb, new_date_str, Database._get_order_headers())
+            else:
+                ws = wb[new_date_str]
+
+            # Время (колонка 7), статус (9), старые ID напоминаний (10-11) и курьер (15)
+            values[6] = new_time_str
+            values[8] = 'Перенесен'
+            values[9] = values[10] = None
+            values[14] = courier
+            ws.append(values[:headers_count])
+
+        if found:
+            # Напоминания к прежнему времени доставки больше не нужны
+            Database._cancel_order_reminders(wb, set(found))
+            Database._append_reminders(wb, reminders or [])
+            wb.save(ORDERS_FILE)
+        return list(found)
 
     @staticmethod
     def _update_user_field(user_id, field_index, value):
@@ -331,50 +454,578 @@ class Database:
         from utils import format_kyrgyzstan_phone
         return Database._update_user_field(user_id, 3, format_kyrgyzstan_phone(new_phone))
 
+    @staticmethod
+    def _clear_user_location(ws, idx):
+        """Сбросить координаты и район пользователя (колонки 7-9) при смене адреса"""
+        for column in (7, 8, 9):
+            if ws.cell(idx, column).value is not None:
+                ws.cell(idx, column).value = None
+
     @staticmethod
     def update_user_address(user_id, new_address):
-        """Обновить адрес пользователя"""
-        return Database._update_user_field(user_id, 4, new_address)
+        """Обновить адрес пользователя (координаты прежнего адреса сбрасываются)"""
+        if not os.path.exists(USERS_FILE):
+            return False
+
+        wb = openpyxl.load_workbook(USERS_FILE)
+        ws = wb.active
+
+        for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
+            if row[0].value == user_id:
+                ws.cell(idx, 4, new_address)
+                Database._clear_user_location(ws, idx)
+                wb.save(USERS_FILE)
+                return True
+
+        return False
 
     @staticmethod
-    def update_order_reminder_ids(order_id, morning_msg_id, pre_delivery_msg_id):
+    def iter_users_without_location():
         """
-        Обновить ID запланированных сообщений для заказа
+        Пользователи с адресом, но без координат (файл читается потоком)
 
-        :param order_id: ID заказа
-        :param morning_msg_id: ID утреннего напоминания
-        :param pre_delivery_msg_id: ID напоминания за 30 минут
-        :return: True если успешно, False если нет
+        :return: Генератор словарей с ключами 'user_id' и 'address'
         """
-        if not os.path.exists(ORDERS_FILE):
+        if not os.path.exists(USERS_FILE):
+            return
+
+        wb = openpyxl.load_workbook(USERS_FILE, read_only=True)
+        try:
+            for row in wb.active.iter_rows(min_row=2, values_only=True):
+                if row and row[0] and len(row) > 3 and row[3] and (len(row) < 7 or row[6] is None):
+                    yield {'user_id': row[0], 'address': row[3]}
+        finally:
+            wb.close()
+
+    @staticmethod
+    def update_user_locations(locations):
+        """
+        Записать координаты и район адресов пользователей одним сохранением файла
+
+        :param locations: Словарь {user_id: (latitude, longitude, district)}
+        :return: Количество обновленных пользователей
+        """
+        if not locations or not os.path.exists(USERS_FILE):
+            return 0
+
+        wb = openpyxl.load_workbook(USERS_FILE)
+        ws = wb.active
+        # Файлы, созданные до появления колонок с координатами
+        for column, header in ((7, 'Широта'), (8, 'Долгота'), (9, 'Район')):
+            if ws.cell(1, column).value is None:
+                ws.cell(1, column).value = header
+        Database._format_headers(ws)
+
+        updated = 0
+        for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
+            location = locations.get(row[0].value)
+            if location:
+                latitude, longitude, district = location
+                ws.cell(idx, 7, latitude)
+                ws.cell(idx, 8, longitude)
+                ws.cell(idx, 9, district)
+                updated += 1
+
+        if updated:
+            wb.save(USERS_FILE)
+        return updated
+
+    @staticmethod
+    def update_user_reminder_policy(user_id, policy):
+        """Обновить настройку напоминаний пользователя"""
+        if not os.path.exists(USERS_FILE):
             return False
 
+        wb = openpyxl.load_workbook(USERS_FILE)
+        ws = wb.active
+
+        # В файлах, созданных до появления настройки, колонки еще нет
+        if not ws.cell(1, 6).value:
+            ws.cell(1, 6, 'Напоминания')
+            Database._format_headers(ws)
+
+        for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
+            if row[0].value == user_id:
+                ws.cell(idx, 6, policy)
+                wb.save(USERS_FILE)
+                return True
+
+        return False
+
+    @staticmethod
+    def update_order_locations(date_str, locations):
+        """
+        Записать координаты и район для заказов на дату одним сохранением файла
+
+        :param date_str: Дата доставки в формате YYYY-MM-DD или None - заказы на все даты
+        :param locations: Словарь {order_id: (latitude, longitude, district)}
+        :return: Количество обновленных заказов
+        """
+        if not locations or not os.path.exists(ORDERS_FILE):
+            return 0
+
         wb = openpyxl.load_workbook(ORDERS_FILE)
+        if date_str is None:
+            sheet_names = Database._order_sheet_names(wb)
+        elif date_str in wb.sheetnames:
+            sheet_names = [date_str]
+        else:
+            return 0
 
-        for sheet_name in wb.sheetnames:
+        updated = 0
+        for sheet_name in sheet_names:
             ws = wb[sheet_name]
             for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
-                if row[0].value == order_id:
-                    # Обновляем ID сообщений (колонки 10 и 11)
-                    ws.cell(idx, 10, morning_msg_id)
-                    ws.cell(idx, 11, pre_delivery_msg_id)
-                    wb.save(ORDERS_FILE)
-                    return True
+                location = locations.get(row[0].value)
+                if location:
+                    latitude, longitude, district = location
+                    # Координаты и район (колонки 12-14)
+                    ws.cell(idx, 12, latitude)
+                    ws.cell(idx, 13, longitude)
+                    ws.cell(idx, 14, district)
+                    updated += 1
+
+        if updated:
+            wb.save(ORDERS_FILE)
+        return updated
 
-        return False
+    @staticmethod
+    def update_order_couriers(date_str, assignments):
+        """
+        Записать назначенных курьеров для заказов на дату одним сохранением файла
+
+        :param date_str: Дата доставки в формате YYYY-MM-DD
+        :param assignments: Словарь {order_id: номер курьера}
+        :return: Количество обновленных заказов
+        """
+        if not assignments or not os.path.exists(ORDERS_FILE):
+            return 0
+
+        wb = openpyxl.load_workbook(ORDERS_FILE)
+        if date_str not in wb.sheetnames:
+            return 0
+
+        ws = wb[date_str]
+        updated = 0
+
+        for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
+            order_id = row[0].value
+            if order_id in assignments:
+                # Курьер (колонка 15)
+                ws.cell(idx, 15, assignments[order_id])
+                updated += 1
+
+        if updated:
+            wb.save(ORDERS_FILE)
+        return updated
+
+    @staticmethod
+    def _get_reminder_headers():
+        """Получить заголовки для листа напоминаний"""
+        return ['Ключ', 'Номер заказа', 'Chat ID', 'Тип', 'Время отправки',
+                'Дата доставки', 'Время доставки', 'Адрес', 'Статус', 'Попыток', 'Следующая попытка']
+
+    @staticmethod
+    def _parse_reminder_row(row):
+        """Парсинг строки напоминания в словарь"""
+        if not row[0]:
+            return None
+
+        return {
+            'key': row[0],
+            'order_id': row[1],
+            'chat_id': row[2],
+            'kind': row[3],
+            'due_at': row[4],
+            'delivery_date': row[5],
+            'delivery_time': row[6],
+            'address': row[7],
+            'status': row[8],
+            'attempts': (row[9] if len(row) > 9 else None) or 0,
+            'next_attempt_at': row[10] if len(row) > 10 else None
+        }
+
+    @staticmethod
+    def save_reminders(reminders):
+        """
+        Сохранить запланированные напоминания одним сохранением файла
+
+        :param reminders: Список словарей с полями листа напоминаний
+        :return: Количество сохраненных напоминаний
+        """
+        if not reminders:
+            return 0
+
+        Database.init_orders_file()
+        wb = openpyxl.load_workbook(ORDERS_FILE)
+        Database._append_reminders(wb, reminders)
+        wb.save(ORDERS_FILE)
+        return len(reminders)
+
+    @staticmethod
+    def _reminder_index(ws, rebuild=False):
+        """
+        Строки активных напоминаний листа (индекс строится одним проходом и дальше обновляется сам)
+
+        :param rebuild: Перестроить индекс (строки сдвинулись, например лист правили вручную)
+        :return: Словарь {ключ: номер строки}
+        """
+        if Database._reminder_rows is None or rebuild:
+            rows = {}
+            for idx, row in enumerate(ws.iter_rows(min_row=2, max_col=9, values_only=True), start=2):
+                if row[0] and row[8] in Database.REMINDER_ACTIVE:
+                    rows[row[0]] = idx
+            Database._reminder_rows = rows
+        return Database._reminder_rows
+
+    @staticmethod
+    def _reminder_row(ws, key):
+        """Номер строки активного напоминания или None, если активной строки с таким ключом нет"""
+        idx = Database._reminder_index(ws).get(key)
+        if idx is not None and ws.cell(idx, 1).value != key:
+            idx = Database._reminder_index(ws, rebuild=True).get(key)
+        return idx
+
+    @staticmethod
+    def _set_reminder_fields(ws, key, update):
+        """
+        Изменить поля активного напоминания по номеру строки (без сохранения)
+
+        :return: True, если строка найдена
+        """
+        idx = Database._reminder_row(ws, key)
+        if idx is None:
+            return False
+
+        # Статус, количество попыток и время следующей попытки (колонки 9-11)
+        columns = {'status': 9, 'attempts': 10, 'next_attempt_at': 11}
+        for field, column in columns.items():
+            if field in update:
+                # ws.cell(..., value=None) не очищает ячейку, поэтому присваиваем напрямую
+                ws.cell(idx, column).value = update[field]
+
+        if update.get('status', Database.REMINDER_PENDING) not in Database.REMINDER_ACTIVE:
+            del Database._reminder_rows[key]
+        return True
+
+    @staticmethod
+    def _cancel_order_reminders(wb, order_ids):
+        """Отменить активные напоминания заказов на листе открытой книги (без сохранения)"""
+        if Database.REMINDERS_SHEET not in wb.sheetnames:
+            return
+
+        ws = wb[Database.REMINDERS_SHEET]
+        # Ключ напоминания начинается с номера заказа
+        keys = [key for key in Database._reminder_index(ws) if key.split(':', 1)[0] in order_ids]
+        for key in keys:
+            Database._set_reminder_fields(ws, key, {'status': Database.REMINDER_CANCELLED})
+
+    @staticmethod
+    def _append_reminders(wb, reminders):
+        """Добавить напоминания на лист напоминаний открытой книги (без сохранения)"""
+        if not reminders:
+            return
+
+        if Database.REMINDERS_SHEET not in wb.sheetnames:
+            ws = Database._create_sheet_with_headers(wb, Database.REMINDERS_SHEET, Database._get_reminder_headers())
+        else:
+            ws = wb[Database.REMINDERS_SHEET]
+
+        for reminder in reminders:
+            # Такое же напоминание уже ждет отправки (заказ вернули на прежнее время) - оставляем одно
+            Database._set_reminder_fields(ws, reminder['key'], {'status': Database.REMINDER_CANCELLED})
+
+            status = reminder.get('status', Database.REMINDER_PENDING)
+            ws.append([
+                reminder['key'],
+                reminder['order_id'],
+                reminder['chat_id'],
+                reminder['kind'],
+                reminder['due_at'],
+                reminder['delivery_date'],
+                reminder['delivery_time'],
+                reminder['address'],
+                status,
+                reminder.get('attempts', 0),
+                reminder.get('next_attempt_at')
+            ])
+            if status in Database.REMINDER_ACTIVE:
+                Database._reminder_index(ws)[reminder['key']] = ws.max_row
+
+    @staticmethod
+    def get_pending_reminders():
+        """Получить все напоминания, которые еще не отправлены (включая прерванные отправкой)"""
+        if not os.path.exists(ORDERS_FILE):
+            return []
+
+        wb = openpyxl.load_workbook(ORDERS_FILE)
+        if Database.REMINDERS_SHEET not in wb.sheetnames:
+            return []
+
+        reminders = []
+        rows = {}
+        for idx, row in enumerate(wb[Database.REMINDERS_SHEET].iter_rows(min_row=2, values_only=True), start=2):
+            reminder = Database._parse_reminder_row(row)
+            if reminder and reminder['status'] in Database.REMINDER_ACTIVE:
+                reminders.append(reminder)
+                rows[reminder['key']] = idx
+
+        # Заодно строим индекс строк для последующих изменений статусов
+        Database._reminder_rows = rows
+        return reminders
+
+    @staticmethod
+    def update_reminder_statuses(statuses):
+        """
+        Обновить статусы напоминаний одним сохранением файла
+
+        :param statuses: Словарь {ключ напоминания: статус}
+        :return: Количество обновленных напоминаний
+        """
+        return Database.update_reminders({key: {'status': status} for key, status in statuses.items()})
+
+    @staticmethod
+    def update_reminders(updates):
+        """
+        Обновить статус и попытки отправки активных напоминаний одним сохранением файла
+
+        Строки находятся по индексу, без просмотра всего листа.
+
+        :param updates: Словарь {ключ напоминания: {'status', 'attempts', 'next_attempt_at'}},
+                        отсутствующие поля не меняются
+        :return: Количество обновленных напоминаний
+        """
+        if not updates or not os.path.exists(ORDERS_FILE):
+            return 0
+
+        wb = openpyxl.load_workbook(ORDERS_FILE)
+        if Database.REMINDERS_SHEET not in wb.sheetnames:
+            return 0
+
+        ws = wb[Database.REMINDERS_SHEET]
+        updated = sum(1 for key, update in updates.items() if Database._set_reminder_fields(ws, key, update))
+
+        if updated:
+            wb.save(ORDERS_FILE)
+        return updated
+
+    @staticmethod
+    def prune_reminders(before_date_str):
+        """
+        Удалить завершенные напоминания с доставкой раньше даты, чтобы лист не рос без ограничений
+
+        Лист переписывается целиком одним сохранением; активные напоминания остаются.
+
+        :param before_date_str: Дата в формате YYYY-MM-DD
+        :return: Количество удаленных строк
+        """
+        if not os.path.exists(ORDERS_FILE):
+            return 0
+
+        wb = openpyxl.load_workbook(ORDERS_FILE)
+        if Database.REMINDERS_SHEET not in wb.sheetnames:
+            return 0
+
+        ws = wb[Database.REMINDERS_SHEET]
+        rows = list(ws.iter_rows(min_row=2, values_only=True))
+        kept, active = [], set()
+        for row in reversed(rows):
+            if not row[0]:
+                continue
+            if row[8] in Database.REMINDER_ACTIVE:
+                # Из повторяющихся активных строк (записаны до отмены при переносе) нужна последняя
+                if row[0] not in active:
+                    active.add(row[0])
+                    kept.append(row)
+            elif str(row[5])[:10] >= before_date_str:
+                kept.append(row)
+        kept.reverse()
+        if len(kept) == len(rows):
+            return 0
+
+        # Удаление строк по одной сдвигает весь лист каждый раз, поэтому очищаем и записываем заново
+        ws.delete_rows(2, ws.max_row)
+        for row in kept:
+            ws.append(row)
+        Database._reminder_index(ws, rebuild=True)
+        wb.save(ORDERS_FILE)
+        return len(rows) - len(kept)
+
+    @staticmethod
+    def iter_orders_without_location():
+        """
+        Заказы с адресом, но без координат, по всем датам (файл читается потоком)
+
+        :return: Генератор словарей с ключами 'order_id', 'delivery_date' и 'address'
+        """
+        if not os.path.exists(ORDERS_FILE):
+            return
+
+        wb = openpyxl.load_workbook(ORDERS_FILE, read_only=True)
+        try:
+            for sheet_name in Database._order_sheet_names(wb):
+                for row in wb[sheet_name].iter_rows(min_row=2, values_only=True):
+                    if row and row[0] and len(row) > 4 and row[4] and (len(row) < 12 or row[11] is None):
+                        yield {'order_id': row[0], 'delivery_date': sheet_name, 'address': row[4]}
+        finally:
+            wb.close()
 
     @staticmethod
-    def get_order_reminder_ids(order_id):
+    def get_orders_by_ids(order_ids):
         """
-        Получить ID запланированных сообщений для заказа
+        Получить заказы по списку ID за одно чтение файла
 
-        :param order_id: ID заказа
-        :return: Tuple (morning_msg_id, pre_delivery_msg_id) или (None, None)
+        :param order_ids: Коллекция ID заказов
+        :return: Словарь {order_id: заказ}
         """
-        order = Database.get_order_by_id(order_id)
-        if order:
-            return (
-                order.get('morning_reminder_id'),
-                order.get('pre_delivery_reminder_id')
+        if not order_ids or not os.path.exists(ORDERS_FILE):
+            return {}
+
+        wanted = set(order_ids)
+        wb = openpyxl.load_workbook(ORDERS_FILE)
+        orders = {}
+
+        for sheet_name in Database._order_sheet_names(wb):
+            for row in wb[sheet_name].iter_rows(min_row=2, values_only=True):
+                if row[0] in wanted:
+                    orders[row[0]] = Database._parse_order_row(row, sheet_name)
+
+        return orders
+
+    @staticmethod
+    def _get_subscription_headers():
+        """Получить заголовки для листа подписок"""
+        return ['User ID', 'Каждые (недель)', 'Первая доставка', 'Время доставки', 'Количество бутылок',
+                'Широта', 'Долгота', 'Район', 'Заказы созданы по', 'Статус']
+
+    @staticmethod
+    def _parse_subscription_row(row):
+        """Парсинг строки подписки в словарь"""
+        if not row[0]:
+            return None
+
+        return {
+            'user_id': row[0],
+            'weeks': row[1],
+            'first_date': row[2],
+            'delivery_time': row[3],
+            'bottles': row[4],
+            'latitude': row[5],
+            'longitude': row[6],
+            'district': row[7],
+            'generated_until': row[8],
+            'status': row[9]
+        }
+
+    @staticmethod
+    def get_subscriptions(active_only=True):
+        """Получить подписки клиентов (по умолчанию только активные)"""
+        if not os.path.exists(ORDERS_FILE):
+            return []
+
+        wb = openpyxl.load_workbook(ORDERS_FILE)
+        if Database.SUBSCRIPTIONS_SHEET not in wb.sheetnames:
+            return []
+
+        subscriptions = []
+        for row in wb[Database.SUBSCRIPTIONS_SHEET].iter_rows(min_row=2, values_only=True):
+            subscription = Database._parse_subscription_row(row)
+            if subscription and (not active_only or subscription['status'] == Database.SUBSCRIPTION_ACTIVE):
+                subscriptions.append(subscription)
+
+        return subscriptions
+
+    @staticmethod
+    def save_subscription(user_id, weeks, first_date, delivery_time, bottles,
+                          latitude=None, longitude=None, district=None):
+        """
+        Сохранить подписку клиента (у клиента одна подписка, новая заменяет прежнюю)
+
+        :param first_date: Дата первой доставки в формате YYYY-MM-DD
+        """
+        Database.init_orders_file()
+        wb = openpyxl.load_workbook(ORDERS_FILE)
+        if Database.SUBSCRIPTIONS_SHEET not in wb.sheetnames:
+            ws = Database._create_sheet_with_headers(
+                wb, Database.SUBSCRIPTIONS_SHEET, Database._get_subscription_headers()
             )
-        return (None, None)
+        else:
+            ws = wb[Database.SUBSCRIPTIONS_SHEET]
+
+        values = [user_id, weeks, first_date, delivery_time, bottles, latitude, longitude, district,
+                  None, Database.SUBSCRIPTION_ACTIVE]
+
+        for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
+            if row[0].value == user_id:
+                for column, value in enumerate(values, start=1):
+                    # ws.cell(..., value=None) не очищает ячейку, поэтому присваиваем напрямую
+                    ws.cell(idx, column).value = value
+                break
+        else:
+            ws.append(values)
+
+        wb.save(ORDERS_FILE)
+
+    @staticmethod
+    def cancel_subscription(user_id):
+        """
+        Отменить подписку клиента (уже созданные заказы остаются)
+
+        :return: True если активная подписка была найдена
+        """
+        if not os.path.exists(ORDERS_FILE):
+            return False
+
+        wb = openpyxl.load_workbook(ORDERS_FILE)
+        if Database.SUBSCRIPTIONS_SHEET not in wb.sheetnames:
+            return False
+
+        ws = wb[Database.SUBSCRIPTIONS_SHEET]
+        for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
+            if row[0].value == user_id and row[9].value == Database.SUBSCRIPTION_ACTIVE:
+                # Статус (колонка 10)
+                ws.cell(idx, 10, Database.SUBSCRIPTION_CANCELLED)
+                wb.save(ORDERS_FILE)
+                return True
+
+        return False
+
+    @staticmethod
+    def save_generated_orders(orders, reminders, progress):
+        """
+        Сохранить заказы по подпискам, их напоминания и отметки о созданных заказах одним сохранением файла
+
+        :param orders: Список словарей заказов (поля строки листа заказов и delivery_date)
+        :param reminders: Напоминания заказов
+        :param progress: Словарь {user_id: дата в формате YYYY-MM-DD, по которую созданы заказы}
+        :return: Количество сохраненных заказов
+        """
+        if not orders and not progress:
+            return 0
+
+        Database.init_orders_file()
+        wb = openpyxl.load_workbook(ORDERS_FILE)
+        order_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        for order in orders:
+            date_str = order['delivery_date']
+            if date_str not in wb.sheetnames:
+                ws = Database._create_sheet_with_headers(wb, date_str, Database._get_order_headers())
+            else:
+                ws = wb[date_str]
+
+            ws.append([order['order_id'], order['user_id'], order['name'], order['phone'], order['address'],
+                       order_date, order['delivery_time'], order['bottles'], "Новый", None, None,
+                       order.get('latitude'), order.get('longitude'), order.get('district'), order.get('courier')])
+
+        Database._append_reminders(wb, reminders)
+
+        if progress and Database.SUBSCRIPTIONS_SHEET in wb.sheetnames:
+            ws = wb[Database.SUBSCRIPTIONS_SHEET]
+            for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
+                if row[0].value in progress:
+                    # Заказы созданы по (колонка 9)
+                    ws.cell(idx, 9, progress[row[0].value])
+
+        wb.save(ORDERS_FILE)
+        return len(orders)
@@ -0,0 +1,218 @@
+"""
+Модуль определения района Бишкека по координатам
+Границы районов загружаются из GeoJSON-файла DISTRICTS_FILE. Город покрывается равномерной
+сеткой: для клеток целиком внутри района ответ берется из сетки, для клеток на границе
+точка проверяется лучом только по районам этой клетки. Проверка векторизована,
+поэтому заказы за весь день классифицируются одним вызовом
+"""
+
+import json
+import logging
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from config import DISTRICTS_FILE, DISTRICT_GRID_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class DistrictResolver:
+    """Определение района по координатам через полигоны районов"""
+
+    # Значения клетки сетки, кроме номера района
+    OUTSIDE = -1     # Клетка вне всех районов
+    BOUNDARY = -2    # Через клетку проходит граница - нужна проверка лучом
+
+    # Названия районов и их ребра: массивы (E, 4) со столбцами lng1, lat1, lng2, lat2
+    _names: List[str] = []
+    _edges: List[np.ndarray] = []
+
+    # Сетка: границы, размер клетки, значение клетки и районы-кандидаты граничных клеток
+    _origin: Optional[np.ndarray] = None             # (min_lng, min_lat)
+    _cell_size: Optional[np.ndarray] = None          # (шаг по долготе, шаг по широте)
+    _cells: Optional[np.ndarray] = None              # (G, G) int
+    _candidates: Optional[np.ndarray] = None         # (G * G, D) bool
+
+    # Версия файла, по которой построен индекс
+    _loaded_version: Optional[int] = None
+
+    # Сколько точек проверять лучом за раз (память под матрицу точки x ребра)
+    _CHUNK = 2048
+
+    @staticmethod
+    def _rings(geometry: dict) -> List[List]:
+        """Кольца полигона или мультиполигона (внешние границы и дыры)"""
+        if geometry['type'] == 'Polygon':
+            return list(geometry['coordinates'])
+        if geometry['type'] == 'MultiPolygon':
+            return [ring for polygon in geometry['coordinates'] for ring in polygon]
+        return []
+
+    @staticmethod
+    def point_in_polygon(lngs: np.ndarray, lats: np.ndarray, edges: np.ndarray) -> np.ndarray:
+        """
+        Проверка точек лучом (правило чет-нечет: дыры и части мультиполигона учитываются сами)
+
+        :param lngs: Долготы точек (P,)
+        :param lats: Широты точек (P,)
+        :param edges: Ребра района (E, 4)
+        :return: Массив bool (P,) - точка внутри района
+        """
+        inside = np.zeros(len(lngs), dtype=bool)
+        x1, y1, x2, y2 = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+        dy = np.where(y2 == y1, 1.0, y2 - y1)
+
+        for start in range(0, len(lngs), DistrictResolver._CHUNK):
+            px = lngs[start:start + DistrictResolver._CHUNK, None]
+            py = lats[start:start + DistrictResolver._CHUNK, None]
+            # Ребро пересекает горизонталь точки, и пересечение лежит правее точки
+            crosses = ((y1 > py) != (y2 > py)) & (px < x1 + (py - y1) * (x2 - x1) / dy)
+            inside[start:start + DistrictResolver._CHUNK] = np.count_nonzero(crosses, axis=1) % 2 == 1
+
+        return inside
+
+    @staticmethod
+    def _load():
+        """
+        Загрузить районы и построить сетку
+
+        Формат файла - GeoJSON FeatureCollection, название района в свойстве "name":
+        {"type": "FeatureCollection", "features": [
+            {"type": "Feature", "properties": {"name": "Ленинский район"},
+             "geometry": {"type": "Polygon", "coordinates": [[[74.52, 42.88], [74.59, 42.88], ...]]}}
+        ]}
+        Координаты в порядке GeoJSON: долгота, широта.
+        """
+        names, edges = [], []
+        try:
+            with open(DISTRICTS_FILE, encoding='utf-8') as f:
+                features = json.load(f).get('features', [])
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось прочитать границы районов {DISTRICTS_FILE}: {e}")
+            features = []
+
+        for feature in features:
+            rings = DistrictResolver._rings(feature.get('geometry') or {'type': None})
+            name = (feature.get('properties') or {}).get('name')
+            if not rings or not name:
+                continue
+            # Ребра всех колец: каждая точка соединяется со следующей, последняя - с первой
+            district_edges = []
+            for ring in rings:
+                points = np.asarray(ring, dtype=float)[:, :2]
+                district_edges.append(np.hstack([points, np.roll(points, -1, axis=0)]))
+            names.append(name)
+            edges.append(np.vstack(district_edges))
+
+        DistrictResolver._names, DistrictResolver._edges = names, edges
+        DistrictResolver._cells = None
+        if edges:
+            DistrictResolver._build_grid()
+        logger.info(f"Границы районов: {len(names)} районов")
+
+    @staticmethod
+    def _build_grid():
+        """Разметить клетки сетки: район целиком, вне районов или граница"""
+        edges = DistrictResolver._edges
+        size = DISTRICT_GRID_SIZE
+        all_edges = np.vstack(edges)
+        origin = np.array([all_edges[:, [0, 2]].min(), all_edges[:, [1, 3]].min()])
+        span = np.array([all_edges[:, [0, 2]].max(), all_edges[:, [1, 3]].max()]) - origin
+        cell_size = np.where(span > 0, span, 1e-9) / size
+
+        # Районы, ребра которых задевают клетку (по охватывающему прямоугольнику ребра)
+        candidates = np.zeros((size, size, len(edges)), dtype=bool)
+        for index, district_edges in enumerate(edges):
+            low = np.floor((np.minimum(district_edges[:, :2], district_edges[:, 2:]) - origin) / cell_size)
+            high = np.floor((np.maximum(district_edges[:, :2], district_edges[:, 2:]) - origin) / cell_size)
+            low = np.clip(low, 0, size - 1).astype(int)
+            high = np.clip(high, 0, size - 1).astype(int)
+            for (col_low, row_low), (col_high, row_high) in zip(low, high):
+                candidates[row_low:row_high + 1, col_low:col_high + 1, index] = True
+
+        # Клетки без границ целиком внутри одного района (или вне всех): проверяем их центры
+        rows, cols = np.mgrid[0:size, 0:size]
+        center_lngs = origin[0] + (cols.ravel() + 0.5) * cell_size[0]
+        center_lats = origin[1] + (rows.ravel() + 0.5) * cell_size[1]
+        cells = np.full(size * size, DistrictResolver.OUTSIDE, dtype=int)
+        for index, district_edges in enumerate(edges):
+            inside = DistrictResolver.point_in_polygon(center_lngs, center_lats, district_edges)
+            cells[inside & (cells == DistrictResolver.OUTSIDE)] = index
+
+        candidates = candidates.reshape(size * size, len(edges))
+        cells[candidates.any(axis=1)] = DistrictResolver.BOUNDARY
+
+        DistrictResolver._origin, DistrictResolver._cell_size = origin, cell_size
+        DistrictResolver._cells, DistrictResolver._candidates = cells.reshape(size, size), candidates
+
+    @staticmethod
+    def _ensure_loaded() -> bool:
+        """
+        Перестроить индекс при изменении файла границ
+
+        :return: False, если границы районов не заданы
+        """
+        version = os.stat(DISTRICTS_FILE).st_mtime_ns if os.path.exists(DISTRICTS_FILE) else None
+        if version != DistrictResolver._loaded_version:
+            if version is None:
+                DistrictResolver._names, DistrictResolver._edges, DistrictResolver._cells = [], [], None
+            else:
+                DistrictResolver._load()
+            DistrictResolver._loaded_version = version
+        return DistrictResolver._cells is not None
+
+    @staticmethod
+    def resolve_many(lats: Sequence[float], lngs: Sequence[float]) -> Optional[List[Optional[str]]]:
+        """
+        Определить районы для пакета точек
+
+        :param lats: Широты
+        :param lngs: Долготы
+        :return: Названия районов (None - точка вне всех районов) или None, если границы не заданы
+        """
+        if not DistrictResolver._ensure_loaded():
+            return None
+
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        size = DISTRICT_GRID_SIZE
+        result = np.full(len(lats), DistrictResolver.OUTSIDE, dtype=int)
+
+        cols = np.floor((lngs - DistrictResolver._origin[0]) / DistrictResolver._cell_size[0])
+        rows = np.floor((lats - DistrictResolver._origin[1]) / DistrictResolver._cell_size[1])
+        # Точка на правой или верхней границе сетки относится к последней клетке
+        in_grid = (cols >= 0) & (cols <= size) & (rows >= 0) & (rows <= size)
+        cols = np.clip(cols, 0, size - 1).astype(int)
+        rows = np.clip(rows, 0, size - 1).astype(int)
+
+        cells = np.where(in_grid, DistrictResolver._cells[rows, cols], DistrictResolver.OUTSIDE)
+        result[cells >= 0] = cells[cells >= 0]
+
+        boundary = np.flatnonzero(cells == DistrictResolver.BOUNDARY)
+        if len(boundary):
+            candidates = DistrictResolver._candidates[rows[boundary] * size + cols[boundary]]
+            for index, district_edges in enumerate(DistrictResolver._edges):
+                points = boundary[candidates[:, index] & (result[boundary] == DistrictResolver.OUTSIDE)]
+                if len(points):
+                    inside = DistrictResolver.point_in_polygon(lngs[points], lats[points], district_edges)
+                    result[points[inside]] = index
+
+        names = DistrictResolver._names
+        return [names[index] if index >= 0 else None for index in result]
+
+    @staticmethod
+    def resolve(lat: float, lng: float) -> Optional[str]:
+        """
+        Определить район точки
+
+        :return: Название района, None - вне районов или границы не заданы
+        """
+        districts = DistrictResolver.resolve_many([lat], [lng])
+        return districts[0] if districts else None
+
+    @staticmethod
+    def is_available() -> bool:
+        """Заданы ли границы районов"""
+        return DistrictResolver._ensure_loaded()
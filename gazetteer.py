@@ -0,0 +1,314 @@
+"""
+Модуль офлайн-справочника адресов Бишкека
+Улицы, микрорайоны и жилмассивы с координатами домов и диапазонов номеров загружаются
+из файла GAZETTEER_FILE. Название улицы ищется по триграммному индексу, поэтому
+опечатки ("Боконбаево") не мешают найти адрес без запроса к Geocoding API. Похожее название
+принимается, только если оно почти совпадает и заметно ближе остальных: иначе "Иванова"
+получила бы координаты улицы Исанова, поэтому сомнительные адреса проверяет Google
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from address_normalizer import AddressNormalizer, ParsedAddress
+from config import GAZETTEER_FILE, GAZETTEER_MIN_SIMILARITY, GAZETTEER_MIN_MARGIN
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GazetteerStreet:
+    """Улица, микрорайон или жилмассив из справочника"""
+    name: str                                      # Название для отображения
+    street_type: str                               # Тип улицы, как в AddressNormalizer.STREET_TYPES
+    district: str
+    houses: Dict[str, Tuple[float, float]]         # Номер дома -> (широта, долгота)
+    ranges: List[Dict]                             # Диапазоны номеров для интерполяции
+
+
+@dataclass
+class GazetteerMatch:
+    """Найденный в справочнике адрес"""
+    street: GazetteerStreet
+    house: str
+    latitude: float
+    longitude: float
+    similarity: float                              # 1.0 - название совпало точно
+
+
+class BishkekGazetteer:
+    """Офлайн-справочник адресов Бишкека с нечетким поиском улиц"""
+
+    # Улицы справочника и индексы для поиска
+    _streets: List[GazetteerStreet] = []
+    _exact: Dict[Tuple[str, str], List[int]] = {}          # (тип, название) -> номера улиц
+    _trigrams: Dict[str, List[int]] = {}                   # триграмма -> номера названий
+    _names: List[Tuple[str, int, int]] = []                # (название, количество триграмм, номер улицы)
+
+    # Версия файла, по которой построены индексы
+    _loaded_version: Optional[int] = None
+
+    # Номер дома без литеры и корпуса для поиска по диапазонам
+    _HOUSE_NUMBER = re.compile(r'^(\d+)')
+
+    @staticmethod
+    def normalize_name(name: str) -> str:
+        """Название улицы в виде, в котором его возвращает AddressNormalizer"""
+        return ' '.join(AddressNormalizer._tokens(name))
+
+    @staticmethod
+    def trigrams(name: str) -> List[str]:
+        """Триграммы названия с границами слова (короткие названия тоже дают несколько триграмм)"""
+        padded = f"  {name} "
+        return list({padded[index:index + 3] for index in range(len(padded) - 2)})
+
+    @staticmethod
+    def _load():
+        """
+        Загрузить справочник и построить индексы
+
+        Формат файла:
+        {
+            "streets": [
+                {
+                    "name": "Исанова", "type": "улица", "district": "Свердловский",
+                    "aliases": ["Isanova"],
+                    "houses": {"42": [42.8771, 74.6047]},
+                    "ranges": [{"from": 1, "to": 99, "parity": "odd",
+                                "start": [42.8900, 74.6050], "end": [42.8650, 74.6040]}]
+                },
+                {"name": "12", "type": "мкр", "district": "Октябрьский", "houses": {"5": [42.8321, 74.6210]}}
+            ]
+        }
+        Дома из "houses" точнее диапазонов; внутри диапазона координаты интерполируются
+        между началом и концом отрезка улицы. "parity" (odd/even) - сторона улицы.
+        """
+        try:
+            with open(GAZETTEER_FILE, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось прочитать справочник адресов {GAZETTEER_FILE}: {e}")
+            data = {}
+
+        BishkekGazetteer._build(data)
+
+    @staticmethod
+    def _build(data: Dict):
+        """Построить индексы по содержимому справочника (формат - как у файла)"""
+        streets: List[GazetteerStreet] = []
+        exact = defaultdict(list)
+        trigrams = defaultdict(list)
+        names = []
+
+        for entry in data.get('streets', []):
+            street_type = AddressNormalizer.STREET_TYPES.get(entry.get('type', ''), AddressNormalizer.DEFAULT_STREET_TYPE)
+            street = GazetteerStreet(
+                name=entry['name'],
+                street_type=street_type,
+                district=entry.get('district', ''),
+                houses={str(house).lower(): tuple(point) for house, point in entry.get('houses', {}).items()},
+                ranges=entry.get('ranges', [])
+            )
+            streets.append(street)
+            street_index = len(streets) - 1
+
+            for name in {BishkekGazetteer.normalize_name(name) for name in [entry['name']] + entry.get('aliases', [])}:
+                exact[(street_type, name)].append(street_index)
+                name_trigrams = BishkekGazetteer.trigrams(name)
+                names.append((name, len(name_trigrams), street_index))
+                for trigram in name_trigrams:
+                    trigrams[trigram].append(len(names) - 1)
+
+        BishkekGazetteer._streets = streets
+        BishkekGazetteer._exact = dict(exact)
+        BishkekGazetteer._trigrams = dict(trigrams)
+        BishkekGazetteer._names = names
+        logger.info(f"Справочник адресов: {len(streets)} улиц, {len(names)} названий")
+
+    @staticmethod
+    def _ensure_loaded() -> bool:
+        """
+        Перестроить индексы при изменении файла справочника
+
+        :return: False, если файла справочника нет
+        """
+        version = os.stat(GAZETTEER_FILE).st_mtime_ns if os.path.exists(GAZETTEER_FILE) else None
+        if version != BishkekGazetteer._loaded_version:
+            if version is None:
+                BishkekGazetteer._streets, BishkekGazetteer._exact = [], {}
+                BishkekGazetteer._trigrams, BishkekGazetteer._names = {}, []
+            else:
+                BishkekGazetteer._load()
+            BishkekGazetteer._loaded_version = version
+        return version is not None
+
+    @staticmethod
+    def _candidates(street_type: str, name: str) -> List[Tuple[float, int]]:
+        """
+        Улицы, похожие на название
+
+        :return: Список (сходство, номер улицы) по убыванию сходства; 1.0 - точное название или синоним
+        """
+        exact = BishkekGazetteer._exact.get((street_type, name))
+        if exact:
+            return [(1.0, street_index) for street_index in exact]
+
+        query = BishkekGazetteer.trigrams(name)
+        common = defaultdict(int)
+        for trigram in query:
+            for name_index in BishkekGazetteer._trigrams.get(trigram, ()):
+                common[name_index] += 1
+
+        # Коэффициент Дайса по триграммам: устойчив к опечатке и перестановке букв
+        best: Dict[int, float] = {}
+        for name_index, count in common.items():
+            _, name_count, street_index = BishkekGazetteer._names[name_index]
+            similarity = 2 * count / (len(query) + name_count)
+            if similarity > best.get(street_index, 0):
+                best[street_index] = similarity
+
+        candidates = []
+        for street_index, similarity in best.items():
+            candidate_type = BishkekGazetteer._streets[street_index].street_type
+            # Тип улицы клиенты часто не пишут ("Чуй 120"), но явно указанный тип должен совпасть
+            if street_type != AddressNormalizer.DEFAULT_STREET_TYPE and candidate_type != street_type:
+                continue
+            if candidate_type != street_type:
+                similarity -= 0.01
+            candidates.append((similarity, street_index))
+
+        candidates.sort(reverse=True)
+        return candidates
+
+    @staticmethod
+    def _house_point(street: GazetteerStreet, house: str,
+                     building: Optional[str]) -> Optional[Tuple[float, float]]:
+        """Координаты дома: точные из справочника или интерполированные по диапазону номеров"""
+        point = street.houses.get(f"{house}/{building}") if building else None
+        point = point or street.houses.get(house)
+        if point:
+            return point
+
+        number = int(BishkekGazetteer._HOUSE_NUMBER.match(house).group(1))
+        for house_range in street.ranges:
+            low, high = house_range['from'], house_range['to']
+            parity = house_range.get('parity')
+            if not low <= number <= high or (parity == 'odd' and number % 2 == 0) \
+                    or (parity == 'even' and number % 2 == 1):
+                continue
+
+            share = (number - low) / (high - low) if high > low else 0.0
+            (start_lat, start_lng), (end_lat, end_lng) = house_range['start'], house_range['end']
+            return start_lat + (end_lat - start_lat) * share, start_lng + (end_lng - start_lng) * share
+
+        return None
+
+    @staticmethod
+    def lookup(address: str) -> Optional[GazetteerMatch]:
+        """
+        Найти адрес в справочнике
+
+        :param address: Адрес в том виде, в котором его ввел клиент
+        :return: Найденный адрес или None, если улица не найдена однозначно, нет номера дома или его координат
+        """
+        if not BishkekGazetteer._ensure_loaded():
+            return None
+        return BishkekGazetteer._match(address)
+
+    @staticmethod
+    def _match(address: str) -> Optional[GazetteerMatch]:
+        """Найти адрес по уже построенным индексам"""
+        parsed: ParsedAddress = AddressNormalizer.parse(address)
+        if not parsed.street or not parsed.house:
+            return None
+
+        candidates = BishkekGazetteer._candidates(parsed.street_type, parsed.street)
+        if not candidates:
+            return None
+
+        best = candidates[0][0]
+        if best < 1.0:
+            # Похожее название - только почти совпадающее и заметно ближе следующего;
+            # дом ищется лишь на этой улице: у другой похожей улицы он был бы чужим
+            runner_up = candidates[1][0] if len(candidates) > 1 else 0.0
+            if best < GAZETTEER_MIN_SIMILARITY or best - runner_up < GAZETTEER_MIN_MARGIN:
+                return None
+            candidates = candidates[:1]
+
+        # Несколько улиц с одним названием (в разных районах) - берем ту, где есть такой дом
+        for similarity, street_index in candidates:
+            street = BishkekGazetteer._streets[street_index]
+            point = BishkekGazetteer._house_point(street, parsed.house, parsed.building)
+            if point:
+                house = f"{parsed.house}/{parsed.building}" if parsed.building else parsed.house
+                return GazetteerMatch(street, house, point[0], point[1], similarity)
+
+        return None
+
+
+# Примеры для проверки поиска: справочник и адреса с ожидаемой улицей (None - справочник не отвечает)
+CHECK_STREETS = {'streets': [
+    {'name': 'Исанова', 'type': 'улица', 'aliases': ['Isanova'], 'houses': {'42': [42.8771, 74.6047]}},
+    {'name': 'Боконбаева', 'type': 'улица', 'houses': {'101': [42.8700, 74.5900]}},
+]}
+CHECK_CASES = (
+    ("ул. Исанова 42", 'Исанова'),
+    ("Isanova 42", 'Исанова'),
+    ("Боконбаевва 101", 'Боконбаева'),  # Опечатка в длинном названии
+    ("Иванова 42", None),          # Другая улица на одну букву отличается - не Исанова
+    ("Исанова 43", None),          # Дома нет в справочнике
+)
+
+
+def check() -> list:
+    """
+    Проверить поиск на примерах CHECK_CASES (индексы файла справочника перестроятся при следующем поиске)
+
+    :return: Список описаний несовпадений (пустой, если все верно)
+    """
+    BishkekGazetteer._build(CHECK_STREETS)
+    errors = []
+    try:
+        for address, expected in CHECK_CASES:
+            match = BishkekGazetteer._match(address)
+            found = match.street.name if match else None
+            if found != expected:
+                errors.append(f"{address!r}: ожидалось {expected}, найдено {found}")
+    finally:
+        BishkekGazetteer._loaded_version = -1
+    return errors
+
+
+def main():
+    """Найти адреса в справочнике и замерить скорость поиска"""
+    parser = argparse.ArgumentParser(description="Поиск адресов в офлайн-справочнике Бишкека")
+    parser.add_argument('addresses', nargs='*', help="Адреса для поиска")
+    parser.add_argument('--repeat', type=int, default=1000, help="Повторов для замера скорости")
+    parser.add_argument('--check', action='store_true', help="Проверить поиск на известных примерах")
+    args = parser.parse_args()
+
+    if args.check:
+        errors = check()
+        print("\n".join(errors) or "Поиск по справочнику: все примеры верны")
+        raise SystemExit(1 if errors else 0)
+
+    for address in args.addresses:
+        match = BishkekGazetteer.lookup(address)
+        print(f"{address!r} -> {match}")
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            BishkekGazetteer.lookup(address)
+        elapsed = time.perf_counter() - started
+        print(f"  {elapsed / args.repeat * 1e6:.1f} мкс на поиск")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Модуль заполнения координат для уже сохраненных адресов
+Читает users.xlsx и orders.xlsx потоком, схлопывает повторяющиеся адреса по каноническому
+ключу, геокодирует только те, которых нет в кэше и справочнике, с ограничением параллельности
+и скорости запросов и записывает координаты и район пачками. Прерванный запуск продолжается
+с контрольной точки
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from address_normalizer import AddressNormalizer
+from address_validator import AddressInfo, KyrgyzstanAddressValidator, get_address_validator
+from config import (GEOCODE_BACKFILL_CONCURRENCY, GEOCODE_BACKFILL_RATE,
+                    GEOCODE_BACKFILL_BATCH, GEOCODE_BACKFILL_CHECKPOINT)
+from database import Database
+from message_dispatcher import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodeBackfill:
+    """Заполнение координат и района для пользователей и заказов без координат"""
+
+    def __init__(self, validator: Optional[KyrgyzstanAddressValidator] = None,
+                 concurrency: int = GEOCODE_BACKFILL_CONCURRENCY, rate: float = GEOCODE_BACKFILL_RATE,
+                 batch_size: int = GEOCODE_BACKFILL_BATCH, checkpoint_file: str = GEOCODE_BACKFILL_CHECKPOINT):
+        self.validator = validator or get_address_validator()
+        self.batch_size = batch_size
+        self.checkpoint_file = checkpoint_file
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate, burst=1)
+
+        # Ключи адресов, обработанных прошлыми запусками (в том числе не найденных)
+        self._done: Set[str] = set()
+
+        self.stats = {'rows': 0, 'addresses': 0, 'skipped': 0, 'offline': 0, 'requests': 0,
+                      'located': 0, 'not_found': 0, 'deferred': 0, 'users': 0, 'orders': 0}
+
+    def load_checkpoint(self):
+        """Загрузить обработанные ключи адресов"""
+        if not os.path.exists(self.checkpoint_file):
+            return
+        try:
+            with open(self.checkpoint_file, encoding='utf-8') as f:
+                self._done = set(json.load(f).get('done', []))
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось прочитать контрольную точку {self.checkpoint_file}: {e}")
+
+    def save_checkpoint(self):
+        """Сохранить обработанные ключи (через временный файл, чтобы прерывание не испортило его)"""
+        temp_file = f"{self.checkpoint_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'done': sorted(self._done)}, f, ensure_ascii=False)
+        os.replace(temp_file, self.checkpoint_file)
+
+    def collect(self) -> Dict[str, Dict]:
+        """
+        Сгруппировать строки без координат по каноническому ключу адреса
+
+        :return: Словарь {ключ: {'address', 'users', 'orders'}} без ключей из контрольной точки
+        """
+        groups: Dict[str, Dict] = {}
+
+        def add(address: str, kind: str, row_id):
+            self.stats['rows'] += 1
+            key = AddressNormalizer.canonical_key(str(address))
+            if key in self._done:
+                self.stats['skipped'] += 1
+                return
+            group = groups.setdefault(key, {'address': str(address), 'users': [], 'orders': []})
+            group[kind].append(row_id)
+
+        for user in Database.iter_users_without_location():
+            add(user['address'], 'users', user['user_id'])
+        for order in Database.iter_orders_without_location():
+            add(order['address'], 'orders', order['order_id'])
+
+        self.stats['addresses'] = len(groups)
+        return groups
+
+    async def _geocode(self, address: str) -> Tuple[AddressInfo, bool]:
+        """
+        Геокодировать адрес: кэш и справочник без ограничений, запрос к API - в пределах лимитов
+
+        :return: Результат и признак окончательного ответа (без него адрес проверится при следующем запуске)
+        """
+        requested = False
+
+        async def before_request():
+            nonlocal requested
+            await self._bucket.acquire()
+            requested = True
+
+        async with self._semaphore:
+            # Пока Google недоступен, ждем пробного запроса вместо базовой проверки всех адресов подряд
+            result = await self.validator.geocode_async(address, before_request, wait_for_service=True)
+
+        self.stats['requests' if requested else 'offline'] += 1
+        return result
+
+    def _flush(self, keys: List[str], groups: Dict[str, Dict], results: List[Tuple[AddressInfo, bool]]):
+        """Записать координаты пачки адресов в оба файла и отметить адреса в контрольной точке"""
+        user_locations, order_locations = {}, {}
+
+        done = []
+        for key, (result, definitive) in zip(keys, results):
+            if result.is_valid and result.latitude and result.longitude:
+                self.stats['located'] += 1
+                location = (result.latitude, result.longitude, result.district)
+                user_locations.update({user_id: location for user_id in groups[key]['users']})
+                order_locations.update({order_id: location for order_id in groups[key]['orders']})
+            elif definitive:
+                # Адреса нет по ответу Google или кэшу: повторный запуск его не найдет
+                self.stats['not_found'] += 1
+            else:
+                # Ответа нет (сбой API или нет ключа): адрес проверится при следующем запуске
+                self.stats['deferred'] += 1
+                continue
+            done.append(key)
+
+        self.stats['users'] += Database.update_user_locations(user_locations)
+        self.stats['orders'] += Database.update_order_locations(None, order_locations)
+
+        self._done.update(done)
+        self.save_checkpoint()
+
+    async def run(self) -> Dict:
+        """
+        Заполнить координаты для всех строк без координат
+
+        :return: Статистика запуска со скоростью обработки
+        """
+        started = time.monotonic()
+        self.load_checkpoint()
+        groups = self.collect()
+        keys = list(groups)
+        logger.info(f"Строк без координат: {self.stats['rows']}, уникальных адресов: {len(keys)}, "
+                    f"пропущено по контрольной точке: {self.stats['skipped']}")
+
+        for start in range(0, len(keys), self.batch_size):
+            batch = keys[start:start + self.batch_size]
+            results = await asyncio.gather(*(self._geocode(groups[key]['address']) for key in batch))
+            self._flush(batch, groups, results)
+
+            elapsed = time.monotonic() - started
+            done = start + len(batch)
+            logger.info(f"Обработано адресов {done}/{len(keys)}, {done / elapsed:.1f} адр/с, "
+                        f"запросов к API {self.stats['requests']}")
+
+        self.stats['elapsed'] = time.monotonic() - started
+        return self.stats
+
+    @staticmethod
+    def format_report(stats: Dict) -> str:
+        """Итоговый отчет о заполнении координат"""
+        elapsed = max(stats.get('elapsed', 0.0), 1e-9)
+        return "\n".join([
+            f"Строк без координат: {stats['rows']} (пропущено по контрольной точке: {stats['skipped']})",
+            f"Уникальных адресов: {stats['addresses']}",
+            f"Из кэша и справочника: {stats['offline']}, запросов к API: {stats['requests']}",
+            f"Найдено: {stats['located']}, не найдено: {stats['not_found']}, "
+            f"отложено до следующего запуска: {stats['deferred']}",
+            f"Обновлено пользователей: {stats['users']}, заказов: {stats['orders']}",
+            f"Время: {elapsed:.1f} с, {stats['addresses'] / elapsed:.1f} адр/с, "
+            f"{stats['rows'] / elapsed:.1f} строк/с, {stats['requests'] / elapsed:.1f} запросов/с"
+        ])
+
+
+async def _backfill(args) -> Dict:
+    """Запустить заполнение и закрыть пул соединений валидатора"""
+    backfill = GeocodeBackfill(concurrency=args.concurrency, rate=args.rate,
+                               batch_size=args.batch, checkpoint_file=args.checkpoint)
+    try:
+        return await backfill.run()
+    finally:
+        await KyrgyzstanAddressValidator.aclose()
+
+
+def main():
+    """Заполнить координаты для сохраненных адресов из командной строки"""
+    parser = argparse.ArgumentParser(description="Заполнение координат и района для пользователей и заказов")
+    parser.add_argument('--concurrency', type=int, default=GEOCODE_BACKFILL_CONCURRENCY,
+                        help="Одновременных запросов к Geocoding API")
+    parser.add_argument('--rate', type=float, default=GEOCODE_BACKFILL_RATE, help="Запросов к API в секунду")
+    parser.add_argument('--batch', type=int, default=GEOCODE_BACKFILL_BATCH,
+                        help="Адресов между сохранениями файлов и контрольной точки")
+    parser.add_argument('--checkpoint', default=GEOCODE_BACKFILL_CHECKPOINT, help="Файл контрольной точки")
+    parser.add_argument('--reset', action='store_true', help="Начать заново, не учитывая контрольную точку")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    stats = asyncio.run(_backfill(args))
+    print(GeocodeBackfill.format_report(stats))
+
+
+if __name__ == '__main__':
+    main()
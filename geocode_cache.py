@@ -0,0 +1,138 @@
+"""
+Модуль кэша геокодирования
+Двухуровневый кэш результатов Geocoding API: LRU в памяти процесса и файл SQLite,
+который переживает перезапуск бота. Ключ - канонический вид адреса (AddressNormalizer)
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from address_normalizer import AddressNormalizer
+from config import (GEOCODE_CACHE_FILE, GEOCODE_CACHE_SIZE,
+                    GEOCODE_CACHE_TTL_DAYS, GEOCODE_NEGATIVE_TTL_HOURS)
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodeCache:
+    """Кэш результатов геокодирования"""
+
+    # Срок хранения найденного и ненайденного адреса (секунды)
+    TTL_SECONDS = GEOCODE_CACHE_TTL_DAYS * 86400
+    NEGATIVE_TTL_SECONDS = GEOCODE_NEGATIVE_TTL_HOURS * 3600
+
+    # Кэш в памяти: ключ -> (результат, срок годности)
+    _memory: 'OrderedDict[str, Tuple[Dict, float]]' = OrderedDict()
+
+    # Соединение с файлом кэша (открывается при первом обращении)
+    _connection: Optional[sqlite3.Connection] = None
+
+    # Статистика обращений
+    stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    @staticmethod
+    def key(address: str) -> str:
+        """Ключ кэша: канонический вид адреса (разные записи одного дома дают один ключ)"""
+        return AddressNormalizer.canonical_key(address)
+
+    @staticmethod
+    def _get_connection() -> sqlite3.Connection:
+        """Открыть файл кэша и создать таблицу при первом обращении"""
+        if GeocodeCache._connection is None:
+            connection = sqlite3.connect(GEOCODE_CACHE_FILE, check_same_thread=False)
+            # WAL позволяет скриптам читать кэш, пока бот в него пишет
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS geocode ('
+                'key TEXT PRIMARY KEY, info TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            connection.commit()
+            GeocodeCache._connection = connection
+        return GeocodeCache._connection
+
+    @staticmethod
+    def _remember(key: str, info: Dict, expires_at: float):
+        """Положить результат в кэш в памяти, вытесняя самый давний"""
+        memory = GeocodeCache._memory
+        memory[key] = (info, expires_at)
+        memory.move_to_end(key)
+        while len(memory) > GEOCODE_CACHE_SIZE:
+            memory.popitem(last=False)
+
+    @staticmethod
+    def get(address: str, now: Optional[float] = None) -> Optional[Dict]:
+        """
+        Найти результат геокодирования адреса
+
+        :param address: Адрес в том виде, в котором его ввел клиент
+        :return: Сохраненный результат или None, если его нет или срок истек
+        """
+        now = now or time.time()
+        key = GeocodeCache.key(address)
+
+        cached = GeocodeCache._memory.get(key)
+        if cached is not None:
+            info, expires_at = cached
+            if expires_at > now:
+                GeocodeCache._memory.move_to_end(key)
+                GeocodeCache.stats['memory_hits'] += 1
+                return info
+            del GeocodeCache._memory[key]
+
+        try:
+            row = GeocodeCache._get_connection().execute(
+                'SELECT info, expires_at FROM geocode WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка чтения кэша геокодирования: {e}")
+            row = None
+
+        if row is not None and row[1] > now:
+            info = json.loads(row[0])
+            GeocodeCache._remember(key, info, row[1])
+            GeocodeCache.stats['disk_hits'] += 1
+            return info
+
+        GeocodeCache.stats['misses'] += 1
+        return None
+
+    @staticmethod
+    def put(address: str, info: Dict, negative: bool = False, now: Optional[float] = None):
+        """
+        Сохранить результат геокодирования
+
+        :param address: Адрес в том виде, в котором его ввел клиент
+        :param info: Результат (поля AddressInfo)
+        :param negative: Адрес не найден - хранится меньше, вдруг клиент ошибся в одной букве
+        """
+        now = now or time.time()
+        key = GeocodeCache.key(address)
+        expires_at = now + (GeocodeCache.NEGATIVE_TTL_SECONDS if negative else GeocodeCache.TTL_SECONDS)
+
+        GeocodeCache._remember(key, info, expires_at)
+        try:
+            connection = GeocodeCache._get_connection()
+            connection.execute(
+                'INSERT OR REPLACE INTO geocode (key, info, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(info, ensure_ascii=False), expires_at)
+            )
+            connection.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка записи кэша геокодирования: {e}")
+
+    @staticmethod
+    def purge(now: Optional[float] = None) -> int:
+        """
+        Удалить просроченные записи из файла кэша
+
+        :return: Количество удаленных записей
+        """
+        now = now or time.time()
+        connection = GeocodeCache._get_connection()
+        deleted = connection.execute('DELETE FROM geocode WHERE expires_at <= ?', (now,)).rowcount
+        connection.commit()
+        return deleted
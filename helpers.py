@@ -1,7 +1,7 @@
 """Модуль вспомогательных функций для работы с заказами и временем"""
 from datetime import datetime
-from config import WORK_START_HOUR, WORK_END_HOUR, MIN_HOURS_TO_RESCHEDULE
-from database import Database
+from config import MIN_HOURS_TO_RESCHEDULE
+from slot_index import SlotIndex
 
 
 class OrderHelpers:
@@ -10,23 +10,7 @@ class OrderHelpers:
     @staticmethod
     def get_available_time_slots(date_str):
         """Получить список доступных временных слотов для даты"""
-        available_slots = []
-        current_time = datetime.now()
-
-        for hour in range(WORK_START_HOUR, WORK_END_HOUR):
-            for minute in [0, 30]:
-                time_slot = f"{hour:02d}:{minute:02d}"
-                slot_datetime = datetime.strptime(f"{date_str} {time_slot}", '%Y-%m-%d %H:%M')
-
-                # Пропускаем прошедшее время
-                if slot_datetime <= current_time:
-                    continue
-
-                # Проверяем доступность слота
-                if Database.is_time_slot_available(date_str, time_slot):
-                    available_slots.append(time_slot)
-
-        return available_slots
+        return SlotIndex.free_slots(date_str)
 
     @staticmethod
     def format_delivery_date(delivery_date_str):
@@ -1,6 +1,7 @@
 """Модуль для создания клавиатур Telegram бота"""
 from telegram import ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
-from datetime import datetime, timedelta
+from datetime import datetime
+from work_calendar import WorkCalendar
 
 
 class Keyboards:
@@ -54,19 +55,8 @@ class Keyboards:
     def get_date_selection_keyboard():
         """Получить inline клавиатуру для выбора даты"""
         keyboard = []
-        today = datetime.now()
-
-        for i in range(7):
-            date = today + timedelta(days=i)
-            date_str = date.strftime('%Y-%m-%d')
-
-            if i == 0:
-                button_text = f"Сегодня ({date.strftime('%d.%m')})"
-            elif i == 1:
-                button_text = f"Завтра ({date.strftime('%d.%m')})"
-            else:
-                button_text = date.strftime('%d.%m.%Y (%A)')
 
+        for date_str, button_text in WorkCalendar.get_booking_dates():
             keyboard.append([InlineKeyboardButton(button_text, callback_data=f"date_{date_str}")])
 
         keyboard.append([InlineKeyboardButton("❌ Отменить", callback_data="cancel")])
@@ -90,6 +80,27 @@ class Keyboards:
         keyboard.append([InlineKeyboardButton("❌ Отменить", callback_data="cancel")])
         return InlineKeyboardMarkup(keyboard)
 
+    @staticmethod
+    def get_alternative_slots_keyboard(date_str, alternatives, callback_prefix, back_callback):
+        """Получить inline клавиатуру с ближайшими свободными слотами вместо занятого"""
+        keyboard = []
+
+        for slot_date, time_slot in alternatives:
+            if slot_date == date_str:
+                button_text = f"⏰ {time_slot}"
+            else:
+                button_text = f"📅 {datetime.strptime(slot_date, '%Y-%m-%d').strftime('%d.%m')} ⏰ {time_slot}"
+
+            keyboard.append([InlineKeyboardButton(
+                button_text,
+                callback_data=f"{callback_prefix}{slot_date}_{time_slot}"
+            )])
+
+        keyboard.append([InlineKeyboardButton("📋 Все свободные слоты", callback_data="show_all_slots")])
+        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data=back_callback)])
+        keyboard.append([InlineKeyboardButton("❌ Отменить", callback_data="cancel")])
+        return InlineKeyboardMarkup(keyboard)
+
     @staticmethod
     def get_order_actions_keyboard(order_id, can_reschedule=True):
         """Получить клавиатуру действий с заказом"""
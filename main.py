@@ -1,5 +1,6 @@
+import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
@@ -11,10 +12,24 @@ from telegram.ext import (
     filters
 )
 from database import Database
-from config import TELEGRAM_BOT_TOKEN, WORK_START_HOUR, WORK_END_HOUR, DELIVERY_INTERVAL, MIN_HOURS_TO_RESCHEDULE
+from config import (TELEGRAM_BOT_TOKEN, WORK_START_HOUR, WORK_END_HOUR, DELIVERY_INTERVAL,
+                    MIN_HOURS_TO_ORDER, MIN_HOURS_TO_RESCHEDULE, ALTERNATIVE_SLOTS_COUNT,
+                    WAITLIST_HOLD_MINUTES, SLOT_HOLD_SECONDS, SLOT_HOLD_VIEW_COUNT, ADMIN_IDS)
 from utils import validate_kyrgyzstan_phone, format_kyrgyzstan_phone
 from reminder_service import ReminderScheduler
-from address_validator import test_address_validation, get_address_validator
+from reminder_policy import ReminderPolicy
+from reminder_metrics import ReminderMetrics
+from message_dispatcher import MessageDispatcher
+from bulk_reschedule import BulkReschedule
+from subscriptions import Subscriptions
+from address_validator import test_address_validation, get_address_validator, KyrgyzstanAddressValidator
+from wave_planner import WavePlanner
+from courier_assignment import CourierAssignment
+from slot_index import SlotIndex
+from keyboards import Keyboards
+from waitlist import Waitlist, WaitlistEntry
+from slot_holds import SlotHolds
+from work_calendar import WorkCalendar
 
 # Настройка логирования
 logging.basicConfig(
@@ -37,6 +52,24 @@ class WaterBot:
         Database.init_users_file()
         Database.init_orders_file()
 
+    @staticmethod
+    async def post_init(application: Application):
+        """Загрузить сохраненные напоминания и запустить их диспетчер"""
+        ReminderScheduler.rehydrate()
+
+        # Общий диспетчер сообщений с лимитами Telegram для всех массовых рассылок
+        dispatcher = MessageDispatcher(application.bot)
+        application.bot_data['dispatcher'] = dispatcher
+        application.create_task(ReminderScheduler.run_dispatcher(dispatcher))
+
+        # Ночное создание регулярных заказов (первый проход сразу - наверстать время простоя)
+        application.create_task(Subscriptions.run_nightly(dispatcher))
+
+    @staticmethod
+    async def post_shutdown(application: Application):
+        """Закрыть пул соединений геокодера"""
+        await KyrgyzstanAddressValidator.aclose()
+
     @staticmethod
     async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
@@ -83,6 +116,7 @@ class WaterBot:
                 context.user_data['name'] = user['name']
                 context.user_data['phone'] = user['phone']
                 context.user_data['address'] = user['address']
+                context.user_data.pop('location', None)
 
                 # Клавиатура для выбора количества бутылок
                 keyboard = [
@@ -147,7 +181,9 @@ class WaterBot:
                 f"💧 Доставка питьевой воды по вашему адресу\n\n"
                 f"🔔 Напоминания:\n"
                 f"• В 8:00 утра в день доставки\n"
-                f"• За 30 минут до доставки\n\n"
+                f"• За 30 минут до доставки\n"
+                f"Изменить или отключить: /reminders\n\n"
+                f"🔁 Регулярный заказ (каждую неделю или раз в две недели): /subscription\n\n"
                 f"Для оформления заказа нажмите '📦 Сделать заказ'"
             )
             await update.message.reply_text(info_text)
@@ -304,6 +340,7 @@ class WaterBot:
     async def order_address(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Получение адреса и переход к выбору количества бутылок"""
         context.user_data['address'] = update.message.text
+        context.user_data.pop('location', None)
 
         # Клавиатура для выбора количества бутылок
         keyboard = [
@@ -365,20 +402,9 @@ class WaterBot:
     async def show_date_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать выбор даты"""
         keyboard = []
-        today = datetime.now()
-
-        # Предлагаем следующие 7 дней
-        for i in range(7):
-            date = today + timedelta(days=i)
-            date_str = date.strftime('%Y-%m-%d')
-
-            if i == 0:
-                button_text = f"Сегодня ({date.strftime('%d.%m')})"
-            elif i == 1:
-                button_text = f"Завтра ({date.strftime('%d.%m')})"
-            else:
-                button_text = date.strftime('%d.%m.%Y (%A)')
 
+        # Предлагаем рабочие дни горизонта бронирования (выходные по календарю скрыты)
+        for date_str, button_text in WorkCalendar.get_booking_dates():
             keyboard.append([InlineKeyboardButton(button_text, callback_data=f"date_{date_str}")])
 
         keyboard.append([InlineKeyboardButton("❌ Отменить", callback_data="cancel")])
@@ -422,45 +448,114 @@ class WaterBot:
         date_obj = datetime.strptime(date_str, '%Y-%m-%d')
 
         keyboard = []
-        current_time = datetime.now()
-        min_hours_ahead = 4  # Минимум 4 часа до доставки
-
-        # Генерируем слоты времени с интервалом 30 минут
-        for hour in range(WORK_START_HOUR, WORK_END_HOUR):
-            for minute in [0, 30]:
-                time_slot = f"{hour:02d}:{minute:02d}"
-                slot_datetime = datetime.strptime(f"{date_str} {time_slot}", '%Y-%m-%d %H:%M')
-
-                # Проверяем, что время не в прошлом и не менее чем за 4 часа
-                time_until_slot = (slot_datetime - current_time).total_seconds() / 3600  # в часах
-                if time_until_slot < min_hours_ahead:
-                    continue
-
-                # Проверяем доступность слота - показываем только свободные
-                if Database.is_time_slot_available(date_str, time_slot):
-                    keyboard.append([InlineKeyboardButton(
-                        f"⏰ {time_slot}",
-                        callback_data=f"time_{time_slot}"
-                    )])
+        user_id = update.effective_user.id
 
-        # Если нет доступных слотов
+        # Клиент смотрит новый список - прежние удержания ему больше не нужны
+        SlotHolds.release_owner(user_id)
+
+        def load_slots():
+            # Только свободные слоты, до которых не меньше MIN_HOURS_TO_ORDER часов,
+            # и заказы дня, прочитанные индексом слотов тем же чтением файла
+            slots = SlotIndex.free_slots(date_str, MIN_HOURS_TO_ORDER, user_id)
+            return slots, SlotIndex.day_orders(date_str) if slots else []
+
+        # Чтение файла заказов - в отдельном потоке, чтобы не задерживать других клиентов
+        available_slots, day_orders = await asyncio.get_running_loop().run_in_executor(None, load_slots)
+
+        # Сначала показываем слоты, когда курьер уже будет в районе клиента
+        location = await WaterBot._resolve_customer_location(context)
+        ranked_slots, preferred_slots = WavePlanner.rank_slots(available_slots, day_orders, location['district'])
+
+        # Первые слоты списка закрепляем за клиентом, пока он выбирает
+        WaterBot._hold_slots(date_str, ranked_slots[:SLOT_HOLD_VIEW_COUNT], user_id)
+
+        for time_slot in ranked_slots:
+            label = f"🚚 {time_slot}" if time_slot in preferred_slots else f"⏰ {time_slot}"
+            keyboard.append([InlineKeyboardButton(label, callback_data=f"time_{time_slot}")])
+
+        # Если нет доступных слотов - предлагаем встать в лист ожидания
         if not keyboard:
             keyboard.append([InlineKeyboardButton("❌ Нет свободных слотов", callback_data="no_slots")])
+            keyboard.append([InlineKeyboardButton("🔔 Встать в лист ожидания", callback_data="waitlist_join")])
 
         keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="back_to_date")])
         keyboard.append([InlineKeyboardButton("❌ Отменить", callback_data="cancel")])
 
         reply_markup = InlineKeyboardMarkup(keyboard)
 
+        hint = "\n🚚 - курьер в это время уже будет в вашем районе" if preferred_slots else ""
+
         query = update.callback_query
         await query.message.edit_text(
             f"⏰ Выберите время доставки на {date_obj.strftime('%d.%m.%Y')}:\n"
-            f"(Показаны только свободные слоты, доступные не менее чем за 4 часа)",
+            f"(Показаны только свободные слоты, доступные не менее чем за {MIN_HOURS_TO_ORDER} ч)"
+            f"{hint}",
             reply_markup=reply_markup
         )
 
         return ORDER_TIME
 
+    @staticmethod
+    async def show_alternative_slots(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                     date_str, time_str, callback_prefix, back_callback):
+        """Показать ближайшие свободные слоты вместо уже занятого"""
+        user_id = update.effective_user.id
+        SlotHolds.release_owner(user_id)
+
+        is_reschedule = callback_prefix == "ralt_"
+        alternatives = SlotIndex.nearest_free_slots(
+            date_str, time_str, ALTERNATIVE_SLOTS_COUNT,
+            MIN_HOURS_TO_RESCHEDULE if is_reschedule else MIN_HOURS_TO_ORDER, user_id
+        )
+        state = RESCHEDULE_TIME if is_reschedule else ORDER_TIME
+
+        # Предложенные слоты закрепляем за клиентом, чтобы их не заняли до нажатия
+        for slot_date, time_slot in alternatives:
+            WaterBot._hold_slots(slot_date, [time_slot], user_id)
+
+        if not alternatives:
+            await update.callback_query.message.edit_text(
+                "⚠️ К сожалению, это время уже занято, а свободных слотов не осталось.\n"
+                "Выберите другую дату.",
+                reply_markup=InlineKeyboardMarkup([
+                    [InlineKeyboardButton("◀️ Назад", callback_data=back_callback)],
+                    [InlineKeyboardButton("❌ Отменить", callback_data="cancel")]
+                ])
+            )
+            return state
+
+        await update.callback_query.message.edit_text(
+            f"⚠️ К сожалению, время {time_str} уже занято!\n\n"
+            f"Ближайшие свободные слоты:",
+            reply_markup=Keyboards.get_alternative_slots_keyboard(
+                date_str, alternatives, callback_prefix, back_callback
+            )
+        )
+        return state
+
+    @staticmethod
+    def _hold_slots(date_str, time_slots, user_id):
+        """Закрепить слоты за клиентом на SLOT_HOLD_SECONDS"""
+        for time_slot in time_slots:
+            SlotHolds.hold(date_str, time_slot, user_id, SLOT_HOLD_SECONDS)
+
+    @staticmethod
+    async def _resolve_customer_location(context: ContextTypes.DEFAULT_TYPE):
+        """Определить координаты и район адреса клиента (один раз за оформление заказа)"""
+        if 'location' not in context.user_data:
+            address_info = await get_address_validator().validate_address_async(context.user_data.get('address') or '')
+
+            if address_info.is_valid:
+                context.user_data['location'] = {
+                    'latitude': address_info.latitude or None,
+                    'longitude': address_info.longitude or None,
+                    'district': address_info.district
+                }
+            else:
+                context.user_data['location'] = {'latitude': None, 'longitude': None, 'district': None}
+
+        return context.user_data['location']
+
     @staticmethod
     async def handle_time_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка выбора времени и создание заказа"""
@@ -483,49 +578,45 @@ class WaterBot:
             await query.answer("⚠️ Это время уже занято!", show_alert=True)
             return ORDER_TIME
 
-        time_str = query.data.replace("time_", "")
+        if query.data == "show_all_slots":
+            return await WaterBot.show_time_selection(update, context)
+
+        if query.data == "waitlist_join":
+            return await WaterBot.join_waitlist(update, context)
+
+        if query.data.startswith("alt_"):
+            # Выбран один из предложенных ближайших слотов (возможно, на другую дату)
+            _, alt_date, time_str = query.data.split("_", 2)
+            context.user_data['delivery_date'] = alt_date
+        else:
+            time_str = query.data.replace("time_", "")
 
         # Проверяем доступность еще раз
         date_str = context.user_data['delivery_date']
-        if not Database.is_time_slot_available(date_str, time_str):
-            await query.answer("⚠️ К сожалению, это время уже занято!", show_alert=True)
-            return await WaterBot.show_time_selection(update, context)
+        user_id = update.effective_user.id
+        if not SlotIndex.is_available(date_str, time_str, user_id) or \
+                not SlotHolds.hold(date_str, time_str, user_id, SLOT_HOLD_SECONDS):
+            return await WaterBot.show_alternative_slots(update, context, date_str, time_str, "alt_", "back_to_date")
 
         # Форматируем номер телефона перед сохранением
         formatted_phone = format_kyrgyzstan_phone(context.user_data['phone'])
 
         # Создаем заказ
-        user_id = update.effective_user.id
         delivery_date = datetime.strptime(date_str, '%Y-%m-%d')
         bottles = context.user_data.get('bottles', 1)
 
-        order_id = Database.save_order(
+        order_id = await WaterBot._create_order(
+            context,
             user_id,
             context.user_data['name'],
             formatted_phone,
             context.user_data['address'],
-            delivery_date,
-            time_str,
-            bottles
-        )
-
-        # Планируем напоминания через JobQueue
-        reminders = await ReminderScheduler.schedule_reminders(
-            context,
-            user_id,
-            order_id,
             date_str,
             time_str,
-            context.user_data['address']
+            bottles,
+            await WaterBot._resolve_customer_location(context)
         )
 
-        # Сохраняем ID запланированных сообщений в базе данных
-        if reminders:
-            morning_msg_id = reminders['morning'].get('message_id')
-            pre_delivery_msg_id = reminders['pre_delivery'].get('message_id')
-            Database.update_order_reminder_ids(order_id, morning_msg_id, pre_delivery_msg_id)
-            logger.info(f"Сохранены ID напоминаний для заказа {order_id}: morning={morning_msg_id}, pre_delivery={pre_delivery_msg_id}")
-
         # Формируем сообщение о подтверждении
         confirmation_text = (
             f"✅ Заказ успешно оформлен!\n\n"
@@ -537,8 +628,7 @@ class WaterBot:
             f"📅 Дата: {delivery_date.strftime('%d.%m.%Y')}\n"
             f"⏰ Время: {time_str}\n\n"
             f"🔔 Вы получите напоминания:\n"
-            f"• В 8:00 утра в день доставки\n"
-            f"• За 30 минут до доставки\n\n"
+            f"{ReminderPolicy.describe(ReminderPolicy.get_kinds(user_id))}\n\n"
             f"Ожидайте доставку в указанное время!"
         )
 
@@ -564,6 +654,164 @@ class WaterBot:
 
         return CHOOSING_ACTION
 
+    @staticmethod
+    async def _create_order(context: ContextTypes.DEFAULT_TYPE, user_id, name, phone, address,
+                            date_str, time_str, bottles, location):
+        """Сохранить заказ, назначить курьера и запланировать напоминания"""
+        # Напоминания сохраняются вместе с заказом, чтобы сбой между записями не оставил заказ без них
+        order_id = Database.new_order_id()
+        reminders = ReminderScheduler.build_reminders(user_id, order_id, date_str, time_str, address)
+
+        Database.save_order(
+            user_id,
+            name,
+            phone,
+            address,
+            datetime.strptime(date_str, '%Y-%m-%d'),
+            time_str,
+            bottles,
+            latitude=location['latitude'],
+            longitude=location['longitude'],
+            district=location['district'],
+            order_id=order_id,
+            reminders=[reminder.to_record() for reminder in reminders]
+        )
+
+        # Слот теперь занят самим заказом - удержания клиента больше не нужны
+        SlotHolds.release_owner(user_id)
+
+        # Назначаем курьера новому заказу без пересчета всего дня
+        CourierAssignment.on_order_added(date_str, {
+            'order_id': order_id,
+            'bottles': bottles,
+            'latitude': location['latitude'],
+            'longitude': location['longitude']
+        })
+
+        # Ставим напоминания в очередь (отправит диспетчер напоминаний)
+        ReminderScheduler.enqueue(reminders)
+
+        return order_id
+
+    @staticmethod
+    async def join_waitlist(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Поставить клиента в лист ожидания на выбранную дату"""
+        date_str = context.user_data['delivery_date']
+        location = await WaterBot._resolve_customer_location(context)
+
+        position = Waitlist.join(WaitlistEntry(
+            user_id=update.effective_user.id,
+            chat_id=update.effective_chat.id,
+            date_str=date_str,
+            name=context.user_data['name'],
+            phone=format_kyrgyzstan_phone(context.user_data['phone']),
+            address=context.user_data['address'],
+            bottles=context.user_data.get('bottles', 1),
+            latitude=location['latitude'],
+            longitude=location['longitude'],
+            district=location['district']
+        ))
+
+        date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+        await update.callback_query.message.edit_text(
+            f"🔔 Вы в листе ожидания на {date_obj.strftime('%d.%m.%Y')} (место в очереди: {position}).\n\n"
+            f"Как только освободится время, мы предложим его вам и закрепим "
+            f"за вами на {WAITLIST_HOLD_MINUTES} минут."
+        )
+
+        context.user_data.clear()
+        return await WaterBot.start_after_callback(update, context)
+
+    @staticmethod
+    async def offer_freed_slot(context: ContextTypes.DEFAULT_TYPE, date_str, time_str):
+        """Предложить освободившийся слот первому клиенту из листа ожидания"""
+        while True:
+            # Слот должен быть действительно свободен и не ближе, чем можно оформить заказ
+            if time_str not in SlotIndex.free_slots(date_str, MIN_HOURS_TO_ORDER):
+                return
+
+            offer = Waitlist.offer_slot(date_str, time_str)
+            if offer is None:
+                return
+
+            date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+            keyboard = [
+                [InlineKeyboardButton("✅ Забронировать", callback_data=f"wl_take_{date_str}_{time_str}")],
+                [InlineKeyboardButton("❌ Отказаться", callback_data=f"wl_skip_{date_str}_{time_str}")]
+            ]
+
+            try:
+                await context.bot.send_message(
+                    chat_id=offer.entry.chat_id,
+                    text=(
+                        f"🎉 Освободилось время доставки!\n\n"
+                        f"📅 Дата: {date_obj.strftime('%d.%m.%Y')}\n"
+                        f"⏰ Время: {time_str}\n\n"
+                        f"Слот закреплен за вами на {WAITLIST_HOLD_MINUTES} минут."
+                    ),
+                    reply_markup=InlineKeyboardMarkup(keyboard)
+                )
+            except Exception as e:
+                # Клиент недоступен - сразу предлагаем слот следующему
+                logger.warning(f"Не удалось предложить слот {date_str} {time_str} клиенту {offer.entry.user_id}: {e}")
+                Waitlist.release_offer(date_str, time_str)
+                continue
+
+            logger.info(f"Слот {date_str} {time_str} предложен клиенту {offer.entry.user_id} из листа ожидания")
+            context.application.create_task(WaterBot._expire_waitlist_offer(context, date_str, time_str, offer))
+            return
+
+    @staticmethod
+    async def _expire_waitlist_offer(context: ContextTypes.DEFAULT_TYPE, date_str, time_str, offer):
+        """Снять удержание слота по истечении времени и предложить его следующему"""
+        await asyncio.sleep(WAITLIST_HOLD_MINUTES * 60)
+
+        if Waitlist.expire_offer(date_str, time_str, offer):
+            await WaterBot.offer_freed_slot(context, date_str, time_str)
+
+    @staticmethod
+    async def handle_waitlist_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Ответ клиента на предложение слота из листа ожидания"""
+        query = update.callback_query
+        await query.answer()
+
+        action, date_str, time_str = query.data.replace("wl_", "", 1).split("_", 2)
+        user_id = update.effective_user.id
+
+        if action == "skip":
+            offer = Waitlist.get_offer(date_str, time_str)
+            if offer and offer.entry.user_id == user_id:
+                Waitlist.release_offer(date_str, time_str)
+                await WaterBot.offer_freed_slot(context, date_str, time_str)
+            await query.message.edit_text("Хорошо, время передано следующему клиенту.")
+            return
+
+        entry = Waitlist.accept_offer(date_str, time_str, user_id)
+        if entry is None or not SlotIndex.is_available(date_str, time_str, user_id):
+            await query.message.edit_text("⌛ К сожалению, время бронирования истекло.")
+            return
+
+        order_id = await WaterBot._create_order(
+            context,
+            user_id,
+            entry.name,
+            entry.phone,
+            entry.address,
+            date_str,
+            time_str,
+            entry.bottles,
+            {'latitude': entry.latitude, 'longitude': entry.longitude, 'district': entry.district}
+        )
+
+        date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+        await query.message.edit_text(
+            f"✅ Заказ успешно оформлен!\n\n"
+            f"📋 Номер заказа: {order_id}\n"
+            f"📅 Дата: {date_obj.strftime('%d.%m.%Y')}\n"
+            f"⏰ Время: {time_str}\n\n"
+            f"Ожидайте доставку в указанное время!"
+        )
+
     @staticmethod
     async def start_after_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Возврат в главное меню после callback"""
@@ -858,8 +1106,16 @@ class WaterBot:
             cancelled_reminders = await ReminderScheduler.cancel_reminders_for_order(context, order_id)
             logger.info(f"Отменено {cancelled_reminders} напоминаний для заказа {order_id}")
 
-            # Отменяем заказ
-            success = Database.cancel_order(order_id)
+            # Отменяем заказ: база возвращает дату и время освободившегося слота
+            freed_slot = Database.cancel_order(order_id)
+            success = bool(freed_slot)
+            if success:
+                CourierAssignment.on_order_removed(order_id)
+
+                # Освободившееся время предлагаем клиентам из листа ожидания
+                freed_date, freed_time = freed_slot
+                if freed_time:
+                    await WaterBot.offer_freed_slot(context, freed_date, freed_time)
 
             if success:
                 await query.message.edit_text(
@@ -897,20 +1153,9 @@ class WaterBot:
     async def show_reschedule_date_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать выбор даты для переноса заказа"""
         keyboard = []
-        today = datetime.now()
-
-        # Предлагаем следующие 7 дней
-        for i in range(7):
-            date = today + timedelta(days=i)
-            date_str = date.strftime('%Y-%m-%d')
-
-            if i == 0:
-                button_text = f"Сегодня ({date.strftime('%d.%m')})"
-            elif i == 1:
-                button_text = f"Завтра ({date.strftime('%d.%m')})"
-            else:
-                button_text = date.strftime('%d.%m.%Y (%A)')
 
+        # Предлагаем рабочие дни горизонта бронирования (выходные по календарю скрыты)
+        for date_str, button_text in WorkCalendar.get_booking_dates():
             keyboard.append([InlineKeyboardButton(button_text, callback_data=f"reschedule_date_{date_str}")])
 
         keyboard.append([InlineKeyboardButton("❌ Отменить", callback_data="cancel")])
@@ -954,26 +1199,18 @@ class WaterBot:
         date_obj = datetime.strptime(date_str, '%Y-%m-%d')
 
         keyboard = []
-        current_time = datetime.now()
-        min_hours_ahead = 4  # Минимум 4 часа до доставки
-
-        # Генерируем слоты времени с интервалом 30 минут
-        for hour in range(WORK_START_HOUR, WORK_END_HOUR):
-            for minute in [0, 30]:
-                time_slot = f"{hour:02d}:{minute:02d}"
-                slot_datetime = datetime.strptime(f"{date_str} {time_slot}", '%Y-%m-%d %H:%M')
-
-                # Проверяем, что время не в прошлом и не менее чем за 4 часа
-                time_until_slot = (slot_datetime - current_time).total_seconds() / 3600  # в часах
-                if time_until_slot < min_hours_ahead:
-                    continue
-
-                # Проверяем доступность слота - показываем только свободные
-                if Database.is_time_slot_available(date_str, time_slot):
-                    keyboard.append([InlineKeyboardButton(
-                        f"⏰ {time_slot}",
-                        callback_data=f"reschedule_time_{time_slot}"
-                    )])
+        user_id = update.effective_user.id
+        SlotHolds.release_owner(user_id)
+
+        # Только свободные слоты, до которых не меньше MIN_HOURS_TO_RESCHEDULE часов
+        available_slots = SlotIndex.free_slots(date_str, MIN_HOURS_TO_RESCHEDULE, user_id)
+        WaterBot._hold_slots(date_str, available_slots[:SLOT_HOLD_VIEW_COUNT], user_id)
+
+        for time_slot in available_slots:
+            keyboard.append([InlineKeyboardButton(
+                f"⏰ {time_slot}",
+                callback_data=f"reschedule_time_{time_slot}"
+            )])
 
         # Если нет доступных слотов
         if not keyboard:
@@ -987,7 +1224,7 @@ class WaterBot:
         query = update.callback_query
         await query.message.edit_text(
             f"⏰ Выберите новое время доставки на {date_obj.strftime('%d.%m.%Y')}:\n"
-            f"(Показаны только свободные слоты, доступные не менее чем за 4 часа)",
+            f"(Показаны только свободные слоты, доступные не менее чем за {MIN_HOURS_TO_RESCHEDULE} ч)",
             reply_markup=reply_markup
         )
 
@@ -1015,13 +1252,23 @@ class WaterBot:
             await query.answer("⚠️ Это время уже занято!", show_alert=True)
             return RESCHEDULE_TIME
 
-        time_str = query.data.replace("reschedule_time_", "")
+        if query.data == "show_all_slots":
+            return await WaterBot.show_reschedule_time_selection(update, context)
+
+        if query.data.startswith("ralt_"):
+            # Выбран один из предложенных ближайших слотов (возможно, на другую дату)
+            _, alt_date, time_str = query.data.split("_", 2)
+            context.user_data['new_delivery_date'] = alt_date
+        else:
+            time_str = query.data.replace("reschedule_time_", "")
 
         # Проверяем доступность еще раз
         date_str = context.user_data['new_delivery_date']
-        if not Database.is_time_slot_available(date_str, time_str):
-            await query.answer("⚠️ К сожалению, это время уже занято!", show_alert=True)
-            return await WaterBot.show_reschedule_time_selection(update, context)
+        if not SlotIndex.is_available(date_str, time_str, update.effective_user.id) or \
+                not SlotHolds.hold(date_str, time_str, update.effective_user.id, SLOT_HOLD_SECONDS):
+            return await WaterBot.show_alternative_slots(
+                update, context, date_str, time_str, "ralt_", "back_to_reschedule_date"
+            )
 
         order_id = context.user_data.get('reschedule_order_id')
 
@@ -1033,27 +1280,24 @@ class WaterBot:
         cancelled_reminders = await ReminderScheduler.cancel_reminders_for_order(context, order_id)
         logger.info(f"Отменено {cancelled_reminders} старых напоминаний для заказа {order_id}")
 
-        # Обновляем заказ с новой датой и временем
-        success = Database.update_order_schedule(order_id, date_str, time_str)
+        # Обновляем заказ с новой датой и временем вместе с новыми напоминаниями
+        reminders = ReminderScheduler.build_reminders(user_id, order_id, date_str, time_str, order['address']) \
+            if order else []
+        success = Database.update_order_schedule(
+            order_id, date_str, time_str, [reminder.to_record() for reminder in reminders]
+        )
+        SlotHolds.release_owner(user_id)
 
         if success:
-            # Создаем новые напоминания для перенесенного заказа
-            reminders = await ReminderScheduler.schedule_reminders(
-                context,
-                user_id,
-                order_id,
-                date_str,
-                time_str,
-                order['address']
-            )
+            # Заказ переходит к курьеру, который работает в этом районе в новый день
+            CourierAssignment.on_order_removed(order_id)
+            CourierAssignment.on_order_added(date_str, order)
 
-            # Сохраняем новые ID запланированных сообщений
-            if reminders:
-                morning_msg_id = reminders['morning'].get('message_id')
-                pre_delivery_msg_id = reminders['pre_delivery'].get('message_id')
-                Database.update_order_reminder_ids(order_id, morning_msg_id, pre_delivery_msg_id)
-                logger.info(f"Сохранены новые ID напоминаний для перенесенного заказа {order_id}")
+            # Освободившееся время предлагаем клиентам из листа ожидания
+            await WaterBot.offer_freed_slot(context, order['delivery_date'], order['delivery_time'])
 
+            # Ставим в очередь новые напоминания для перенесенного заказа
+            ReminderScheduler.enqueue(reminders)
             logger.info(f"Запланированы новые напоминания для перенесенного заказа {order_id}")
 
             await query.message.edit_text(
@@ -1061,8 +1305,7 @@ class WaterBot:
                 f"📅 Новая дата: {date_str}\n"
                 f"⏰ Новое время: {time_str}\n\n"
                 f"🔔 Вы получите обновленные напоминания:\n"
-                f"• В 8:00 утра в день доставки\n"
-                f"• За 30 минут до доставки"
+                f"{ReminderPolicy.describe(ReminderPolicy.get_kinds(user_id))}"
             )
         else:
             await query.message.edit_text(
@@ -1181,6 +1424,117 @@ class WaterBot:
 
         return CHOOSING_ACTION
 
+    @staticmethod
+    async def reminders_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /reminders для настройки напоминаний"""
+        user_id = update.effective_user.id
+
+        if not context.args:
+            await update.message.reply_text(
+                f"🔔 Ваши напоминания:\n"
+                f"{ReminderPolicy.describe(ReminderPolicy.get_kinds(user_id))}\n\n"
+                f"Изменить:\n"
+                f"/reminders 08:00,-30 - в 8:00 и за 30 минут до доставки\n"
+                f"/reminders -60 - только за час до доставки\n"
+                f"/reminders off - отключить напоминания\n"
+                f"/reminders default - вернуть стандартные"
+            )
+            return
+
+        policy = " ".join(context.args)
+        if policy.strip().lower() == 'default':
+            policy = ReminderPolicy.DEFAULT
+
+        try:
+            kinds = ReminderPolicy.set_policy(user_id, policy)
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+
+        await update.message.reply_text(
+            f"✅ Настройка сохранена и применится к новым заказам:\n"
+            f"{ReminderPolicy.describe(kinds)}"
+        )
+
+    @staticmethod
+    async def subscription_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /subscription для настройки регулярного заказа"""
+        user_id = update.effective_user.id
+
+        if not context.args:
+            subscription = next(
+                (item for item in Database.get_subscriptions() if item['user_id'] == user_id), None
+            )
+            await update.message.reply_text(
+                f"🔁 Регулярный заказ:\n"
+                f"{Subscriptions.describe(subscription)}\n\n"
+                f"Изменить:\n"
+                f"/subscription пт 10:00 2 - 2 бутылки каждую пятницу в 10:00\n"
+                f"/subscription пн 15:30 1 2 - 1 бутылка раз в две недели по понедельникам\n"
+                f"/subscription off - отключить"
+            )
+            return
+
+        if context.args[0].lower() in ('off', 'нет', 'выкл'):
+            if Database.cancel_subscription(user_id):
+                await update.message.reply_text(
+                    "✅ Регулярный заказ отключен. Уже созданные заказы можно отменить в «📋 Мои заказы»."
+                )
+            else:
+                await update.message.reply_text("Регулярных заказов нет")
+            return
+
+        try:
+            weekday, time_str, bottles, weeks = Subscriptions.parse(context.args)
+            Subscriptions.subscribe(user_id, weekday, time_str, bottles, weeks)
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+
+        # Ближайшие заказы создаем сразу, остальные создаст ночная задача
+        result = await Subscriptions.materialize_async(user_id=user_id)
+        subscription = next(item for item in Database.get_subscriptions() if item['user_id'] == user_id)
+
+        text = f"✅ Регулярный заказ сохранен:\n{Subscriptions.describe(subscription)}"
+        if result['skipped']:
+            text += f"\n\n⚠️ На {', '.join(date_str for _, date_str in result['skipped'])} все время занято, " \
+                    f"эти доставки не созданы"
+        await update.message.reply_text(text)
+
+    @staticmethod
+    async def metrics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /metrics: статистика напоминаний и геокодирования (только для сотрудников)"""
+        if update.effective_user.id not in ADMIN_IDS:
+            return
+
+        await update.message.reply_text(
+            f"{ReminderMetrics.format_report()}\n\n🗺 Геокодирование\n{KyrgyzstanAddressValidator.format_metrics()}"
+        )
+
+    @staticmethod
+    async def move_courier_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /move_courier YYYY-MM-DD N: перенести заказы курьера на дату (только для сотрудников)"""
+        if update.effective_user.id not in ADMIN_IDS:
+            return
+
+        try:
+            date_str, courier = context.args
+            datetime.strptime(date_str, '%Y-%m-%d')
+            courier = int(courier)
+        except ValueError:
+            await update.message.reply_text("Использование: /move_courier YYYY-MM-DD номер_курьера")
+            return
+
+        await update.message.reply_text(f"🔄 Переношу заказы курьера {courier} на {date_str}...")
+        result = await BulkReschedule.move_courier_day(context, date_str, courier)
+
+        lines = [f"✅ Перенесено заказов: {len(result['moved'])}, уведомлено клиентов: {result['notified']}"]
+        lines += [f"• {order_id} → {new_date} {new_time}"
+                  for order_id, (new_date, new_time) in sorted(result['moved'].items(), key=lambda item: item[1])]
+        if result['unplaced']:
+            lines.append(f"\n⚠️ Нет свободного времени в пределах горизонта бронирования: {', '.join(result['unplaced'])}")
+        await update.message.reply_text("\n".join(lines))
+
     # Тестовая команда для проверки адресов
     @staticmethod
     async def test_address_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1232,7 +1586,12 @@ def main():
     bot = WaterBot()
 
     # Создание приложения
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = (
+        Application.builder().token(TELEGRAM_BOT_TOKEN)
+        .post_init(WaterBot.post_init)
+        .post_shutdown(WaterBot.post_shutdown)
+        .build()
+    )
 
     # Добавляем обработчик команды /start (вне ConversationHandler для перезапуска)
     application.add_handler(CommandHandler('start', WaterBot.start))
@@ -1240,6 +1599,21 @@ def main():
     # Добавляем команду для тестирования валидации адресов
     application.add_handler(CommandHandler('address', WaterBot.test_address_command))
 
+    # Настройка напоминаний клиента
+    application.add_handler(CommandHandler('reminders', WaterBot.reminders_command))
+
+    # Регулярный заказ клиента
+    application.add_handler(CommandHandler('subscription', WaterBot.subscription_command))
+
+    # Статистика доставки напоминаний для сотрудников
+    application.add_handler(CommandHandler('metrics', WaterBot.metrics_command))
+
+    # Перенос заказов курьера, который не вышел на линию
+    application.add_handler(CommandHandler('move_courier', WaterBot.move_courier_command))
+
+    # Ответы на предложения из листа ожидания (приходят вне диалога оформления заказа)
+    application.add_handler(CallbackQueryHandler(WaterBot.handle_waitlist_callback, pattern=r'^wl_'))
+
     # Создание ConversationHandler
     conv_handler = ConversationHandler(
         entry_points=[MessageHandler(filters.TEXT & ~filters.COMMAND, WaterBot.handle_main_menu)],
@@ -0,0 +1,186 @@
+"""
+Модуль отправки сообщений с учетом лимитов Telegram
+Утренние напоминания приходятся на 8:00 одновременно для всех заказов дня,
+поэтому отправка идет через общий ограничитель скорости, а не сразу всем чатам
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from config import (SEND_RATE_PER_SECOND, SEND_CHAT_INTERVAL_SECONDS,
+                    SEND_CONCURRENCY, SEND_MAX_RETRIES)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OutgoingMessage:
+    """Сообщение в очереди на отправку"""
+    chat_id: int
+    text: str
+    due_at: Optional[datetime] = None
+    # Заполняются при отправке: когда сообщение принято и тип последней ошибки
+    sent_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class TokenBucket:
+    """Ограничитель скорости: не больше rate событий в секунду с запасом burst"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        """Начислить токены за прошедшее время"""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """Остановить выдачу токенов (Telegram попросил подождать)"""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0
+        self._updated = max(self._updated, self._paused_until)
+
+    async def acquire(self):
+        """Дождаться токена (запросы обслуживаются по очереди)"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class MessageDispatcher:
+    """Отправка сообщений с общим и початовым лимитом, повторами и ограничением параллельности"""
+
+    # Сколько последних задержек отправки хранить для статистики
+    LATENCY_WINDOW = 10000
+
+    # Результаты отправки
+    SENT = 'sent'          # Сообщение принято Telegram
+    RETRY = 'retry'        # Временная ошибка, отправку стоит повторить позже
+    REJECTED = 'rejected'  # Чат недоступен, повтор не поможет
+
+    def __init__(self, bot, rate: float = SEND_RATE_PER_SECOND,
+                 chat_interval: float = SEND_CHAT_INTERVAL_SECONDS,
+                 concurrency: int = SEND_CONCURRENCY, max_retries: int = SEND_MAX_RETRIES):
+        self.bot = bot
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+
+        # Без запаса на всплеск: лимит Telegram считается в скользящем окне, а не в среднем
+        self._bucket = TokenBucket(rate, burst=1)
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        # Момент, раньше которого нельзя писать в чат (по монотонным часам)
+        self._chat_ready: Dict[int, float] = {}
+
+        # Задержки отправки относительно запланированного времени (секунды)
+        self.latencies: Deque[float] = deque(maxlen=self.LATENCY_WINDOW)
+
+    async def _wait_chat(self, chat_id: int):
+        """Выдержать паузу между сообщениями в один чат"""
+        now = time.monotonic()
+        ready_at = self._chat_ready.get(chat_id, 0.0)
+        self._chat_ready[chat_id] = max(now, ready_at) + self.chat_interval
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+    def _record_latency(self, message: OutgoingMessage):
+        """Запомнить, когда и насколько позже запланированного ушло сообщение"""
+        message.sent_at = datetime.now()
+        if message.due_at is not None:
+            self.latencies.append(max((message.sent_at - message.due_at).total_seconds(), 0.0))
+
+    async def send(self, message: OutgoingMessage) -> str:
+        """
+        Отправить сообщение с учетом лимитов
+
+        :param message: Сообщение
+        :return: SENT, RETRY или REJECTED
+        """
+        await self._wait_chat(message.chat_id)
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self._bucket.acquire()
+                try:
+                    await self.bot.send_message(chat_id=message.chat_id, text=message.text)
+                    self._record_latency(message)
+                    return MessageDispatcher.SENT
+                except RetryAfter as e:
+                    # Лимит общий для бота - останавливаем всю отправку
+                    logger.warning(f"Превышен лимит Telegram, пауза {e.retry_after} с")
+                    message.error = type(e).__name__
+                    self._bucket.pause(e.retry_after)
+                except (Forbidden, BadRequest) as e:
+                    # Клиент заблокировал бота или чат не существует - повтор не поможет
+                    logger.error(f"Сообщение в чат {message.chat_id} не доставлено: {e}")
+                    message.error = type(e).__name__
+                    return MessageDispatcher.REJECTED
+                except TelegramError as e:
+                    message.error = type(e).__name__
+                    if attempt < self.max_retries:
+                        delay = 2 ** attempt
+                        logger.warning(f"Ошибка отправки в чат {message.chat_id}: {e}, повтор через {delay} с")
+                        await asyncio.sleep(delay)
+                    else:
+                        logger.error(f"Ошибка отправки в чат {message.chat_id}: {e}")
+
+        return MessageDispatcher.RETRY
+
+    async def send_many(self, messages: List[OutgoingMessage],
+                        on_sent: Optional[Callable[[int], None]] = None) -> List[str]:
+        """
+        Отправить пакет сообщений так быстро, как позволяют лимиты
+
+        :param messages: Сообщения
+        :param on_sent: Вызывается с номером сообщения в пакете сразу, как Telegram его принял
+        :return: Результаты отправки в том же порядке
+        """
+        if not messages:
+            return []
+
+        async def send(index: int, message: OutgoingMessage) -> str:
+            result = await self.send(message)
+            if result == MessageDispatcher.SENT and on_sent is not None:
+                on_sent(index)
+            return result
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(send(index, message) for index, message in enumerate(messages)))
+
+        sent = results.count(MessageDispatcher.SENT)
+        logger.info(
+            f"Отправлено {sent}/{len(messages)} сообщений за {time.monotonic() - started:.1f} с, "
+            f"задержка p95: {self.latency_percentile(95):.1f} с"
+        )
+        return list(results)
+
+    def latency_percentile(self, percentile: float) -> float:
+        """Перцентиль задержки отправки относительно запланированного времени (секунды)"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
@@ -151,3 +151,47 @@ class Messages:
             f"Попробуйте позже или свяжитесь с поддержкой."
         )
 
+    @staticmethod
+    def get_morning_reminder(order_id, delivery_time, address):
+        """Утреннее напоминание в день доставки"""
+        return (
+            f"🌅 Доброе утро!\n\n"
+            f"Напоминаем, что сегодня в {delivery_time} "
+            f"к вам приедет доставка воды.\n\n"
+            f"📋 Заказ: {order_id}\n"
+            f"📍 Адрес: {address}"
+        )
+
+    @staticmethod
+    def get_day_reminder(order_id, delivery_time, address):
+        """Напоминание в выбранное клиентом время дня доставки"""
+        return (
+            f"🔔 Напоминание!\n\n"
+            f"Сегодня в {delivery_time} "
+            f"к вам приедет доставка воды.\n\n"
+            f"📋 Заказ: {order_id}\n"
+            f"📍 Адрес: {address}"
+        )
+
+    @staticmethod
+    def get_pre_delivery_reminder(order_id, delivery_time, address, minutes_before=30):
+        """Напоминание за несколько минут до доставки"""
+        return (
+            f"⏰ Напоминание!\n\n"
+            f"Через {minutes_before} минут (в {delivery_time}) "
+            f"к вам приедет доставка воды.\n\n"
+            f"📋 Заказ: {order_id}\n"
+            f"📍 Адрес: {address}\n\n"
+            f"Пожалуйста, будьте готовы принять доставку! 👍"
+        )
+
+    @staticmethod
+    def get_order_moved_notice(order_id, old_date, old_time, new_date, new_time):
+        """Уведомление о переносе заказа службой доставки"""
+        return (
+            f"🔄 Заказ {order_id} перенесен\n\n"
+            f"К сожалению, мы не сможем доставить воду {old_date} в {old_time}.\n"
+            f"📅 Новая дата: {new_date}\n"
+            f"⏰ Новое время: {new_time}\n\n"
+            f"Если время не подходит, выберите другое в разделе «📋 Мои заказы». Приносим извинения!"
+        )
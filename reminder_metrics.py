@@ -0,0 +1,156 @@
+"""
+Модуль метрик доставки напоминаний
+Считает опоздание отправки относительно запланированного времени, ошибки Telegram
+по типам и глубину очереди, чтобы было видно, укладываются ли напоминания в утренний пик
+"""
+
+from bisect import bisect_left
+from collections import Counter, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+from reminder_policy import MORNING, PRE_DELIVERY
+
+
+class ReminderMetrics:
+    """Метрики доставки напоминаний с момента запуска бота"""
+
+    # Границы корзин гистограммы опоздания (секунды); последняя корзина - больше последней границы
+    LATENESS_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1200)
+
+    # Как часто записывать глубину очереди (секунды) и сколько записей хранить (сутки)
+    DEPTH_SAMPLE_SECONDS = 60
+    DEPTH_HISTORY = 24 * 60
+
+    # Гистограммы опоздания по группам напоминаний
+    _histograms: Dict[str, List[int]] = {}
+
+    # Сумма и максимум опоздания по группам (секунды)
+    _lateness_sum: Dict[str, float] = {}
+    _lateness_max: Dict[str, float] = {}
+
+    # Итоги отправки: sent, retried, failed, missed, interrupted
+    _outcomes: Counter = Counter()
+
+    # Ошибки отправки по типу исключения Telegram
+    _errors: Counter = Counter()
+
+    # Глубина очереди во времени: (время, количество напоминаний)
+    _depth: Deque[Tuple[datetime, int]] = deque(maxlen=DEPTH_HISTORY)
+
+    @staticmethod
+    def _group(kind: str) -> str:
+        """Группа напоминания (пользовательские времена объединены, чтобы не плодить метрики)"""
+        return kind if kind in (MORNING, PRE_DELIVERY) else 'custom'
+
+    @staticmethod
+    def record_sent(kind: str, due_at: datetime, sent_at: datetime):
+        """Учесть отправленное напоминание"""
+        group = ReminderMetrics._group(kind)
+        lateness = max((sent_at - due_at).total_seconds(), 0.0)
+
+        histogram = ReminderMetrics._histograms.setdefault(group, [0] * (len(ReminderMetrics.LATENESS_BUCKETS) + 1))
+        histogram[bisect_left(ReminderMetrics.LATENESS_BUCKETS, lateness)] += 1
+
+        ReminderMetrics._lateness_sum[group] = ReminderMetrics._lateness_sum.get(group, 0.0) + lateness
+        ReminderMetrics._lateness_max[group] = max(ReminderMetrics._lateness_max.get(group, 0.0), lateness)
+        ReminderMetrics._outcomes['sent'] += 1
+
+    @staticmethod
+    def record_failure(error_type: Optional[str], final: bool):
+        """
+        Учесть неудачную попытку отправки
+
+        :param error_type: Имя класса исключения Telegram
+        :param final: True если попытки исчерпаны, False если будет повтор
+        """
+        ReminderMetrics._errors[error_type or 'Unknown'] += 1
+        ReminderMetrics._outcomes['failed' if final else 'retried'] += 1
+
+    @staticmethod
+    def record_missed():
+        """Учесть напоминание, не отправленное до времени доставки"""
+        ReminderMetrics._outcomes['missed'] += 1
+
+    @staticmethod
+    def record_interrupted():
+        """Учесть напоминание, отправка которого была прервана перезапуском и повторяется"""
+        ReminderMetrics._outcomes['interrupted'] += 1
+
+    @staticmethod
+    def sample_depth(depth: int, now: Optional[datetime] = None):
+        """Записать глубину очереди, если с прошлой записи прошло достаточно времени"""
+        now = now or datetime.now()
+        history = ReminderMetrics._depth
+        if not history or (now - history[-1][0]).total_seconds() >= ReminderMetrics.DEPTH_SAMPLE_SECONDS:
+            history.append((now, depth))
+
+    @staticmethod
+    def _percentile_bound(histogram: List[int], percentile: float) -> str:
+        """Верхняя граница корзины, в которую попадает перцентиль"""
+        total = sum(histogram)
+        threshold = total * percentile / 100
+        cumulative = 0
+        for index, count in enumerate(histogram):
+            cumulative += count
+            if cumulative >= threshold:
+                if index < len(ReminderMetrics.LATENESS_BUCKETS):
+                    return f"≤{ReminderMetrics.LATENESS_BUCKETS[index]} с"
+                return f">{ReminderMetrics.LATENESS_BUCKETS[-1]} с"
+        return "-"
+
+    @staticmethod
+    def snapshot() -> Dict:
+        """Текущие значения метрик"""
+        groups = {}
+        for group, histogram in ReminderMetrics._histograms.items():
+            count = sum(histogram)
+            groups[group] = {
+                'count': count,
+                'avg_lateness': ReminderMetrics._lateness_sum[group] / count if count else 0.0,
+                'max_lateness': ReminderMetrics._lateness_max[group],
+                'p50': ReminderMetrics._percentile_bound(histogram, 50),
+                'p95': ReminderMetrics._percentile_bound(histogram, 95),
+                'histogram': dict(zip(
+                    [f"≤{bound}" for bound in ReminderMetrics.LATENESS_BUCKETS] + [f">{ReminderMetrics.LATENESS_BUCKETS[-1]}"],
+                    histogram
+                ))
+            }
+
+        return {
+            'lateness': groups,
+            'outcomes': dict(ReminderMetrics._outcomes),
+            'errors': dict(ReminderMetrics._errors),
+            'queue_depth': list(ReminderMetrics._depth)
+        }
+
+    @staticmethod
+    def format_report() -> str:
+        """Отчет для команды /metrics"""
+        data = ReminderMetrics.snapshot()
+        lines = ["📊 Напоминания с момента запуска\n"]
+
+        names = {MORNING: "Утренние", PRE_DELIVERY: "За 30 минут", 'custom': "Свои настройки"}
+        for group, stats in data['lateness'].items():
+            lines.append(
+                f"{names.get(group, group)}: {stats['count']} шт., опоздание "
+                f"в среднем {stats['avg_lateness']:.0f} с, p50 {stats['p50']}, p95 {stats['p95']}, "
+                f"максимум {stats['max_lateness']:.0f} с"
+            )
+            lines.append("  " + ", ".join(f"{bucket}: {count}" for bucket, count in stats['histogram'].items() if count))
+
+        outcomes = data['outcomes']
+        lines.append(
+            f"\nОтправлено: {outcomes.get('sent', 0)}, повторов: {outcomes.get('retried', 0)}, "
+            f"ошибок: {outcomes.get('failed', 0)}, пропущено: {outcomes.get('missed', 0)}, "
+            f"прервано перезапуском: {outcomes.get('interrupted', 0)}"
+        )
+        if data['errors']:
+            errors = sorted(data['errors'].items(), key=lambda item: -item[1])
+            lines.append("Ошибки Telegram: " + ", ".join(f"{name}: {count}" for name, count in errors))
+
+        if data['queue_depth']:
+            recent = data['queue_depth'][-6:]
+            lines.append("Очередь: " + ", ".join(f"{moment:%H:%M} - {depth}" for moment, depth in recent))
+
+        return "\n".join(lines)
@@ -0,0 +1,174 @@
+"""
+Модуль настроек напоминаний клиентов
+Клиент может отключить напоминания или выбрать свое время. Настройка хранится
+в записи пользователя, а разобранные правила кэшируются, чтобы оформление заказа
+не перечитывало файл пользователей
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from config import USERS_FILE
+from database import Database
+
+# Типы напоминаний по умолчанию (так же называются в уже сохраненных напоминаниях)
+MORNING = 'morning'
+PRE_DELIVERY = 'pre_delivery'
+
+# Напоминание в заданное время дня доставки и за N минут до доставки
+AT_PREFIX = 'at_'
+BEFORE_PREFIX = 'before_'
+
+
+class ReminderPolicy:
+    """Правила напоминаний клиентов"""
+
+    # Настройка по умолчанию: в 8:00 в день доставки и за 30 минут до доставки
+    DEFAULT = '08:00,-30'
+
+    # Значения настройки, отключающие напоминания
+    OFF_VALUES = ('off', 'нет', 'выкл')
+
+    # Ограничения пользовательской настройки
+    MAX_REMINDERS = 3
+    MIN_MINUTES_BEFORE = 5
+    MAX_MINUTES_BEFORE = 12 * 60
+
+    # Разобранные настройки: строка настройки -> типы напоминаний
+    _compiled: Dict[str, Tuple[str, ...]] = {}
+
+    # Настройки клиентов, заданные явно: user_id -> строка настройки
+    _policies: Dict[int, str] = {}
+
+    # Версия файла пользователей, по которой загружены настройки
+    _file_version: Optional[int] = None
+
+    @staticmethod
+    def parse(policy: str) -> Tuple[str, ...]:
+        """
+        Разобрать настройку в типы напоминаний
+
+        Формат: элементы через запятую, "HH:MM" - в это время в день доставки,
+        "-N" - за N минут до доставки; "off" - без напоминаний.
+
+        :param policy: Строка настройки
+        :return: Типы напоминаний в порядке отправки
+        :raises ValueError: Если настройка записана неверно
+        """
+        policy = (policy or '').strip().lower()
+        if policy in ReminderPolicy.OFF_VALUES:
+            return ()
+
+        at_times = set()
+        befores = set()
+        for item in filter(None, (part.strip() for part in policy.split(','))):
+            try:
+                if ':' in item:
+                    at_times.add(datetime.strptime(item, '%H:%M').strftime('%H:%M'))
+                    continue
+                minutes = abs(int(item))
+            except ValueError:
+                raise ValueError(f"Не удалось разобрать «{item}»: укажите время HH:MM или минуты, например -30")
+
+            if not ReminderPolicy.MIN_MINUTES_BEFORE <= minutes <= ReminderPolicy.MAX_MINUTES_BEFORE:
+                raise ValueError(f"Напоминание можно поставить за {ReminderPolicy.MIN_MINUTES_BEFORE}-"
+                                 f"{ReminderPolicy.MAX_MINUTES_BEFORE} минут до доставки")
+            befores.add(minutes)
+
+        if not at_times and not befores:
+            raise ValueError("Настройка напоминаний пуста")
+        if len(at_times) + len(befores) > ReminderPolicy.MAX_REMINDERS:
+            raise ValueError(f"Можно выбрать не больше {ReminderPolicy.MAX_REMINDERS} напоминаний")
+
+        kinds = [MORNING if at == '08:00' else f"{AT_PREFIX}{at}" for at in sorted(at_times)]
+        kinds += [PRE_DELIVERY if minutes == 30 else f"{BEFORE_PREFIX}{minutes}"
+                  for minutes in sorted(befores, reverse=True)]
+        return tuple(kinds)
+
+    @staticmethod
+    def _compile(policy: Optional[str]) -> Tuple[str, ...]:
+        """Разобрать настройку с кэшированием (некорректная настройка заменяется стандартной)"""
+        policy = policy or ReminderPolicy.DEFAULT
+        kinds = ReminderPolicy._compiled.get(policy)
+        if kinds is None:
+            try:
+                kinds = ReminderPolicy.parse(policy)
+            except ValueError:
+                kinds = ReminderPolicy.parse(ReminderPolicy.DEFAULT)
+            ReminderPolicy._compiled[policy] = kinds
+        return kinds
+
+    @staticmethod
+    def _check_file_version():
+        """Перечитать настройки, если файл пользователей изменился"""
+        version = os.stat(USERS_FILE).st_mtime_ns if os.path.exists(USERS_FILE) else None
+        if version != ReminderPolicy._file_version:
+            ReminderPolicy._policies = Database.get_user_reminder_policies()
+            ReminderPolicy._file_version = version
+
+    @staticmethod
+    def get_kinds(user_id: int) -> Tuple[str, ...]:
+        """
+        Типы напоминаний клиента
+
+        :param user_id: ID клиента
+        :return: Типы напоминаний; пустой кортеж, если клиент их отключил
+        """
+        ReminderPolicy._check_file_version()
+        return ReminderPolicy._compile(ReminderPolicy._policies.get(user_id))
+
+    @staticmethod
+    def set_policy(user_id: int, policy: str) -> Tuple[str, ...]:
+        """
+        Сохранить настройку клиента
+
+        :return: Типы напоминаний по новой настройке
+        :raises ValueError: Если настройка записана неверно или клиент не зарегистрирован
+        """
+        kinds = ReminderPolicy.parse(policy)
+        policy = policy.strip().lower()
+
+        if not Database.update_user_reminder_policy(user_id, policy):
+            raise ValueError("Настройка доступна только зарегистрированным клиентам")
+
+        ReminderPolicy._policies[user_id] = policy
+        ReminderPolicy._file_version = os.stat(USERS_FILE).st_mtime_ns
+        return kinds
+
+    @staticmethod
+    def due_time(kind: str, delivery_datetime: datetime) -> datetime:
+        """Время отправки напоминания данного типа"""
+        if kind == MORNING:
+            return delivery_datetime.replace(hour=8, minute=0)
+        if kind == PRE_DELIVERY:
+            return delivery_datetime - timedelta(minutes=30)
+        if kind.startswith(AT_PREFIX):
+            at = datetime.strptime(kind[len(AT_PREFIX):], '%H:%M')
+            return delivery_datetime.replace(hour=at.hour, minute=at.minute)
+        return delivery_datetime - timedelta(minutes=int(kind[len(BEFORE_PREFIX):]))
+
+    @staticmethod
+    def minutes_before(kind: str) -> Optional[int]:
+        """За сколько минут до доставки отправляется напоминание (None для напоминаний к времени дня)"""
+        if kind == PRE_DELIVERY:
+            return 30
+        if kind.startswith(BEFORE_PREFIX):
+            return int(kind[len(BEFORE_PREFIX):])
+        return None
+
+    @staticmethod
+    def describe(kinds: Tuple[str, ...]) -> str:
+        """Описание напоминаний для сообщений клиенту"""
+        if not kinds:
+            return "🔕 Напоминания отключены (/reminders)"
+
+        lines = []
+        for kind in kinds:
+            minutes = ReminderPolicy.minutes_before(kind)
+            if minutes is None:
+                hours, minutes = ('08:00' if kind == MORNING else kind[len(AT_PREFIX):]).split(':')
+                lines.append(f"• В {int(hours)}:{minutes} в день доставки")
+            else:
+                lines.append(f"• За {minutes} минут до доставки")
+        return "\n".join(lines)
@@ -1,205 +1,526 @@
-from datetime import datetime, timedelta
+"""
+Модуль напоминаний о доставке
+Напоминания хранятся на служебном листе файла заказов (сохраняются вместе с заказом),
+при запуске бота загружаются в очередь в памяти и отправляются фоновой задачей в нужное время.
+Неудачные отправки повторяются с растущей паузой. Доставка "хотя бы один раз": напоминание,
+отправка которого прервана перезапуском, уходит снова, а не теряется.
+"""
+
+import asyncio
 import logging
-from telegram.error import TelegramError
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import (REMINDER_MAX_ATTEMPTS, REMINDER_RETRY_BASE_SECONDS, REMINDER_PRERENDER_MINUTES,
+                    REMINDER_KEEP_DAYS)
+from database import Database
+from message_dispatcher import MessageDispatcher, OutgoingMessage
+from messages import Messages
+from reminder_metrics import ReminderMetrics
+from reminder_policy import ReminderPolicy, MORNING, AT_PREFIX
+from timing_wheel import TimingWheel
 
 logger = logging.getLogger(__name__)
 
 
-class ReminderScheduler:
-    """Планировщик напоминаний через Telegram Scheduled Messages API"""
+@dataclass
+class Reminder:
+    """Запланированное напоминание о доставке"""
+    order_id: str
+    chat_id: int
+    kind: str
+    due_at: datetime
+    delivery_date: str
+    delivery_time: str
+    address: str
+    attempts: int = 0
+    next_attempt_at: Optional[datetime] = None
+
+    # Готовый текст, подготовленный перед волной отправки
+    payload: Optional[str] = field(default=None, repr=False)
+
+    # Итог в текущем пакете уже выбран (отправлено, повтор, ошибка или пропуск)
+    handled: bool = field(default=False, repr=False)
+
+    @property
+    def key(self) -> str:
+        """Ключ напоминания: заказ, тип и время доставки, к которому оно относится"""
+        return f"{self.order_id}:{self.kind}:{self.delivery_date} {self.delivery_time}"
+
+    @property
+    def send_at(self) -> datetime:
+        """Когда отправлять: запланированное время или время повторной попытки"""
+        return self.next_attempt_at or self.due_at
+
+    @property
+    def delivery_at(self) -> datetime:
+        """Время доставки"""
+        return datetime.strptime(f"{self.delivery_date} {self.delivery_time}", '%Y-%m-%d %H:%M')
+
+    def to_record(self) -> Dict:
+        """Строка для листа напоминаний"""
+        return {
+            'key': self.key,
+            'order_id': self.order_id,
+            'chat_id': self.chat_id,
+            'kind': self.kind,
+            'due_at': self.due_at,
+            'delivery_date': self.delivery_date,
+            'delivery_time': self.delivery_time,
+            'address': self.address,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at
+        }
+
+    def render(self) -> str:
+        """Текст напоминания"""
+        if self.kind == MORNING:
+            return Messages.get_morning_reminder(self.order_id, self.delivery_time, self.address)
+        if self.kind.startswith(AT_PREFIX):
+            return Messages.get_day_reminder(self.order_id, self.delivery_time, self.address)
+        return Messages.get_pre_delivery_reminder(
+            self.order_id, self.delivery_time, self.address, ReminderPolicy.minutes_before(self.kind)
+        )
+
+
+class ReminderQueue:
+    """Очередь напоминаний в памяти на колесе таймеров"""
+
+    # Напоминания по ключу на колесе таймеров (добавление и отмена за O(1))
+    _wheel = TimingWheel()
+
+    # Ключи напоминаний по заказам
+    _by_order: Dict[str, Set[str]] = {}
+
+    # Волны отправки (напоминания с одинаковым временем): время -> ключи напоминаний
+    _waves: Dict[datetime, Set[str]] = {}
+
+    # Подготовка волн: срабатывает за REMINDER_PRERENDER_MINUTES до отправки
+    _render_wheel = TimingWheel()
+
+    # Сигнал диспетчеру: в очереди появилось напоминание раньше текущего ожидания
+    _wakeup: Optional[asyncio.Event] = None
+
+    @staticmethod
+    def _get_wakeup() -> asyncio.Event:
+        """Событие пробуждения диспетчера (создается в работающем цикле событий)"""
+        if ReminderQueue._wakeup is None:
+            ReminderQueue._wakeup = asyncio.Event()
+        return ReminderQueue._wakeup
+
+    @staticmethod
+    def push(reminder: Reminder):
+        """Добавить напоминание в очередь (повторное добавление с тем же ключом заменяет его)"""
+        key = reminder.key
+        ReminderQueue._wheel.schedule(key, reminder.send_at.timestamp(), reminder)
+        ReminderQueue._by_order.setdefault(reminder.order_id, set()).add(key)
+
+        send_at = reminder.send_at
+        wave = ReminderQueue._waves.get(send_at)
+        if wave is None:
+            wave = ReminderQueue._waves[send_at] = set()
+            render_at = send_at - timedelta(minutes=REMINDER_PRERENDER_MINUTES)
+            ReminderQueue._render_wheel.schedule(send_at, render_at.timestamp(), send_at)
+        wave.add(key)
+
+        if ReminderQueue._wakeup is not None:
+            ReminderQueue._wakeup.set()
 
     @staticmethod
-    async def schedule_reminders(context, chat_id, order_id, delivery_date_str, delivery_time_str, address):
+    def cancel_order(order_id: str) -> int:
         """
-        Запланировать напоминания для заказа через Telegram Scheduled Messages
+        Отменить все напоминания заказа
 
-        :param context: Context приложения с bot
-        :param chat_id: ID чата пользователя
-        :param order_id: ID заказа
-        :param delivery_date_str: Дата доставки в формате YYYY-MM-DD
-        :param delivery_time_str: Время доставки в формате HH:MM
-        :param address: Адрес доставки
-        :return: Dict с информацией о запланированных напоминаниях или None при ошибке
+        :return: Количество отмененных напоминаний
         """
-        try:
-            delivery_datetime = datetime.strptime(
-                f"{delivery_date_str} {delivery_time_str}",
-                '%Y-%m-%d %H:%M'
-            )
+        return ReminderQueue.cancel_orders([order_id])
 
-            # Утреннее напоминание в 8:00 дня доставки
-            morning_reminder_time = datetime.strptime(
-                f"{delivery_date_str} 08:00",
-                '%Y-%m-%d %H:%M'
-            )
+    @staticmethod
+    def cancel_orders(order_ids) -> int:
+        """
+        Отменить напоминания нескольких заказов
 
-            # Напоминание за 30 минут до доставки
-            pre_delivery_reminder_time = delivery_datetime - timedelta(minutes=30)
+        :param order_ids: Коллекция ID заказов
+        :return: Количество отмененных напоминаний
+        """
+        cancelled = 0
+        for order_id in order_ids:
+            for key in ReminderQueue._by_order.pop(order_id, ()):
+                if ReminderQueue._wheel.cancel(key) is not None:
+                    cancelled += 1
+        return cancelled
 
-            # Текущее время
-            now = datetime.now()
+    @staticmethod
+    def _forget(reminder: Reminder):
+        """Убрать сработавшее напоминание из индекса заказов"""
+        keys = ReminderQueue._by_order.get(reminder.order_id)
+        if keys is not None:
+            keys.discard(reminder.key)
+            if not keys:
+                del ReminderQueue._by_order[reminder.order_id]
 
-            # Планируем утреннее напоминание, если время еще не прошло
-            morning_scheduled = False
-            morning_message_id = None
-            if morning_reminder_time > now:
-                morning_text = (
-                    f"🌅 Доброе утро!\n\n"
-                    f"Напоминаем, что сегодня в {delivery_time_str} "
-                    f"к вам приедет доставка воды.\n\n"
-                    f"📋 Заказ: {order_id}\n"
-                    f"📍 Адрес: {address}"
-                )
+    @staticmethod
+    def pop_due(now: datetime) -> List[Reminder]:
+        """Извлечь все напоминания, время отправки которых наступило"""
+        due = ReminderQueue._wheel.advance(now.timestamp())
+        for reminder in due:
+            ReminderQueue._forget(reminder)
+        return due
 
-                try:
-                    # Преобразуем в Unix timestamp
-                    schedule_timestamp = int(morning_reminder_time.timestamp())
-
-                    # Отправляем отложенное сообщение через Telegram API
-                    message = await context.bot.send_message(
-                        chat_id=chat_id,
-                        text=morning_text,
-                        schedule_date=schedule_timestamp
-                    )
-                    morning_message_id = message.message_id
-                    morning_scheduled = True
-
-                    logger.info(f"Утреннее напоминание запланировано на {morning_reminder_time} (message_id: {morning_message_id}) для заказа {order_id}")
-                except TelegramError as e:
-                    logger.error(f"Ошибка планирования утреннего напоминания: {e}")
-                except Exception as e:
-                    logger.error(f"Неожиданная ошибка при планировании утреннего напоминания: {e}")
-
-            # Планируем напоминание за 30 минут, если время еще не прошло
-            pre_delivery_scheduled = False
-            pre_delivery_message_id = None
-            if pre_delivery_reminder_time > now:
-                pre_delivery_text = (
-                    f"⏰ Напоминание!\n\n"
-                    f"Через 30 минут (в {delivery_time_str}) "
-                    f"к вам приедет доставка воды.\n\n"
-                    f"📋 Заказ: {order_id}\n"
-                    f"📍 Адрес: {address}\n\n"
-                    f"Пожалуйста, будьте готовы принять доставку! 👍"
-                )
+    @staticmethod
+    def pop_waves_to_render(now: datetime) -> List[List[Reminder]]:
+        """
+        Извлечь волны, которые пора подготовить к отправке
 
-                try:
-                    # Преобразуем в Unix timestamp
-                    schedule_timestamp = int(pre_delivery_reminder_time.timestamp())
-
-                    # Отправляем отложенное сообщение через Telegram API
-                    message = await context.bot.send_message(
-                        chat_id=chat_id,
-                        text=pre_delivery_text,
-                        schedule_date=schedule_timestamp
-                    )
-                    pre_delivery_message_id = message.message_id
-                    pre_delivery_scheduled = True
-
-                    logger.info(f"Напоминание за 30 минут запланировано на {pre_delivery_reminder_time} (message_id: {pre_delivery_message_id}) для заказа {order_id}")
-                except TelegramError as e:
-                    logger.error(f"Ошибка планирования напоминания за 30 минут: {e}")
-                except Exception as e:
-                    logger.error(f"Неожиданная ошибка при планировании напоминания за 30 минут: {e}")
-
-            return {
-                'morning': {
-                    'scheduled': morning_scheduled,
-                    'time': morning_reminder_time,
-                    'message_id': morning_message_id
-                },
-                'pre_delivery': {
-                    'scheduled': pre_delivery_scheduled,
-                    'time': pre_delivery_reminder_time,
-                    'message_id': pre_delivery_message_id
-                }
-            }
+        :return: Список волн, каждая - действующие напоминания с одним временем отправки
+        """
+        waves = []
+        for send_at in ReminderQueue._render_wheel.advance(now.timestamp()):
+            reminders = []
+            for key in ReminderQueue._waves.pop(send_at, ()):
+                reminder = ReminderQueue._wheel.get(key)
+                # Отмененные, перенесенные на другое время и уже подготовленные (повторы) не входят в волну
+                if reminder is not None and reminder.send_at == send_at and reminder.payload is None:
+                    reminders.append(reminder)
+            if reminders:
+                waves.append(reminders)
+        return waves
 
-        except Exception as e:
-            logger.error(f"Ошибка планирования напоминаний для заказа {order_id}: {e}")
-            return None
+    @staticmethod
+    def next_due() -> Optional[datetime]:
+        """Когда диспетчеру проверить очередь: ближайший тик с напоминаниями или подготовкой волны"""
+        deadlines = [
+            deadline
+            for deadline in (ReminderQueue._wheel.next_deadline(), ReminderQueue._render_wheel.next_deadline())
+            if deadline is not None
+        ]
+        return datetime.fromtimestamp(min(deadlines)) if deadlines else None
 
     @staticmethod
-    async def cancel_scheduled_messages(context, chat_id, message_ids):
+    def size() -> int:
+        """Количество действующих напоминаний"""
+        return len(ReminderQueue._wheel)
+
+
+class ReminderScheduler:
+    """Планировщик напоминаний о доставке"""
+
+    # Максимальная пауза диспетчера между проверками очереди (секунды)
+    MAX_SLEEP_SECONDS = 60
+
+    # Пакетов подряд, которые не удалось обработать из-за ошибки записи листа напоминаний
+    _storage_failures = 0
+
+    @staticmethod
+    def build_reminders(chat_id, order_id, delivery_date_str, delivery_time_str, address,
+                        now: Optional[datetime] = None, kinds: Optional[Tuple[str, ...]] = None) -> List[Reminder]:
         """
-        Отменить запланированные сообщения в Telegram
+        Построить напоминания заказа по настройке клиента, время которых еще не прошло
 
-        :param context: Context приложения с bot
-        :param chat_id: ID чата
-        :param message_ids: Список ID сообщений для отмены
-        :return: Количество отмененных сообщений
+        :param kinds: Типы напоминаний; по умолчанию берутся из настройки клиента
+        :return: Список напоминаний (пустой, если клиент отключил напоминания)
         """
-        if not message_ids:
-            return 0
+        delivery_datetime = datetime.strptime(f"{delivery_date_str} {delivery_time_str}", '%Y-%m-%d %H:%M')
+        now = now or datetime.now()
+        if kinds is None:
+            kinds = ReminderPolicy.get_kinds(chat_id)
+
+        reminders = []
+        for kind in kinds:
+            due_at = ReminderPolicy.due_time(kind, delivery_datetime)
+            # Напоминание к времени дня, которое позже самой доставки, не имеет смысла
+            if now < due_at < delivery_datetime:
+                reminders.append(
+                    Reminder(order_id, chat_id, kind, due_at, delivery_date_str, delivery_time_str, address)
+                )
+        return reminders
 
-        cancelled_count = 0
+    @staticmethod
+    def enqueue(reminders: List[Reminder]) -> Dict:
+        """
+        Поставить уже сохраненные напоминания в очередь отправки
 
-        try:
-            for message_id in message_ids:
-                if message_id:
-                    try:
-                        await context.bot.delete_message(
-                            chat_id=chat_id,
-                            message_id=message_id
-                        )
-                        cancelled_count += 1
-                        logger.info(f"Отменено запланированное сообщение: {message_id}")
-                    except TelegramError as e:
-                        logger.warning(f"Не удалось отменить сообщение {message_id}: {e}")
-                    except Exception as e:
-                        logger.error(f"Ошибка при отмене сообщения {message_id}: {e}")
-
-            return cancelled_count
+        :return: Dict с информацией о запланированных напоминаниях по типам
+        """
+        for reminder in reminders:
+            ReminderQueue.push(reminder)
+            logger.info(f"Напоминание {reminder.kind} запланировано на {reminder.due_at} для заказа {reminder.order_id}")
 
-        except Exception as e:
-            logger.error(f"Ошибка отмены запланированных сообщений: {e}")
-            return cancelled_count
+        return {reminder.kind: {'scheduled': True, 'time': reminder.due_at} for reminder in reminders}
 
     @staticmethod
     async def cancel_reminders_for_order(context, order_id):
         """
         Отменить все напоминания для заказа по ID заказа
 
+        Строки на листе напоминаний отменяются тем же сохранением, что и отмена или перенос заказа.
+
         :param context: Context приложения с bot
         :param order_id: ID заказа
         :return: Количество отмененных напоминаний
         """
-        from database import Database
+        cancelled_count = ReminderQueue.cancel_order(order_id)
+        logger.info(f"Отменено {cancelled_count} напоминаний для заказа {order_id}")
+        return cancelled_count
 
-        try:
-            # Получаем заказ из базы данных
-            order = Database.get_order_by_id(order_id)
-            if not order:
-                logger.warning(f"Заказ {order_id} не найден")
-                return 0
-
-            # Получаем ID сообщений
-            morning_msg_id = order.get('morning_reminder_id')
-            pre_delivery_msg_id = order.get('pre_delivery_reminder_id')
-
-            # Собираем список ID для отмены
-            message_ids = []
-            if morning_msg_id:
-                message_ids.append(morning_msg_id)
-            if pre_delivery_msg_id:
-                message_ids.append(pre_delivery_msg_id)
-
-            if not message_ids:
-                logger.info(f"Нет запланированных сообщений для заказа {order_id}")
-                return 0
-
-            # Отменяем сообщения
-            chat_id = order.get('user_id')
-            cancelled_count = await ReminderScheduler.cancel_scheduled_messages(
-                context, chat_id, message_ids
-            )
+    @staticmethod
+    async def cancel_reminders_for_orders(context, order_ids):
+        """
+        Отменить напоминания сразу для многих заказов (например, при переносе всего маршрута)
 
-            logger.info(f"Отменено {cancelled_count} напоминаний для заказа {order_id}")
-            return cancelled_count
+        :param context: Context приложения с bot
+        :param order_ids: Коллекция ID заказов
+        :return: Количество отмененных напоминаний
+        """
+        order_ids = list(order_ids)
+        cancelled_count = ReminderQueue.cancel_orders(order_ids)
+        logger.info(f"Отменено {cancelled_count} напоминаний для {len(order_ids)} заказов")
+        return cancelled_count
 
-        except Exception as e:
-            logger.error(f"Ошибка при отмене напоминаний для заказа {order_id}: {e}")
-            return 0
+    @staticmethod
+    def _is_actual(record, order) -> bool:
+        """Относится ли сохраненное напоминание к текущему времени доставки заказа"""
+        return (
+            order is not None
+            and order['delivery_date'] == record['delivery_date']
+            and order['delivery_time'] == record['delivery_time']
+        )
+
+    @staticmethod
+    def rehydrate() -> int:
+        """
+        Загрузить неотправленные напоминания с листа напоминаний в очередь
+
+        Напоминания отмененных и перенесенных заказов помечаются отмененными.
+        Напоминания, отправка которых была прервана перезапуском, отправляются повторно:
+        Telegram не поддерживает ключи идемпотентности, и клиент может получить сообщение дважды,
+        но это лучше, чем потерять напоминание. Такие повторы видны в метриках.
+
+        :return: Количество загруженных напоминаний
+        """
+        # Повторяющиеся строки одного напоминания (записаны до отмены при переносе) - берем последнюю
+        records = list({record['key']: record for record in Database.get_pending_reminders()}.values())
+        orders = Database.get_orders_by_ids({record['order_id'] for record in records})
+
+        stale = {}
+        interrupted = {}
+        loaded = 0
+        for record in records:
+            if not ReminderScheduler._is_actual(record, orders.get(record['order_id'])):
+                stale[record['key']] = Database.REMINDER_CANCELLED
+                continue
+
+            if record['status'] == Database.REMINDER_SENDING:
+                logger.warning(f"Отправка напоминания {record['key']} была прервана, напоминание будет отправлено снова")
+                interrupted[record['key']] = Database.REMINDER_PENDING
+                ReminderMetrics.record_interrupted()
+
+            ReminderQueue.push(Reminder(
+                order_id=record['order_id'],
+                chat_id=record['chat_id'],
+                kind=record['kind'],
+                due_at=record['due_at'],
+                delivery_date=record['delivery_date'],
+                delivery_time=record['delivery_time'],
+                address=record['address'],
+                attempts=record['attempts'],
+                next_attempt_at=record['next_attempt_at']
+            ))
+            loaded += 1
+
+        Database.update_reminder_statuses({**stale, **interrupted})
+        logger.info(f"Загружено {loaded} напоминаний (прерванных отправкой: {len(interrupted)}), "
+                    f"отброшено устаревших: {len(stale)}")
+        return loaded
+
+    @staticmethod
+    def prerender_wave(reminders: List[Reminder]) -> int:
+        """
+        Подготовить волну к отправке: одним чтением листа даты сверить заказы и собрать тексты
+
+        Напоминания заказов, удаленных или перенесенных вручную в файле, отменяются.
+
+        :return: Количество подготовленных напоминаний
+        """
+        by_date: Dict[str, List[Reminder]] = {}
+        for reminder in reminders:
+            by_date.setdefault(reminder.delivery_date, []).append(reminder)
+
+        stale = {}
+        rendered = 0
+        for date_str, date_reminders in by_date.items():
+            orders = {order['order_id']: order for order in Database.get_orders_for_date(date_str)}
+
+            for reminder in date_reminders:
+                order = orders.get(reminder.order_id)
+                if order is None or order['delivery_time'] != reminder.delivery_time:
+                    ReminderQueue.cancel_order(reminder.order_id)
+                    stale[reminder.key] = {'status': Database.REMINDER_CANCELLED}
+                    continue
+
+                # Адрес мог быть исправлен диспетчером после оформления заказа
+                reminder.address = order['address']
+                reminder.payload = reminder.render()
+                rendered += 1
+
+        Database.update_reminders(stale)
+        logger.info(f"Подготовлено {rendered} напоминаний волны, отменено устаревших: {len(stale)}")
+        return rendered
+
+    @staticmethod
+    def _retry_at(reminder: Reminder, now: datetime) -> Optional[datetime]:
+        """Время следующей попытки или None, если попытки исчерпаны или повтор уже бесполезен"""
+        if reminder.attempts >= REMINDER_MAX_ATTEMPTS:
+            return None
+
+        retry_at = now + timedelta(seconds=REMINDER_RETRY_BASE_SECONDS * 2 ** (reminder.attempts - 1))
+        return retry_at if retry_at < reminder.delivery_at else None
+
+    @staticmethod
+    async def _send_due(dispatcher: MessageDispatcher, due: List[Reminder], now: datetime) -> Dict[str, Dict]:
+        """
+        Отправить наступившие напоминания пакетом через диспетчер сообщений
+
+        Доставка "хотя бы один раз": перед отправкой напоминания помечаются как отправляемые,
+        а каждое принятое Telegram сразу помечается отправленным. После перезапуска в середине
+        пакета повторно уйдут только напоминания, отметку о которых не успели записать.
+
+        :return: Изменения строк листа напоминаний по ключу
+        """
+        updates = {}
+        to_send = []
+        for reminder in due:
+            reminder.handled = False
+            # После времени доставки напоминание уже бесполезно
+            if reminder.delivery_at <= now:
+                logger.warning(f"Напоминание {reminder.key} пропущено: время доставки прошло")
+                updates[reminder.key] = {'status': Database.REMINDER_MISSED}
+                reminder.handled = True
+                ReminderMetrics.record_missed()
+            else:
+                to_send.append(reminder)
+
+        Database.update_reminders({
+            reminder.key: {'status': Database.REMINDER_SENDING, 'attempts': reminder.attempts + 1}
+            for reminder in to_send
+        })
+        for reminder in to_send:
+            reminder.attempts += 1
+
+        def mark_sent(index: int):
+            reminder = to_send[index]
+            reminder.handled = True
+            try:
+                Database.update_reminders({reminder.key: {'status': Database.REMINDER_SENT, 'next_attempt_at': None}})
+            except Exception as e:
+                # Отметка повторится итоговым сохранением пакета
+                logger.error(f"Не удалось отметить напоминание {reminder.key} отправленным: {e}")
+
+        messages = [
+            OutgoingMessage(reminder.chat_id, reminder.payload or reminder.render(), reminder.due_at)
+            for reminder in to_send
+        ]
+        results = await dispatcher.send_many(messages, on_sent=mark_sent)
+
+        for reminder, message, result in zip(to_send, messages, results):
+            reminder.handled = True
+            if result == MessageDispatcher.SENT:
+                updates[reminder.key] = {'status': Database.REMINDER_SENT, 'next_attempt_at': None}
+                ReminderMetrics.record_sent(reminder.kind, reminder.due_at, message.sent_at)
+                continue
+
+            retry_at = ReminderScheduler._retry_at(reminder, datetime.now()) \
+                if result == MessageDispatcher.RETRY else None
+            ReminderMetrics.record_failure(message.error, final=retry_at is None)
+            if retry_at is None:
+                logger.error(f"Напоминание {reminder.key} не отправлено после {reminder.attempts} попыток")
+                updates[reminder.key] = {'status': Database.REMINDER_FAILED, 'next_attempt_at': None}
+                continue
+
+            reminder.next_attempt_at = retry_at
+            ReminderQueue.push(reminder)
+            updates[reminder.key] = {'status': Database.REMINDER_PENDING, 'next_attempt_at': retry_at}
+            logger.info(f"Повтор напоминания {reminder.key} в {retry_at:%H:%M:%S}")
+
+        return updates
+
+    @staticmethod
+    def _requeue_unhandled(due: List[Reminder], now: datetime) -> int:
+        """
+        Вернуть в очередь напоминания пакета, до отправки которых дело не дошло
+        (например, файл заказов открыт в Excel и не сохраняется)
+
+        Пауза удваивается с каждым неудачным пакетом подряд.
+
+        :return: Количество возвращенных напоминаний
+        """
+        ReminderScheduler._storage_failures += 1
+        delay = REMINDER_RETRY_BASE_SECONDS * 2 ** min(ReminderScheduler._storage_failures - 1, 6)
+        unhandled = [reminder for reminder in due if not reminder.handled]
+        for reminder in unhandled:
+            reminder.next_attempt_at = now + timedelta(seconds=delay)
+            ReminderQueue.push(reminder)
+
+        if unhandled:
+            logger.warning(f"{len(unhandled)} напоминаний возвращены в очередь, повтор через {delay} с")
+        return len(unhandled)
+
+    @staticmethod
+    async def run_dispatcher(dispatcher: MessageDispatcher):
+        """
+        Фоновая задача отправки напоминаний
+
+        Спит до ближайшего напоминания или до добавления нового, заранее готовит волны
+        и отправляет все наступившие напоминания. Раз в сутки удаляет с листа напоминания,
+        завершенные больше REMINDER_KEEP_DAYS дней назад.
+
+        :param dispatcher: Диспетчер сообщений с лимитами Telegram
+        """
+        wakeup = ReminderQueue._get_wakeup()
+        logger.info(f"Диспетчер напоминаний запущен, в очереди: {ReminderQueue.size()}")
+        pruned_on = None
+
+        while True:
+            wakeup.clear()
+            now = datetime.now()
+            ReminderMetrics.sample_depth(ReminderQueue.size(), now)
+
+            # Раз в сутки убираем с листа давно завершенные напоминания
+            if pruned_on != now.date():
+                pruned_on = now.date()
+                try:
+                    before = (now - timedelta(days=REMINDER_KEEP_DAYS)).strftime('%Y-%m-%d')
+                    logger.info(f"Удалено завершенных напоминаний: {Database.prune_reminders(before)}")
+                except Exception as e:
+                    logger.error(f"Ошибка очистки листа напоминаний: {e}")
+
+            for wave in ReminderQueue.pop_waves_to_render(now):
+                try:
+                    ReminderScheduler.prerender_wave(wave)
+                except Exception as e:
+                    logger.error(f"Ошибка подготовки волны напоминаний: {e}")
+
+            due = ReminderQueue.pop_due(now)
+            if due:
+                try:
+                    updates = await ReminderScheduler._send_due(dispatcher, due, now)
+                    Database.update_reminders(updates)
+                    ReminderScheduler._storage_failures = 0
+                except Exception as e:
+                    logger.error(f"Ошибка обработки пакета напоминаний: {e}")
+                    ReminderScheduler._requeue_unhandled(due, now)
+                continue
+
+            next_due = ReminderQueue.next_due()
+            timeout = ReminderScheduler.MAX_SLEEP_SECONDS
+            if next_due is not None:
+                timeout = min(timeout, max((next_due - now).total_seconds(), 0))
+
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
 
     @staticmethod
     def can_reschedule(delivery_date_str, delivery_time_str, min_hours=4):
@@ -0,0 +1,283 @@
+"""
+Модуль планирования маршрутов курьеров
+Строит упорядоченный список остановок на день: стартовый маршрут методом ближайшего
+соседа и его улучшение алгоритмом 2-opt на матрице расстояний NumPy
+"""
+
+import argparse
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import DEPOT_LATITUDE, DEPOT_LONGITUDE, COURIERS_COUNT
+from database import Database
+from address_validator import KyrgyzstanAddressValidator, get_address_validator
+from district_resolver import DistrictResolver
+from wave_planner import WavePlanner
+
+logger = logging.getLogger(__name__)
+
+# Радиус Земли в километрах
+EARTH_RADIUS_KM = 6371.0
+
+
+class RouteOptimizer:
+    """Планировщик маршрутов курьеров на день"""
+
+    @staticmethod
+    def build_distance_matrix(coords: np.ndarray) -> np.ndarray:
+        """
+        Матрица расстояний между точками по формуле гаверсинусов
+
+        :param coords: Массив формы (N, 2) с широтой и долготой в градусах
+        :return: Матрица (N, N) расстояний в километрах
+        """
+        lat = np.radians(coords[:, 0])
+        lng = np.radians(coords[:, 1])
+
+        dlat = lat[:, None] - lat[None, :]
+        dlng = lng[:, None] - lng[None, :]
+
+        a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    @staticmethod
+    def nearest_neighbour(dist: np.ndarray, start: int = 0) -> np.ndarray:
+        """
+        Стартовый маршрут методом ближайшего соседа
+
+        :param dist: Матрица расстояний
+        :param start: Индекс начальной точки (склад)
+        :return: Порядок обхода точек, начиная со start
+        """
+        n = len(dist)
+        visited = np.zeros(n, dtype=bool)
+        route = np.empty(n, dtype=int)
+
+        current = start
+        visited[current] = True
+        route[0] = current
+
+        for i in range(1, n):
+            candidates = np.where(visited, np.inf, dist[current])
+            current = int(np.argmin(candidates))
+            visited[current] = True
+            route[i] = current
+
+        return route
+
+    @staticmethod
+    def two_opt(route: np.ndarray, dist: np.ndarray, max_passes: int = 100) -> np.ndarray:
+        """
+        Улучшение замкнутого маршрута алгоритмом 2-opt
+
+        Для каждого ребра все варианты разворота считаются одной векторной операцией,
+        поэтому проход по маршруту из 500 точек занимает единицы миллисекунд.
+
+        :param route: Порядок обхода, первая точка (склад) остается на месте
+        :param dist: Матрица расстояний
+        :param max_passes: Максимальное количество проходов
+        :return: Улучшенный порядок обхода
+        """
+        # Замыкаем маршрут: курьер возвращается на склад за новыми бутылками
+        path = np.append(route, route[0])
+        n = len(path)
+
+        for _ in range(max_passes):
+            improved = False
+
+            for i in range(n - 3):
+                a, b = path[i], path[i + 1]
+                c = path[i + 2:n - 1]
+                d = path[i + 3:n]
+
+                # Выигрыш от замены ребер (a, b) и (c, d) на (a, c) и (b, d)
+                delta = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+                k = int(np.argmin(delta))
+
+                if delta[k] < -1e-9:
+                    j = i + 2 + k
+                    path[i + 1:j + 1] = path[i + 1:j + 1][::-1].copy()
+                    improved = True
+
+            if not improved:
+                break
+
+        return path[:-1]
+
+    @staticmethod
+    def route_length(route: np.ndarray, dist: np.ndarray) -> float:
+        """
+        Длина замкнутого маршрута в километрах
+
+        :param route: Порядок обхода
+        :param dist: Матрица расстояний
+        :return: Длина маршрута
+        """
+        if len(route) < 2:
+            return 0.0
+        return float(dist[route, np.roll(route, -1)].sum())
+
+    @staticmethod
+    def optimize(coords: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Построить маршрут от склада через все точки
+
+        :param coords: Массив (N, 2), нулевая строка - склад
+        :return: Tuple (порядок обхода без склада, длина маршрута в км)
+        """
+        dist = RouteOptimizer.build_distance_matrix(coords)
+        route = RouteOptimizer.nearest_neighbour(dist, start=0)
+        route = RouteOptimizer.two_opt(route, dist)
+        return route[1:], RouteOptimizer.route_length(route, dist)
+
+    @staticmethod
+    def _locate_orders(date_str: str, orders: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Определить координаты заказов, геокодируя адреса без сохраненных координат
+
+        :param date_str: Дата доставки
+        :param orders: Заказы на дату
+        :return: Tuple (заказы с координатами, заказы без координат)
+        """
+        validator = get_address_validator()
+        located, unlocated = [], []
+        new_locations = {}
+
+        for order in orders:
+            if not order.get('latitude') or not order.get('longitude'):
+                address_info = validator.validate_address(order['address'] or '')
+                if address_info.is_valid and address_info.latitude and address_info.longitude:
+                    order['latitude'] = address_info.latitude
+                    order['longitude'] = address_info.longitude
+                    order['district'] = address_info.district
+                    new_locations[order['order_id']] = (
+                        address_info.latitude, address_info.longitude, address_info.district
+                    )
+
+            if order.get('latitude') and order.get('longitude'):
+                located.append(order)
+            else:
+                unlocated.append(order)
+
+        # Район по координатам для заказов, где он не определен, - одним пакетом на весь день
+        undetermined = [
+            order for order in located
+            if not KyrgyzstanAddressValidator.normalize_district(order.get('district'))
+        ]
+        districts = DistrictResolver.resolve_many(
+            [order['latitude'] for order in undetermined], [order['longitude'] for order in undetermined]
+        ) if undetermined else None
+        for order, district in zip(undetermined, districts or []):
+            if district:
+                order['district'] = district
+                new_locations[order['order_id']] = (order['latitude'], order['longitude'], district)
+
+        # Сохраняем найденные координаты, чтобы не геокодировать повторно
+        if new_locations:
+            Database.update_order_locations(date_str, new_locations)
+
+        return located, unlocated
+
+    @staticmethod
+    def _split_evenly(route: np.ndarray, parts: int) -> List[np.ndarray]:
+        """Разбить общий маршрут на непрерывные участки примерно равной длины"""
+        parts = max(1, min(parts, len(route)))
+        return [chunk for chunk in np.array_split(route, parts) if len(chunk)]
+
+    @staticmethod
+    def plan_routes(date_str: str, couriers: Optional[int] = None) -> Dict:
+        """
+        Составить маршрутные листы курьеров на дату
+
+        :param date_str: Дата доставки в формате YYYY-MM-DD
+        :param couriers: Количество курьеров (по умолчанию COURIERS_COUNT)
+        :return: Dict с маршрутами курьеров и заказами без координат
+        """
+        couriers = couriers or COURIERS_COUNT
+        orders = Database.get_orders_for_date(date_str)
+        located, unlocated = RouteOptimizer._locate_orders(date_str, orders)
+
+        if unlocated:
+            logger.warning(f"Не удалось определить координаты для {len(unlocated)} заказов на {date_str}")
+
+        routes = []
+        if located:
+            depot = np.array([[DEPOT_LATITUDE, DEPOT_LONGITUDE]], dtype=float)
+            points = np.array([[o['latitude'], o['longitude']] for o in located], dtype=float)
+
+            if all(order.get('courier') for order in located):
+                # Курьеры уже назначены кластеризацией - строим маршрут каждому
+                courier_numbers = sorted({int(order['courier']) for order in located})
+                chunks = [
+                    np.array([i for i, order in enumerate(located) if int(order['courier']) == number])
+                    for number in courier_numbers
+                ]
+            else:
+                # Общий маршрут делим между курьерами на соседние участки
+                route, _ = RouteOptimizer.optimize(np.vstack([depot, points]))
+                chunks = RouteOptimizer._split_evenly(route - 1, couriers)
+                courier_numbers = list(range(1, len(chunks) + 1))
+
+            for courier_number, chunk in zip(courier_numbers, chunks):
+                chunk_orders = [located[i] for i in chunk]
+                chunk_coords = np.vstack([depot, points[chunk]])
+                chunk_route, distance_km = RouteOptimizer.optimize(chunk_coords)
+
+                routes.append({
+                    'courier': courier_number,
+                    'stops': [chunk_orders[i - 1] for i in chunk_route],
+                    'distance_km': distance_km,
+                    'waves': WavePlanner.group_by_zone(chunk_orders)
+                })
+
+        return {
+            'date': date_str,
+            'routes': routes,
+            'unlocated': unlocated
+        }
+
+    @staticmethod
+    def format_manifest(plan: Dict) -> str:
+        """
+        Форматирование маршрутных листов для диспетчера
+
+        :param plan: Результат plan_routes
+        :return: Текст маршрутных листов
+        """
+        lines = [f"🚚 Маршруты на {plan['date']}"]
+
+        for route in plan['routes']:
+            lines.append("")
+            lines.append(f"Курьер {route['courier']} ({route['distance_km']:.1f} км):")
+            lines.append(WavePlanner.format_waves(route['waves']))
+            for number, order in enumerate(route['stops'], start=1):
+                lines.append(
+                    f"{number}. {order['delivery_time']} | {order['order_id']} | "
+                    f"{order['address']} | {order['bottles']} шт."
+                )
+
+        if plan['unlocated']:
+            lines.append("")
+            lines.append("⚠️ Без координат (распределить вручную):")
+            for order in plan['unlocated']:
+                lines.append(f"• {order['delivery_time']} | {order['order_id']} | {order['address']}")
+
+        return "\n".join(lines)
+
+
+def main():
+    """Печать маршрутных листов на дату из командной строки"""
+    parser = argparse.ArgumentParser(description="Планирование маршрутов курьеров на день")
+    parser.add_argument('date', help="Дата доставки в формате YYYY-MM-DD")
+    parser.add_argument('--couriers', type=int, default=COURIERS_COUNT, help="Количество курьеров")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    plan = RouteOptimizer.plan_routes(args.date, args.couriers)
+    print(RouteOptimizer.format_manifest(plan))
+
+
+if __name__ == '__main__':
+    main()
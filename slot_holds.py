@@ -0,0 +1,121 @@
+"""
+Модуль временного удержания слотов
+Пока клиент выбирает время, слот закрепляется за ним на несколько секунд,
+чтобы другой клиент не забронировал его между показом и нажатием кнопки
+"""
+
+import heapq
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class SlotHolds:
+    """Удержания слотов с ограниченным временем жизни"""
+
+    # Действующие удержания: (дата, время) -> (владелец, момент истечения)
+    _holds: Dict[Tuple[str, str], Tuple[int, float]] = {}
+
+    # Куча моментов истечения для удаления устаревших удержаний без перебора
+    _expiries: List[Tuple[float, str, str, int]] = []
+
+    # Слоты, удерживаемые каждым владельцем
+    _by_owner: Dict[int, set] = {}
+
+    @staticmethod
+    def _purge(now: float):
+        """Удалить истекшие удержания (записи из кучи снимаются по мере истечения)"""
+        expiries = SlotHolds._expiries
+        while expiries and expiries[0][0] <= now:
+            expires_at, date_str, time_str, owner = heapq.heappop(expiries)
+            key = (date_str, time_str)
+
+            # Удержание могло быть продлено или снято раньше - тогда запись в куче устарела
+            if SlotHolds._holds.get(key) == (owner, expires_at):
+                del SlotHolds._holds[key]
+                SlotHolds._discard_owner_key(owner, key)
+
+    @staticmethod
+    def _discard_owner_key(owner: int, key: Tuple[str, str]):
+        """Убрать слот из списка удержаний владельца"""
+        keys = SlotHolds._by_owner.get(owner)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del SlotHolds._by_owner[owner]
+
+    @staticmethod
+    def hold(date_str: str, time_str: str, owner: int, ttl_seconds: float,
+             now: Optional[float] = None) -> bool:
+        """
+        Закрепить слот за владельцем на ttl_seconds
+
+        :param date_str: Дата в формате YYYY-MM-DD
+        :param time_str: Время в формате HH:MM
+        :param owner: ID клиента
+        :param ttl_seconds: Время жизни удержания в секундах
+        :param now: Текущее время по монотонным часам (для тестов)
+        :return: True если слот закреплен, False если его удерживает другой клиент
+        """
+        now = time.monotonic() if now is None else now
+        SlotHolds._purge(now)
+
+        key = (date_str, time_str)
+        current = SlotHolds._holds.get(key)
+        if current and current[0] != owner:
+            return False
+
+        # Продление не должно сокращать уже выданное удержание
+        expires_at = now + ttl_seconds
+        if current:
+            expires_at = max(expires_at, current[1])
+
+        SlotHolds._holds[key] = (owner, expires_at)
+        SlotHolds._by_owner.setdefault(owner, set()).add(key)
+        heapq.heappush(SlotHolds._expiries, (expires_at, date_str, time_str, owner))
+        return True
+
+    @staticmethod
+    def release(date_str: str, time_str: str, owner: Optional[int] = None) -> bool:
+        """
+        Снять удержание слота
+
+        :param owner: Если указан, удержание снимается только у этого владельца
+        :return: True если удержание было снято
+        """
+        key = (date_str, time_str)
+        current = SlotHolds._holds.get(key)
+        if not current or (owner is not None and current[0] != owner):
+            return False
+
+        del SlotHolds._holds[key]
+        SlotHolds._discard_owner_key(current[0], key)
+        return True
+
+    @staticmethod
+    def release_owner(owner: int, keep: Optional[Tuple[str, str]] = None) -> int:
+        """
+        Снять все удержания владельца
+
+        :param keep: Слот, удержание которого нужно сохранить
+        :return: Количество снятых удержаний
+        """
+        released = 0
+        for key in list(SlotHolds._by_owner.get(owner, ())):
+            if key != keep and SlotHolds.release(key[0], key[1], owner):
+                released += 1
+        return released
+
+    @staticmethod
+    def holder(date_str: str, time_str: str, now: Optional[float] = None) -> Optional[int]:
+        """Владелец действующего удержания слота или None"""
+        now = time.monotonic() if now is None else now
+        SlotHolds._purge(now)
+
+        current = SlotHolds._holds.get((date_str, time_str))
+        return current[0] if current else None
+
+    @staticmethod
+    def is_held_by_other(date_str: str, time_str: str, owner: Optional[int]) -> bool:
+        """Удерживается ли слот другим клиентом"""
+        current_holder = SlotHolds.holder(date_str, time_str)
+        return current_holder is not None and current_holder != owner
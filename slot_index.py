@@ -0,0 +1,227 @@
+"""
+Модуль индекса занятых временных слотов
+Держит в памяти отсортированное время заказов по датам, чтобы проверка слота
+и поиск свободного времени не перечитывали файл заказов на каждый слот
+"""
+
+import os
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from config import DELIVERY_INTERVAL, BOOKING_HORIZON_DAYS, ORDERS_FILE
+from database import Database
+from slot_holds import SlotHolds
+from work_calendar import WorkCalendar
+
+
+class SlotIndex:
+    """Индекс занятых слотов по датам"""
+
+    # Отсортированное время заказов (в минутах от начала дня) по датам
+    _occupied: Dict[str, List[int]] = {}
+
+    # Заказы дат, по которым построен индекс (нужны для ранжирования слотов без повторного чтения)
+    _orders: Dict[str, List[Dict]] = {}
+
+    # Версия файла заказов, по которой построен индекс
+    _file_version: Optional[int] = None
+
+    @staticmethod
+    def _to_minutes(time_str: str) -> int:
+        """Перевести время HH:MM в минуты от начала дня"""
+        hours, minutes = time_str.split(':')
+        return int(hours) * 60 + int(minutes)
+
+    @staticmethod
+    def _check_file_version():
+        """Сбросить индекс, если файл заказов изменился (в том числе вручную диспетчером)"""
+        version = os.stat(ORDERS_FILE).st_mtime_ns if os.path.exists(ORDERS_FILE) else None
+        if version != SlotIndex._file_version:
+            SlotIndex._occupied.clear()
+            SlotIndex._orders.clear()
+            SlotIndex._file_version = version
+
+    @staticmethod
+    def invalidate(date_str: Optional[str] = None):
+        """
+        Сбросить индекс для даты или целиком
+
+        :param date_str: Дата в формате YYYY-MM-DD или None для всех дат
+        """
+        if date_str is None:
+            SlotIndex._occupied.clear()
+            SlotIndex._orders.clear()
+        else:
+            SlotIndex._occupied.pop(date_str, None)
+            SlotIndex._orders.pop(date_str, None)
+
+    @staticmethod
+    def _get_occupied(date_str: str) -> List[int]:
+        """Отсортированное время заказов на дату (загружается один раз)"""
+        SlotIndex._check_file_version()
+
+        if date_str not in SlotIndex._occupied:
+            orders = Database.get_orders_for_date(date_str)
+            SlotIndex._orders[date_str] = orders
+            SlotIndex._occupied[date_str] = sorted(
+                SlotIndex._to_minutes(order['delivery_time'])
+                for order in orders
+                if order['delivery_time']
+            )
+
+        return SlotIndex._occupied[date_str]
+
+    @staticmethod
+    def day_orders(date_str: str) -> List[Dict]:
+        """Заказы на дату, прочитанные вместе с индексом (файл перечитывается, только если изменился)"""
+        SlotIndex._get_occupied(date_str)
+        return SlotIndex._orders.get(date_str, [])
+
+    @staticmethod
+    def _is_free(occupied: List[int], minutes: int) -> bool:
+        """Свободен ли слот: ближайший заказ не ближе интервала доставки"""
+        position = bisect_left(occupied, minutes - DELIVERY_INTERVAL + 1)
+        return position == len(occupied) or occupied[position] >= minutes + DELIVERY_INTERVAL
+
+    @staticmethod
+    def is_available(date_str: str, time_str: str, user_id: Optional[int] = None) -> bool:
+        """
+        Проверить, доступен ли временной слот
+
+        :param date_str: Дата в формате YYYY-MM-DD
+        :param time_str: Время в формате HH:MM
+        :param user_id: Клиент, для которого проверяется слот
+        :return: True если слот свободен и не удерживается другим клиентом
+        """
+        if SlotHolds.is_held_by_other(date_str, time_str, user_id):
+            return False
+        return SlotIndex._is_free(SlotIndex._get_occupied(date_str), SlotIndex._to_minutes(time_str))
+
+    @staticmethod
+    def _earliest_minutes(date_str: str, min_hours_ahead: float) -> Optional[int]:
+        """
+        Самый ранний допустимый слот на дату с учетом минимального времени до доставки
+
+        :return: Минуты от начала дня или None, если дата целиком недоступна
+        """
+        earliest = datetime.now() + timedelta(hours=min_hours_ahead)
+
+        # Даты в формате YYYY-MM-DD сравниваются как строки
+        earliest_date = earliest.strftime('%Y-%m-%d')
+        if earliest_date > date_str:
+            return None
+        if earliest_date < date_str:
+            return 0
+        return earliest.hour * 60 + earliest.minute + (1 if earliest.second or earliest.microsecond else 0)
+
+    @staticmethod
+    def free_slots(date_str: str, min_hours_ahead: float = 0, user_id: Optional[int] = None) -> List[str]:
+        """
+        Получить свободные слоты на дату
+
+        :param date_str: Дата в формате YYYY-MM-DD
+        :param min_hours_ahead: Минимум часов от текущего момента до слота
+        :param user_id: Клиент, для которого подбираются слоты
+        :return: Список свободных слотов HH:MM в хронологическом порядке
+        """
+        day_slots = WorkCalendar.get_day_slots(date_str)
+        earliest = SlotIndex._earliest_minutes(date_str, min_hours_ahead)
+        if not day_slots or earliest is None:
+            return []
+
+        occupied = SlotIndex._get_occupied(date_str)
+        slots = [
+            time_slot
+            for minutes, time_slot in day_slots
+            if minutes >= earliest and SlotIndex._is_free(occupied, minutes)
+        ]
+        return [slot for slot in slots if not SlotHolds.is_held_by_other(date_str, slot, user_id)]
+
+    @staticmethod
+    def nearest_free_slots(date_str: str, time_str: str, count: int,
+                           min_hours_ahead: float = 0, user_id: Optional[int] = None) -> List[Tuple[str, str]]:
+        """
+        Найти ближайшие свободные слоты к выбранному: сначала в тот же день, затем в соседние дни
+
+        :param date_str: Выбранная дата в формате YYYY-MM-DD
+        :param time_str: Выбранное время в формате HH:MM
+        :param count: Сколько слотов вернуть
+        :param min_hours_ahead: Минимум часов от текущего момента до слота
+        :param user_id: Клиент, для которого подбираются слоты
+        :return: Список пар (дата, время)
+        """
+        target = SlotIndex._to_minutes(time_str)
+        base_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        today = datetime.now().date()
+        last_date = today + timedelta(days=BOOKING_HORIZON_DAYS - 1)
+
+        # Порядок дней: выбранный, затем +1, -1, +2, -2 ... в пределах горизонта бронирования
+        days = [base_date]
+        for offset in range(1, BOOKING_HORIZON_DAYS):
+            for day in (base_date + timedelta(days=offset), base_date - timedelta(days=offset)):
+                if today <= day <= last_date:
+                    days.append(day)
+
+        result = []
+        for day in days:
+            day_str = day.strftime('%Y-%m-%d')
+            slots = SlotIndex.free_slots(day_str, min_hours_ahead, user_id)
+            slots.sort(key=lambda slot: (abs(SlotIndex._to_minutes(slot) - target), slot))
+
+            for slot in slots:
+                result.append((day_str, slot))
+                if len(result) >= count:
+                    return result
+
+        return result
+
+    @staticmethod
+    def allocate(requests: List[Tuple[Hashable, str, str]], min_hours_ahead: float = 0) -> Dict[Hashable, Tuple[str, str]]:
+        """
+        Подобрать свободные слоты сразу для нескольких заказов
+
+        Каждому заказу достается ближайший по времени свободный слот в его день,
+        а если день занят - в следующие дни горизонта бронирования. Выбранные слоты
+        сразу считаются занятыми, поэтому два заказа не попадут в один слот.
+        Текущие слоты заказов остаются занятыми и освобождаются только после переноса.
+
+        :param requests: Список (ключ, дата, время) в порядке приоритета
+        :param min_hours_ahead: Минимум часов от текущего момента до слота
+        :return: Словарь {ключ: (дата, время)}; заказов без свободного слота в нем нет
+        """
+        today = datetime.now().date()
+        last_date = today + timedelta(days=BOOKING_HORIZON_DAYS - 1)
+
+        # Копии занятого времени по датам, в которые добавляются выбранные слоты
+        occupied: Dict[str, List[int]] = {}
+        result = {}
+
+        for key, date_str, time_str in requests:
+            target = SlotIndex._to_minutes(time_str)
+            day = max(datetime.strptime(date_str, '%Y-%m-%d').date(), today)
+
+            while day <= last_date:
+                day_str = day.strftime('%Y-%m-%d')
+                day += timedelta(days=1)
+
+                earliest = SlotIndex._earliest_minutes(day_str, min_hours_ahead)
+                if earliest is None:
+                    continue
+                if day_str not in occupied:
+                    occupied[day_str] = list(SlotIndex._get_occupied(day_str))
+                day_occupied = occupied[day_str]
+
+                candidates = [
+                    (abs(minutes - target), minutes, time_slot)
+                    for minutes, time_slot in WorkCalendar.get_day_slots(day_str)
+                    if minutes >= earliest and SlotIndex._is_free(day_occupied, minutes)
+                    and not SlotHolds.is_held_by_other(day_str, time_slot, None)
+                ]
+                if candidates:
+                    _, minutes, time_slot = min(candidates)
+                    insort(day_occupied, minutes)
+                    result[key] = (day_str, time_slot)
+                    break
+
+        return result
@@ -0,0 +1,283 @@
+"""
+Модуль регулярных заказов
+Клиент задает правило (день недели, время, количество бутылок, каждые 1 или 2 недели),
+а ночная задача заранее создает по нему заказы, занимает слоты и планирует напоминания
+одним сохранением файла для всех подписок
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, date
+from typing import Dict, List, Optional, Tuple
+
+from config import (WORK_START_HOUR, WORK_END_HOUR, DELIVERY_INTERVAL, BOOKING_HORIZON_DAYS,
+                    SUBSCRIPTION_LOOKAHEAD_DAYS, SUBSCRIPTION_RUN_HOUR)
+from courier_assignment import CourierAssignment
+from database import Database
+from message_dispatcher import MessageDispatcher, OutgoingMessage
+from reminder_service import ReminderScheduler
+from slot_index import SlotIndex
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriptions:
+    """Регулярные заказы клиентов"""
+
+    # Дни недели в записи клиента
+    WEEKDAYS = {'пн': 0, 'вт': 1, 'ср': 2, 'чт': 3, 'пт': 4, 'сб': 5, 'вс': 6}
+    WEEKDAY_NAMES = ('понедельник', 'вторник', 'среда', 'четверг', 'пятница', 'суббота', 'воскресенье')
+
+    # Допустимая периодичность (недель)
+    PERIODS = (1, 2)
+
+    @staticmethod
+    def parse(args: List[str]) -> Tuple[int, str, int, int]:
+        """
+        Разобрать правило подписки
+
+        Формат: день недели, время, количество бутылок (по умолчанию 1) и периодичность
+        в неделях (по умолчанию 1), например "пт 10:00 2 2".
+
+        :return: (день недели 0-6, время HH:MM, количество бутылок, недель)
+        :raises ValueError: Если правило записано неверно
+        """
+        if len(args) < 2:
+            raise ValueError("Укажите день недели и время, например: пт 10:00")
+
+        weekday = Subscriptions.WEEKDAYS.get(args[0].strip().lower()[:2])
+        if weekday is None:
+            raise ValueError("День недели: пн, вт, ср, чт, пт, сб или вс")
+
+        try:
+            time_str = datetime.strptime(args[1], '%H:%M').strftime('%H:%M')
+            bottles = int(args[2]) if len(args) > 2 else 1
+            weeks = int(args[3]) if len(args) > 3 else 1
+        except ValueError:
+            raise ValueError("Время укажите как HH:MM, количество бутылок и недель - числами")
+
+        minutes = int(time_str[:2]) * 60 + int(time_str[3:])
+        if not WORK_START_HOUR * 60 <= minutes < WORK_END_HOUR * 60 or minutes % DELIVERY_INTERVAL:
+            raise ValueError(f"Доставка возможна с {WORK_START_HOUR}:00 до {WORK_END_HOUR}:00 "
+                             f"с шагом {DELIVERY_INTERVAL} минут")
+        if not 1 <= bottles <= 100:
+            raise ValueError("Количество бутылок - от 1 до 100")
+        if weeks not in Subscriptions.PERIODS:
+            raise ValueError("Доставка возможна каждую неделю (1) или раз в две недели (2)")
+
+        return weekday, time_str, bottles, weeks
+
+    @staticmethod
+    def subscribe(user_id: int, weekday: int, time_str: str, bottles: int, weeks: int,
+                  today: Optional[date] = None) -> str:
+        """
+        Сохранить подписку клиента; координаты берутся из последнего заказа на текущий адрес
+
+        :return: Дата первой доставки в формате YYYY-MM-DD
+        :raises ValueError: Если клиент не зарегистрирован
+        """
+        user = Database.get_user(user_id)
+        if not user:
+            raise ValueError("Подписка доступна только зарегистрированным клиентам")
+
+        today = today or datetime.now().date()
+        first_date = today + timedelta(days=(weekday - today.weekday() - 1) % 7 + 1)
+
+        location = {}
+        for order in reversed(Database.get_user_orders(user_id)):
+            if order['address'] == user['address'] and order.get('latitude'):
+                location = order
+                break
+
+        first_date_str = first_date.strftime('%Y-%m-%d')
+        Database.save_subscription(
+            user_id, weeks, first_date_str, time_str, bottles,
+            location.get('latitude'), location.get('longitude'), location.get('district')
+        )
+        return first_date_str
+
+    @staticmethod
+    def describe(subscription: Optional[Dict]) -> str:
+        """Описание подписки для сообщений клиенту"""
+        if not subscription:
+            return "Регулярных заказов нет"
+
+        first_date = datetime.strptime(subscription['first_date'], '%Y-%m-%d')
+        period = "каждую неделю" if subscription['weeks'] == 1 else "раз в две недели"
+        return (
+            f"💧 {subscription['bottles']} бут. {period}, "
+            f"{Subscriptions.WEEKDAY_NAMES[first_date.weekday()]} в {subscription['delivery_time']}\n"
+            f"📅 Первая доставка: {subscription['first_date']}"
+        )
+
+    @staticmethod
+    def order_id(user_id: int, delivery_date: date) -> str:
+        """ID заказа по подписке (повторный запуск не создаст его второй раз)"""
+        return f"SUB-{user_id}-{delivery_date.strftime('%Y%m%d')}"
+
+    @staticmethod
+    def occurrences(subscription: Dict, start: date, end: date) -> List[date]:
+        """
+        Даты доставки по подписке в интервале
+
+        :param start: Первая дата интервала (включительно)
+        :param end: Последняя дата интервала (включительно)
+        """
+        first_date = datetime.strptime(subscription['first_date'], '%Y-%m-%d').date()
+        period = timedelta(weeks=int(subscription['weeks'] or 1))
+
+        current = first_date
+        if start > current:
+            current += period * -(-(start - current).days // period.days)
+
+        dates = []
+        while current <= end:
+            dates.append(current)
+            current += period
+        return dates
+
+    @staticmethod
+    def materialize(now: Optional[datetime] = None, user_id: Optional[int] = None, enqueue: bool = True) -> Dict:
+        """
+        Создать заказы по активным подпискам на горизонт SUBSCRIPTION_LOOKAHEAD_DAYS
+
+        Слоты подбираются пакетом (если время клиента занято - ближайшее свободное в тот же день),
+        заказы, напоминания и отметки подписок сохраняются одним сохранением файла.
+        Из бота вызывается через materialize_async, чтобы чтение и сохранение файлов не останавливали чаты.
+
+        :param user_id: Создать заказы только по подписке этого клиента (сразу после оформления)
+        :param enqueue: Сразу поставить напоминания в очередь отправки (False - их ставит вызывающий)
+        :return: Dict с ключами 'created' (количество заказов), 'skipped' (список (user_id, дата),
+                 для которых в этот день не нашлось свободного времени) и 'reminders' (сохраненные напоминания)
+        """
+        now = now or datetime.now()
+        tomorrow = now.date() + timedelta(days=1)
+        # Заказы создаются только в пределах горизонта бронирования, где для них подбираются слоты
+        end = now.date() + timedelta(days=min(SUBSCRIPTION_LOOKAHEAD_DAYS, BOOKING_HORIZON_DAYS) - 1)
+
+        subscriptions = [
+            subscription for subscription in Database.get_subscriptions()
+            if user_id is None or subscription['user_id'] == user_id
+        ]
+        pending = []
+        progress = {}
+        for subscription in subscriptions:
+            start = tomorrow
+            if subscription['generated_until']:
+                generated_until = datetime.strptime(subscription['generated_until'], '%Y-%m-%d').date()
+                start = max(start, generated_until + timedelta(days=1))
+
+            for delivery_date in Subscriptions.occurrences(subscription, start, end):
+                pending.append((Subscriptions.order_id(subscription['user_id'], delivery_date),
+                                delivery_date.strftime('%Y-%m-%d'), subscription))
+            progress[subscription['user_id']] = end.strftime('%Y-%m-%d')
+
+        if not pending:
+            return {'created': 0, 'skipped': [], 'reminders': []}
+
+        # Заказы, уже созданные прошлым запуском, который не успел отметить подписку
+        existing = Database.get_orders_by_ids([order_id for order_id, _, _ in pending])
+        pending = [item for item in pending if item[0] not in existing]
+
+        slots = SlotIndex.allocate(
+            [(order_id, date_str, subscription['delivery_time']) for order_id, date_str, subscription in pending]
+        )
+        users = Database.get_users_by_ids({subscription['user_id'] for _, _, subscription in pending})
+
+        orders = []
+        skipped = []
+        for order_id, date_str, subscription in pending:
+            user = users.get(subscription['user_id'])
+            slot = slots.get(order_id)
+            # Заказ переносится только в пределах дня: доставка в другой день клиента удивит
+            if not user or not slot or slot[0] != date_str:
+                skipped.append((subscription['user_id'], date_str))
+                continue
+
+            orders.append({
+                'order_id': order_id,
+                'user_id': user['user_id'],
+                'name': user['name'],
+                'phone': user['phone'],
+                'address': user['address'],
+                'delivery_date': date_str,
+                'delivery_time': slot[1],
+                'bottles': subscription['bottles'],
+                'latitude': subscription['latitude'],
+                'longitude': subscription['longitude'],
+                'district': subscription['district']
+            })
+
+        by_date = defaultdict(list)
+        for order in orders:
+            by_date[order['delivery_date']].append(order)
+        couriers = {}
+        for date_str, day_orders in by_date.items():
+            couriers.update(CourierAssignment.place_orders(date_str, day_orders))
+        for order in orders:
+            order['courier'] = couriers.get(order['order_id'])
+
+        reminders = [
+            reminder
+            for order in orders
+            for reminder in ReminderScheduler.build_reminders(
+                order['user_id'], order['order_id'], order['delivery_date'], order['delivery_time'],
+                order['address'], now=now
+            )
+        ]
+
+        Database.save_generated_orders(orders, [reminder.to_record() for reminder in reminders], progress)
+        if enqueue:
+            ReminderScheduler.enqueue(reminders)
+
+        logger.info(f"Регулярные заказы: создано {len(orders)}, без свободного времени {len(skipped)}, "
+                    f"подписок {len(subscriptions)}")
+        return {'created': len(orders), 'skipped': skipped, 'reminders': reminders}
+
+    @staticmethod
+    async def materialize_async(user_id: Optional[int] = None) -> Dict:
+        """
+        Создать заказы по подпискам в отдельном потоке, не задерживая других клиентов
+
+        Напоминания ставятся в очередь уже в цикле событий: очередь и ее сигнал пробуждения
+        не рассчитаны на вызовы из других потоков.
+
+        :param user_id: Создать заказы только по подписке этого клиента
+        :return: Результат materialize
+        """
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: Subscriptions.materialize(user_id=user_id, enqueue=False)
+        )
+        ReminderScheduler.enqueue(result['reminders'])
+        return result
+
+    @staticmethod
+    def _next_run(now: datetime) -> datetime:
+        """Время следующего ночного запуска"""
+        run_at = now.replace(hour=SUBSCRIPTION_RUN_HOUR, minute=0, second=0, microsecond=0)
+        return run_at if run_at > now else run_at + timedelta(days=1)
+
+    @staticmethod
+    async def run_nightly(dispatcher: MessageDispatcher):
+        """
+        Фоновая задача: создать заказы при запуске бота (наверстать пропущенное) и затем каждую ночь
+
+        :param dispatcher: Диспетчер сообщений для уведомлений о днях без свободного времени
+        """
+        while True:
+            try:
+                result = await Subscriptions.materialize_async()
+                await dispatcher.send_many([
+                    OutgoingMessage(
+                        user_id,
+                        f"⚠️ На {date_str} все время доставки занято, и регулярный заказ не создан.\n"
+                        f"Пожалуйста, оформите заказ на удобное время через «📦 Сделать заказ»."
+                    )
+                    for user_id, date_str in result['skipped']
+                ])
+            except Exception as e:
+                logger.error(f"Ошибка создания регулярных заказов: {e}")
+
+            now = datetime.now()
+            await asyncio.sleep((Subscriptions._next_run(now) - now).total_seconds())
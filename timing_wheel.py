@@ -0,0 +1,272 @@
+"""
+Модуль иерархического колеса таймеров
+Хранит сотни тысяч отложенных событий с добавлением и отменой за O(1)
+и одной задачей пробуждения вместо отдельного таймера на каждое событие
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+import tracemalloc
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class TimingWheel:
+    """
+    Иерархическое колесо таймеров
+
+    Уровень 0 делится на слоты по одному тику, каждый следующий уровень - на слоты
+    длиной в полный оборот предыдущего. Событие кладется на уровень по удаленности
+    срока, а при обороте нижнего колеса слот верхнего уровня перераспределяется вниз.
+    События дальше последнего уровня ждут в отдельном списке.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, wheel_sizes: Tuple[int, ...] = (60, 60, 24, 16),
+                 start: Optional[float] = None):
+        """
+        :param tick_seconds: Длительность тика (максимальное опоздание события)
+        :param wheel_sizes: Количество слотов на каждом уровне (по умолчанию секунды, минуты, часы, дни)
+        :param start: Начальное время (Unix timestamp), по умолчанию текущее
+        """
+        self.tick_seconds = tick_seconds
+        self.sizes = wheel_sizes
+
+        # Длина слота каждого уровня в тиках и полный охват колеса
+        self._spans = [math.prod(wheel_sizes[:level]) for level in range(len(wheel_sizes))]
+        self._horizon = math.prod(wheel_sizes)
+
+        # Слоты создаются при первом использовании: ключ -> (тик срабатывания, значение)
+        self._wheels: List[List[Optional[Dict]]] = [[None] * size for size in wheel_sizes]
+
+        # Положение каждого события: (уровень, слот); уровень -1 - дальше охвата колеса,
+        # уровень -2 - срок уже наступил, событие вернется при ближайшем advance()
+        self._where: Dict[Hashable, Tuple[int, int]] = {}
+        self._overflow: Dict[Hashable, Tuple[int, Any]] = {}
+        self._ready: Dict[Hashable, Tuple[int, Any]] = {}
+
+        self._current = math.floor((time.time() if start is None else start) / tick_seconds)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def _place(self, key: Hashable, tick: int, value: Any):
+        """Положить событие в слот по удаленности его срока от текущего тика"""
+        delta = tick - self._current
+
+        if delta <= 0:
+            self._ready[key] = (tick, value)
+            self._where[key] = (-2, 0)
+            return
+
+        if delta >= self._horizon:
+            self._overflow[key] = (tick, value)
+            self._where[key] = (-1, 0)
+            return
+
+        level = 0
+        while level < len(self.sizes) - 1 and delta >= self._spans[level + 1]:
+            level += 1
+
+        slot = (tick // self._spans[level]) % self.sizes[level]
+        bucket = self._wheels[level][slot]
+        if bucket is None:
+            bucket = self._wheels[level][slot] = {}
+        bucket[key] = (tick, value)
+        self._where[key] = (level, slot)
+
+    def schedule(self, key: Hashable, when: float, value: Any):
+        """
+        Запланировать событие (повторное планирование с тем же ключом переносит его)
+
+        :param key: Ключ события
+        :param when: Время срабатывания (Unix timestamp)
+        :param value: Значение, которое вернет advance()
+        """
+        self.cancel(key)
+        self._place(key, math.ceil(when / self.tick_seconds), value)
+
+    def cancel(self, key: Hashable) -> Optional[Any]:
+        """
+        Отменить событие
+
+        :return: Значение отмененного события или None
+        """
+        location = self._where.pop(key, None)
+        if location is None:
+            return None
+
+        level, slot = location
+        if level == -2:
+            return self._ready.pop(key)[1]
+        if level == -1:
+            return self._overflow.pop(key)[1]
+
+        bucket = self._wheels[level][slot]
+        value = bucket.pop(key)[1]
+        if not bucket:
+            self._wheels[level][slot] = None
+        return value
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Значение запланированного события или None"""
+        location = self._where.get(key)
+        if location is None:
+            return None
+
+        level, slot = location
+        if level == -2:
+            return self._ready[key][1]
+        if level == -1:
+            return self._overflow[key][1]
+        return self._wheels[level][slot][key][1]
+
+    def _cascade(self, level: int):
+        """Перераспределить текущий слот уровня на нижние уровни"""
+        slot = (self._current // self._spans[level]) % self.sizes[level]
+        bucket = self._wheels[level][slot]
+        if bucket is None:
+            return
+
+        self._wheels[level][slot] = None
+        for key, (tick, value) in bucket.items():
+            del self._where[key]
+            self._place(key, tick, value)
+
+    def _pull_overflow(self):
+        """Перенести в колесо события, срок которых вошел в его охват"""
+        for key, (tick, value) in list(self._overflow.items()):
+            if tick - self._current < self._horizon:
+                del self._overflow[key]
+                del self._where[key]
+                self._place(key, tick, value)
+
+    def advance(self, now: Optional[float] = None) -> List[Any]:
+        """
+        Продвинуть колесо до текущего времени
+
+        :param now: Текущее время (Unix timestamp), по умолчанию time.time()
+        :return: Значения сработавших событий
+        """
+        target = math.floor((time.time() if now is None else now) / self.tick_seconds)
+        fired = []
+
+        while self._current < target:
+            self._current += 1
+
+            # При обороте нижнего колеса спускаем события с верхних уровней, начиная с самого верхнего
+            wrapped = 0
+            while wrapped < len(self.sizes) - 1 and self._current % self._spans[wrapped + 1] == 0:
+                wrapped += 1
+            for level in range(wrapped, 0, -1):
+                self._cascade(level)
+            if wrapped == len(self.sizes) - 1:
+                self._pull_overflow()
+
+            slot = self._current % self.sizes[0]
+            bucket = self._wheels[0][slot]
+            if bucket is not None:
+                self._wheels[0][slot] = None
+                for key, (_, value) in bucket.items():
+                    del self._where[key]
+                    fired.append(value)
+
+        # События, срок которых наступил до продвижения или при спуске с верхних уровней
+        self._drain_ready(fired)
+        return fired
+
+    def _drain_ready(self, fired: List[Any]):
+        """Вернуть события, срок которых уже наступил"""
+        if self._ready:
+            for key, (_, value) in self._ready.items():
+                del self._where[key]
+                fired.append(value)
+            self._ready.clear()
+
+    def next_deadline(self) -> Optional[float]:
+        """
+        Когда в следующий раз стоит продвинуть колесо
+
+        :return: Время ближайшего события уровня 0 или ближайшего оборота колеса
+                 (Unix timestamp); None, если событий нет
+        """
+        if not self._where:
+            return None
+        if self._ready:
+            return self._current * self.tick_seconds
+
+        size = self.sizes[0]
+        next_wrap = (self._current // size + 1) * size
+        for tick in range(self._current + 1, next_wrap + 1):
+            if self._wheels[0][tick % size] is not None:
+                return tick * self.tick_seconds
+        return next_wrap * self.tick_seconds
+
+
+def _benchmark_memory(count: int, horizon_days: int):
+    """Память на одно событие и скорость добавления и отмены"""
+    now = time.time()
+    times = [now + random.uniform(0, horizon_days * 86400) for _ in range(count)]
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    wheel = TimingWheel(start=now)
+    for index, when in enumerate(times):
+        wheel.schedule(index, when, None)
+    insert_seconds = time.perf_counter() - started
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for index in range(0, count, 2):
+        wheel.cancel(index)
+    cancel_seconds = time.perf_counter() - started
+
+    print(f"Событий: {count}, горизонт: {horizon_days} дн.")
+    print(f"Память колеса: {memory / 1024 / 1024:.1f} МБ, {memory / count:.0f} байт на событие")
+    print(f"Добавление: {insert_seconds / count * 1e6:.2f} мкс, отмена: {cancel_seconds / (count // 2) * 1e6:.2f} мкс")
+
+
+async def _benchmark_jitter(count: int, span_seconds: float, tick_seconds: float):
+    """Опоздание срабатывания при одной задаче пробуждения"""
+    now = time.time()
+    wheel = TimingWheel(tick_seconds=tick_seconds, start=now)
+    for index in range(count):
+        when = now + random.uniform(0.5, span_seconds)
+        wheel.schedule(index, when, when)
+
+    lateness = []
+    while len(wheel):
+        deadline = wheel.next_deadline()
+        await asyncio.sleep(max(deadline - time.time(), 0))
+        fired_at = time.time()
+        lateness.extend(fired_at - when for when in wheel.advance(fired_at))
+
+    lateness.sort()
+    print(f"Событий: {count} за {span_seconds:.0f} с, тик {tick_seconds} с")
+    print(
+        f"Опоздание: p50 {lateness[len(lateness) // 2] * 1000:.0f} мс, "
+        f"p99 {lateness[int(len(lateness) * 0.99)] * 1000:.0f} мс, "
+        f"max {lateness[-1] * 1000:.0f} мс, раньше срока: {sum(1 for value in lateness if value < 0)}"
+    )
+
+
+def main():
+    """Замер памяти и точности срабатывания колеса таймеров"""
+    parser = argparse.ArgumentParser(description="Бенчмарк колеса таймеров напоминаний")
+    parser.add_argument('--count', type=int, default=200000, help="Количество событий")
+    parser.add_argument('--days', type=int, default=7, help="Горизонт событий для замера памяти (дни)")
+    parser.add_argument('--span', type=float, default=5.0, help="Интервал событий для замера опоздания (секунды)")
+    parser.add_argument('--tick', type=float, default=1.0, help="Длительность тика (секунды)")
+    args = parser.parse_args()
+
+    _benchmark_memory(args.count, args.days)
+    asyncio.run(_benchmark_jitter(args.count, args.span, args.tick))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Модуль листа ожидания на полностью занятые даты
+Хранит очередь клиентов по каждой дате и закрепляет освободившийся слот
+за первым клиентом в очереди на ограниченное время
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Deque, Dict, Optional, Tuple
+
+from config import WAITLIST_HOLD_MINUTES
+from slot_holds import SlotHolds
+
+
+@dataclass
+class WaitlistEntry:
+    """Клиент в листе ожидания с данными для оформления заказа"""
+    user_id: int
+    chat_id: int
+    date_str: str
+    name: str
+    phone: str
+    address: str
+    bottles: int
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    district: Optional[str] = None
+    joined_at: datetime = field(default_factory=datetime.now)
+    active: bool = True
+
+
+@dataclass
+class WaitlistOffer:
+    """Слот, временно закрепленный за клиентом из листа ожидания"""
+    entry: WaitlistEntry
+    time_str: str
+    expires_at: datetime
+
+
+class Waitlist:
+    """Лист ожидания по датам"""
+
+    # Очереди клиентов по датам (вышедшие из очереди помечаются неактивными)
+    _queues: Dict[str, Deque[WaitlistEntry]] = {}
+
+    # Индекс активных записей по (дата, user_id)
+    _index: Dict[Tuple[str, int], WaitlistEntry] = {}
+
+    # Предложенные слоты по (дата, время)
+    _offers: Dict[Tuple[str, str], WaitlistOffer] = {}
+
+    @staticmethod
+    def join(entry: WaitlistEntry) -> int:
+        """
+        Добавить клиента в лист ожидания на дату
+
+        :param entry: Запись клиента
+        :return: Позиция клиента в очереди (начиная с 1)
+        """
+        key = (entry.date_str, entry.user_id)
+        if key not in Waitlist._index:
+            Waitlist._queues.setdefault(entry.date_str, deque()).append(entry)
+            Waitlist._index[key] = entry
+
+        return Waitlist.position(entry.date_str, entry.user_id)
+
+    @staticmethod
+    def leave(date_str: str, user_id: int) -> bool:
+        """
+        Убрать клиента из листа ожидания (запись удаляется из очереди при следующем извлечении)
+
+        :return: True если клиент был в листе ожидания
+        """
+        entry = Waitlist._index.pop((date_str, user_id), None)
+        if entry is None:
+            return False
+        entry.active = False
+        return True
+
+    @staticmethod
+    def position(date_str: str, user_id: int) -> int:
+        """Позиция клиента в очереди на дату (0, если его нет в очереди)"""
+        if (date_str, user_id) not in Waitlist._index:
+            return 0
+
+        position = 0
+        for entry in Waitlist._queues.get(date_str, ()):
+            if entry.active:
+                position += 1
+                if entry.user_id == user_id:
+                    return position
+        return 0
+
+    @staticmethod
+    def _pop_next(date_str: str) -> Optional[WaitlistEntry]:
+        """Извлечь первого активного клиента из очереди на дату"""
+        queue = Waitlist._queues.get(date_str)
+
+        while queue:
+            entry = queue.popleft()
+            if entry.active:
+                Waitlist._index.pop((date_str, entry.user_id), None)
+                entry.active = False
+                return entry
+
+        Waitlist._queues.pop(date_str, None)
+        return None
+
+    @staticmethod
+    def offer_slot(date_str: str, time_str: str, now: Optional[datetime] = None) -> Optional[WaitlistOffer]:
+        """
+        Закрепить освободившийся слот за первым клиентом в очереди
+
+        :param date_str: Дата в формате YYYY-MM-DD
+        :param time_str: Время в формате HH:MM
+        :param now: Текущее время (для тестов)
+        :return: Предложение или None, если очередь пуста или слот уже предложен
+        """
+        if (date_str, time_str) in Waitlist._offers:
+            return None
+
+        entry = Waitlist._pop_next(date_str)
+        if entry is None:
+            return None
+
+        offer = WaitlistOffer(
+            entry=entry,
+            time_str=time_str,
+            expires_at=(now or datetime.now()) + timedelta(minutes=WAITLIST_HOLD_MINUTES)
+        )
+        Waitlist._offers[(date_str, time_str)] = offer
+
+        # Пока предложение действует, слот скрыт от остальных клиентов
+        SlotHolds.hold(date_str, time_str, entry.user_id, WAITLIST_HOLD_MINUTES * 60)
+        return offer
+
+    @staticmethod
+    def get_offer(date_str: str, time_str: str, now: Optional[datetime] = None) -> Optional[WaitlistOffer]:
+        """Действующее предложение на слот или None, если его нет или оно истекло"""
+        offer = Waitlist._offers.get((date_str, time_str))
+        if offer and offer.expires_at <= (now or datetime.now()):
+            return None
+        return offer
+
+    @staticmethod
+    def accept_offer(date_str: str, time_str: str, user_id: int) -> Optional[WaitlistEntry]:
+        """
+        Принять предложение: удержание слота остается за клиентом до оформления заказа
+
+        :return: Запись клиента или None, если предложение истекло или адресовано другому
+        """
+        offer = Waitlist.get_offer(date_str, time_str)
+        if offer is None or offer.entry.user_id != user_id:
+            return None
+
+        del Waitlist._offers[(date_str, time_str)]
+        return offer.entry
+
+    @staticmethod
+    def release_offer(date_str: str, time_str: str) -> Optional[WaitlistOffer]:
+        """
+        Снять удержание слота (клиент отказался или время вышло)
+
+        :return: Снятое предложение или None
+        """
+        offer = Waitlist._offers.pop((date_str, time_str), None)
+        if offer:
+            SlotHolds.release(date_str, time_str, offer.entry.user_id)
+        return offer
+
+    @staticmethod
+    def expire_offer(date_str: str, time_str: str, offer: WaitlistOffer) -> bool:
+        """
+        Снять удержание по истечении времени, если слот все еще закреплен этим предложением
+
+        :return: True если предложение было снято
+        """
+        if Waitlist._offers.get((date_str, time_str)) is not offer:
+            return False
+        Waitlist.release_offer(date_str, time_str)
+        return True
@@ -0,0 +1,104 @@
+"""
+Модуль планирования волн доставки по районам Бишкека
+Предлагает клиенту в первую очередь слоты рядом с заказами из его района
+и группирует день курьера в волны по зонам
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import WAVE_ADJACENT_MINUTES
+from address_validator import KyrgyzstanAddressValidator
+
+
+class WavePlanner:
+    """Планировщик волн доставки по районам"""
+
+    @staticmethod
+    def _to_minutes(time_str: str) -> int:
+        """Перевести время HH:MM в минуты от начала дня"""
+        hours, minutes = time_str.split(':')
+        return int(hours) * 60 + int(minutes)
+
+    @staticmethod
+    def rank_slots(slots: List[str], orders: List[Dict], district: Optional[str]) -> Tuple[List[str], Set[str]]:
+        """
+        Упорядочить свободные слоты: сначала соседние с заказами того же района
+
+        :param slots: Свободные слоты в хронологическом порядке
+        :param orders: Заказы на эту дату
+        :param district: Район клиента
+        :return: Tuple (слоты в порядке показа, множество предпочтительных слотов)
+        """
+        district_key = KyrgyzstanAddressValidator.normalize_district(district)
+        if not district_key:
+            return slots, set()
+
+        # Время заказов, которые курьер уже везет в этот район
+        district_times = [
+            WavePlanner._to_minutes(order['delivery_time'])
+            for order in orders
+            if order.get('delivery_time')
+            and KyrgyzstanAddressValidator.normalize_district(order.get('district')) == district_key
+        ]
+        if not district_times:
+            return slots, set()
+
+        preferred = []
+        for time_slot in slots:
+            slot_minutes = WavePlanner._to_minutes(time_slot)
+            gap = min(abs(slot_minutes - order_minutes) for order_minutes in district_times)
+            if gap <= WAVE_ADJACENT_MINUTES:
+                preferred.append((gap, slot_minutes, time_slot))
+
+        preferred.sort()
+        preferred_slots = [time_slot for _, _, time_slot in preferred]
+        preferred_set = set(preferred_slots)
+
+        return preferred_slots + [s for s in slots if s not in preferred_set], preferred_set
+
+    @staticmethod
+    def group_by_zone(orders: List[Dict]) -> List[Dict]:
+        """
+        Сгруппировать день курьера в волны: подряд идущие заказы одного района
+
+        :param orders: Заказы курьера на день
+        :return: Список волн с районом, временем начала/конца и заказами
+        """
+        timed_orders = sorted(
+            (order for order in orders if order.get('delivery_time')),
+            key=lambda order: order['delivery_time']
+        )
+
+        waves = []
+        for order in timed_orders:
+            district_key = KyrgyzstanAddressValidator.normalize_district(order.get('district')) or "Не определен"
+
+            if waves and waves[-1]['district'] == district_key:
+                waves[-1]['orders'].append(order)
+                waves[-1]['end'] = order['delivery_time']
+            else:
+                waves.append({
+                    'district': district_key,
+                    'start': order['delivery_time'],
+                    'end': order['delivery_time'],
+                    'orders': [order]
+                })
+
+        return waves
+
+    @staticmethod
+    def format_waves(waves: List[Dict]) -> str:
+        """
+        Форматирование волн доставки для диспетчера
+
+        :param waves: Результат group_by_zone
+        :return: Текст с волнами по районам
+        """
+        lines = []
+        for number, wave in enumerate(waves, start=1):
+            bottles = sum(order.get('bottles') or 1 for order in wave['orders'])
+            lines.append(
+                f"Волна {number}: {wave['district']} {wave['start']}-{wave['end']} "
+                f"(заказов: {len(wave['orders'])}, бутылок: {bottles})"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,156 @@
+"""
+Модуль рабочего календаря доставки
+Учитывает выходные, сокращенные дни и дополнительные смены и заранее строит
+таблицу слотов на горизонт бронирования, чтобы клавиатуры не пересчитывали ее при каждом показе
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta, date
+from typing import Dict, List, Optional, Tuple
+
+from config import (WORK_START_HOUR, WORK_END_HOUR, DELIVERY_INTERVAL,
+                    BOOKING_HORIZON_DAYS, CALENDAR_FILE)
+
+logger = logging.getLogger(__name__)
+
+# Слот дня: (минуты от начала дня, время HH:MM)
+DaySlot = Tuple[int, str]
+
+
+class WorkCalendar:
+    """Рабочий календарь с исключениями и предрассчитанными слотами"""
+
+    # Предрассчитанные дни горизонта бронирования: дата -> {'label', 'slots'}
+    _table: Dict[str, Dict] = {}
+
+    # День и версия файла календаря, для которых построена таблица
+    _built_for: Optional[Tuple[date, Optional[int]]] = None
+
+    # Исключения из обычного графика
+    _exceptions: Dict = {'closed': set(), 'hours': {}, 'extra': {}}
+
+    @staticmethod
+    def _to_minutes(time_str: str) -> int:
+        """Перевести время HH:MM в минуты от начала дня"""
+        hours, minutes = time_str.split(':')
+        return int(hours) * 60 + int(minutes)
+
+    @staticmethod
+    def _load_exceptions() -> Dict:
+        """
+        Загрузить исключения из файла календаря
+
+        Формат файла:
+        {
+            "closed": ["2026-12-31"],
+            "hours": {"2026-12-30": [["09:00", "15:00"]]},
+            "extra": {"2026-12-27": [["18:00", "21:00"]]}
+        }
+        "hours" заменяет обычный график на дату, "extra" добавляет смены к нему.
+        """
+        exceptions = {'closed': set(), 'hours': {}, 'extra': {}}
+        if not os.path.exists(CALENDAR_FILE):
+            return exceptions
+
+        try:
+            with open(CALENDAR_FILE, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось прочитать календарь {CALENDAR_FILE}: {e}")
+            return exceptions
+
+        exceptions['closed'] = set(data.get('closed', []))
+        for key in ('hours', 'extra'):
+            exceptions[key] = {
+                date_str: [(WorkCalendar._to_minutes(start), WorkCalendar._to_minutes(end)) for start, end in shifts]
+                for date_str, shifts in data.get(key, {}).items()
+            }
+        return exceptions
+
+    @staticmethod
+    def _build_day_slots(date_str: str) -> Tuple[DaySlot, ...]:
+        """Слоты рабочего дня с учетом исключений"""
+        exceptions = WorkCalendar._exceptions
+        if date_str in exceptions['closed']:
+            return ()
+
+        shifts = exceptions['hours'].get(date_str, [(WORK_START_HOUR * 60, WORK_END_HOUR * 60)])
+        shifts = shifts + exceptions['extra'].get(date_str, [])
+
+        minutes = sorted({
+            slot
+            for start, end in shifts
+            for slot in range(start, end, DELIVERY_INTERVAL)
+        })
+        return tuple((slot, f"{slot // 60:02d}:{slot % 60:02d}") for slot in minutes)
+
+    @staticmethod
+    def _date_label(day: datetime, offset: int) -> str:
+        """Подпись кнопки выбора даты"""
+        if offset == 0:
+            return f"Сегодня ({day.strftime('%d.%m')})"
+        if offset == 1:
+            return f"Завтра ({day.strftime('%d.%m')})"
+        return day.strftime('%d.%m.%Y (%A)')
+
+    @staticmethod
+    def _ensure_built():
+        """Перестроить таблицу при смене дня или изменении файла календаря"""
+        today = datetime.now().date()
+        version = os.stat(CALENDAR_FILE).st_mtime_ns if os.path.exists(CALENDAR_FILE) else None
+
+        if WorkCalendar._built_for == (today, version):
+            return
+
+        WorkCalendar._exceptions = WorkCalendar._load_exceptions()
+        table = {}
+        start = datetime.combine(today, datetime.min.time())
+
+        for offset in range(BOOKING_HORIZON_DAYS):
+            day = start + timedelta(days=offset)
+            date_str = day.strftime('%Y-%m-%d')
+            table[date_str] = {
+                'label': WorkCalendar._date_label(day, offset),
+                'slots': WorkCalendar._build_day_slots(date_str)
+            }
+
+        WorkCalendar._table = table
+        WorkCalendar._built_for = (today, version)
+
+    @staticmethod
+    def get_day_slots(date_str: str) -> Tuple[DaySlot, ...]:
+        """
+        Получить слоты рабочего дня
+
+        :param date_str: Дата в формате YYYY-MM-DD
+        :return: Кортеж (минуты от начала дня, время HH:MM); пустой, если день выходной
+        """
+        WorkCalendar._ensure_built()
+
+        day = WorkCalendar._table.get(date_str)
+        if day is not None:
+            return day['slots']
+
+        # Даты за пределами горизонта считаем без кэширования
+        return WorkCalendar._build_day_slots(date_str)
+
+    @staticmethod
+    def is_open(date_str: str) -> bool:
+        """Работает ли доставка в этот день"""
+        return bool(WorkCalendar.get_day_slots(date_str))
+
+    @staticmethod
+    def get_booking_dates() -> List[Tuple[str, str]]:
+        """
+        Получить рабочие дни горизонта бронирования для клавиатуры выбора даты
+
+        :return: Список пар (дата YYYY-MM-DD, подпись кнопки)
+        """
+        WorkCalendar._ensure_built()
+        return [
+            (date_str, day['label'])
+            for date_str, day in WorkCalendar._table.items()
+            if day['slots']
+        ]